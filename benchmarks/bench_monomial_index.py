@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of the lookups in the monomial index, which are done for
+every entry of the moment matrix. The plain dictionary keyed by SymPy
+expressions is the baseline.
+
+Created on Sun Oct 18 21:47:26 2026
+
+@author: Peter Wittek
+"""
+from sympy.core.cache import clear_cache
+from sympy.physics.quantum.dagger import Dagger
+from ncpol2sdpa import generate_operators, get_monomials
+from ncpol2sdpa.nc_polynomial import Alphabet, MonomialIndex
+
+
+class MonomialIndexLookup(object):
+    params = [[2, 4], [2, 3]]
+    param_names = ["n_operators", "degree"]
+
+    def setup(self, n_operators, degree):
+        X = generate_operators('X', n_operators)
+        monomials = get_monomials(X, degree)[1:]
+        self.monomials = list(set(monomials +
+                                  [Dagger(monomial)
+                                   for monomial in monomials]))
+        self.alphabet = Alphabet()
+        self.monomial_index = MonomialIndex(self.alphabet)
+        self.dictionary = {}
+        for k, monomial in enumerate(self.monomials):
+            self.monomial_index[monomial] = k + 1
+            self.dictionary[monomial] = k + 1
+        self.words = [self.alphabet.word(monomial)
+                      for monomial in self.monomials]
+
+    def teardown(self, n_operators, degree):
+        clear_cache()
+
+    def time_getitem(self, n_operators, degree):
+        monomial_index = self.monomial_index
+        for monomial in self.monomials:
+            monomial_index[monomial]
+
+    def time_index_of_word(self, n_operators, degree):
+        index_of_word = self.monomial_index.index_of_word
+        for word in self.words:
+            index_of_word(word)
+
+    def time_dict_getitem(self, n_operators, degree):
+        dictionary = self.dictionary
+        for monomial in self.monomials:
+            dictionary[monomial]
+
+    def time_setitem(self, n_operators, degree):
+        monomial_index = MonomialIndex(Alphabet())
+        for k, monomial in enumerate(self.monomials):
+            monomial_index[monomial] = k + 1
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the phases of generating and exporting the SDP relaxation in
+the format of airspeed velocity. Run them with `asv run` from the root of the
+repository.
+
+Created on Sun Oct 18 22:31:09 2026
+
+@author: Peter Wittek
+"""
+import os
+import tempfile
+import tracemalloc
+from sympy.core.cache import clear_cache
+from ncpol2sdpa import flatten, get_monomials, SdpRelaxation
+from ncpol2sdpa.sdpa_utils import write_to_sdpa
+from .problems import PROBLEMS
+
+CONSTRAINT_KEYS = ("inequalities", "equalities", "momentinequalities",
+                   "momentequalities")
+
+
+def get_problem(name, size):
+    generator, sizes = PROBLEMS[name]
+    index = ["small", "medium", "large"].index(size)
+    if index >= len(sizes):
+        # Skip the benchmark in asv
+        raise NotImplementedError()
+    return generator(sizes[index])
+
+
+def get_peak_memory(function, *args):
+    """Return the peak memory allocated by a call on top of the memory that
+    was allocated before it, as measured by tracemalloc. Unlike the peakmem
+    benchmarks of asv, it excludes the setup of the benchmark.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def get_relaxation(variables, kwargs):
+    sdpRelaxation = SdpRelaxation(variables)
+    sdpRelaxation.get_relaxation(**kwargs)
+    return sdpRelaxation
+
+
+class Relaxation(object):
+    params = [sorted(PROBLEMS.keys()), ["small", "medium", "large"]]
+    param_names = ["problem", "size"]
+    timeout = 600
+
+    def setup(self, name, size):
+        self.variables, self.kwargs = get_problem(name, size)
+
+    def teardown(self, name, size):
+        clear_cache()
+
+    def time_get_monomials(self, name, size):
+        get_monomials(flatten(self.variables),
+                      self.kwargs["level"])
+
+    def time_moment_matrix(self, name, size):
+        kwargs = dict((key, value) for key, value in self.kwargs.items()
+                      if key not in CONSTRAINT_KEYS)
+        get_relaxation(self.variables, kwargs)
+
+    def time_get_relaxation(self, name, size):
+        get_relaxation(self.variables, self.kwargs)
+
+    def peakmem_get_relaxation(self, name, size):
+        get_relaxation(self.variables, self.kwargs)
+
+
+class Constraints(object):
+    params = Relaxation.params
+    param_names = Relaxation.param_names
+    timeout = 600
+
+    def setup(self, name, size):
+        variables, kwargs = get_problem(name, size)
+        constraints = dict((key, value) for key, value in kwargs.items()
+                           if key in CONSTRAINT_KEYS)
+        if not constraints:
+            raise NotImplementedError()
+        self.sdpRelaxation = get_relaxation(variables, kwargs)
+        # The relaxation skips constraints that did not change, so every call
+        # alternates between the constraints and their rescaled version
+        self.constraints = [dict((key, [2*constraint for constraint in value])
+                                 for key, value in constraints.items()),
+                            constraints]
+        self.calls = 0
+
+    def teardown(self, name, size):
+        clear_cache()
+
+    def process_constraints(self):
+        self.sdpRelaxation.process_constraints(
+            **self.constraints[self.calls % 2])
+        self.calls += 1
+
+    def time_process_constraints(self, name, size):
+        self.process_constraints()
+
+    def track_process_constraints_memory(self, name, size):
+        return get_peak_memory(self.process_constraints)
+    track_process_constraints_memory.unit = "bytes"
+
+
+class Export(object):
+    params = Relaxation.params
+    param_names = Relaxation.param_names
+    timeout = 600
+
+    def setup(self, name, size):
+        self.sdpRelaxation = get_relaxation(*get_problem(name, size))
+        handle, self.filename = tempfile.mkstemp(suffix=".dat-s")
+        os.close(handle)
+
+    def teardown(self, name, size):
+        os.remove(self.filename)
+        clear_cache()
+
+    def time_write_to_sdpa(self, name, size):
+        write_to_sdpa(self.sdpRelaxation, self.filename)
+
+    def track_write_to_sdpa_memory(self, name, size):
+        return get_peak_memory(write_to_sdpa, self.sdpRelaxation,
+                               self.filename)
+    track_write_to_sdpa_memory.unit = "bytes"
+
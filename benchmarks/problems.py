@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains the generators of the problems of the benchmarks. Each
+generator returns the variables of the relaxation and the keyword arguments
+of `get_relaxation`, so that the phases of the relaxation can be timed
+separately.
+
+Created on Sun Oct 18 22:05:48 2026
+
+@author: Peter Wittek
+"""
+import numpy as np
+from sympy.physics.quantum.dagger import Dagger
+from ncpol2sdpa import bosonic_constraints, define_objective_with_I, \
+    fermionic_constraints, flatten, generate_operators, generate_variables, \
+    get_neighbors, Probability
+
+
+def get_npa_problem(n_measurements, n_outcomes=2, level=1):
+    """Bipartite Bell scenario with a pseudo-random Bell inequality in the
+    Collins-Gisin notation.
+
+    :param n_measurements: The number of measurements of each party.
+    :type n_measurements: int.
+    :param n_outcomes: The number of outcomes of each measurement.
+    :type n_outcomes: int.
+    :param level: The level of the relaxation.
+    :type level: int.
+    """
+    configuration = [n_outcomes] * n_measurements
+    P = Probability(configuration, configuration)
+    size = 1 + n_measurements * (n_outcomes - 1)
+    I = np.random.RandomState(0).randint(-1, 2, size=(size, size)).tolist()
+    return P.get_all_operators(), \
+        {"level": level,
+         "objective": define_objective_with_I(I, P),
+         "substitutions": P.substitutions,
+         "extramonomials": P.get_extra_monomials('AB')}
+
+
+def get_fermionic_lattice(length, level=2):
+    """Hubbard chain of spin-up and spin-down fermions with periodic boundary
+    conditions and a fixed total particle number.
+
+    :param length: The number of sites.
+    :type length: int.
+    :param level: The level of the relaxation.
+    :type level: int.
+    """
+    n, h, U, t = 0.8, 3.8, -6, 1
+    fu = generate_operators('fu', length)
+    fd = generate_operators('fd', length)
+    _b = flatten([fu, fd])
+    hamiltonian = 0
+    for j in range(length):
+        hamiltonian += U * (Dagger(fu[j])*Dagger(fd[j]) * fd[j]*fu[j])
+        hamiltonian += -h/2*(Dagger(fu[j])*fu[j] - Dagger(fd[j])*fd[j])
+        for k in get_neighbors(j, len(fu), width=1):
+            hamiltonian += -t*Dagger(fu[j])*fu[k]-t*Dagger(fu[k])*fu[j]
+            hamiltonian += -t*Dagger(fd[j])*fd[k]-t*Dagger(fd[k])*fd[j]
+    momentequalities = [n-sum(Dagger(br)*br for br in _b)]
+    return _b, {"level": level,
+                "objective": hamiltonian,
+                "substitutions": fermionic_constraints(_b),
+                "momentequalities": momentequalities}
+
+
+def get_bosonic_lattice(n_modes, level=2):
+    """Chain of coupled harmonic oscillators.
+
+    :param n_modes: The number of bosonic modes.
+    :type n_modes: int.
+    :param level: The level of the relaxation.
+    :type level: int.
+    """
+    a = generate_operators('a', n_modes)
+    hamiltonian = sum(Dagger(a[i]) * a[i] for i in range(n_modes))
+    for i in range(n_modes - 1):
+        hamiltonian += 0.1*(Dagger(a[i]) * a[i + 1] + Dagger(a[i + 1]) * a[i])
+    return a, {"level": level,
+               "objective": hamiltonian,
+               "substitutions": bosonic_constraints(a)}
+
+
+def get_commutative_problem(n_vars, level=2):
+    """Chained Rosenbrock function over a ball and a box, a commutative
+    problem in the style of Gloptipoly.
+
+    :param n_vars: The number of variables.
+    :type n_vars: int.
+    :param level: The level of the relaxation.
+    :type level: int.
+    """
+    x = generate_variables('x', n_vars, commutative=True)
+    objective = sum(100*(x[i + 1] - x[i]**2)**2 + (1 - x[i])**2
+                    for i in range(n_vars - 1))
+    inequalities = [n_vars - sum(xi**2 for xi in x)]
+    inequalities.extend(4 - xi**2 for xi in x)
+    return x, {"level": level,
+               "objective": objective,
+               "inequalities": inequalities}
+
+
+def get_max_cut(n_nodes, level=2):
+    """MaxCut on a band graph with a sparse chordal extension.
+
+    :param n_nodes: The number of nodes of the graph.
+    :type n_nodes: int.
+    :param level: The level of the relaxation.
+    :type level: int.
+    """
+    W = np.zeros((n_nodes, n_nodes))
+    for k in (1, 2):
+        W += np.diag(np.ones(n_nodes - k), k) + \
+            np.diag(np.ones(n_nodes - k), -k)
+    Q = (np.diag(np.dot(np.ones(len(W)).T, W)) - W) / 4
+    x = generate_variables('x', n_nodes, commutative=True)
+    objective = -np.dot(x, np.dot(Q, np.transpose(x)))
+    return x, {"level": level,
+               "objective": objective,
+               "substitutions": dict((xi**2, 1) for xi in x),
+               "chordal_extension": True}
+
+
+PROBLEMS = {"npa": (get_npa_problem, [2, 3, 4]),
+            "fermionic": (get_fermionic_lattice, [2, 3]),
+            "bosonic": (get_bosonic_lattice, [2, 3, 4]),
+            "commutative": (get_commutative_problem, [4, 8, 12]),
+            "maxcut": (get_max_cut, [8, 16, 32])}
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains a first-order solver for the SDP relaxation that only
+needs NumPy. It is an alternating direction method of multipliers (ADMM) on
+the standard form of the relaxation, similar to the splitting of SCS.
+
+Created on Sun Oct 18 15:21:47 2026
+
+@author: Peter Wittek
+"""
+from __future__ import division, print_function
+import time
+import numpy as np
+from .resource_utils import run_with_limits
+from .sdpa_utils import convert_to_block_coo_arrays
+
+
+def get_cone_layout(block_struct):
+    """Map the blocks of the SDP to the segments of the vector of the
+    first-order solver. Blocks larger than 1x1 are stored as their upper
+    triangles, and 1x1 blocks and diagonal blocks as their diagonals.
+
+    :returns: tuple of the length of the vector and for each block the
+              position of its first element.
+    """
+    starts, length = [], 0
+    for block_size in block_struct:
+        starts.append(length)
+        if block_size > 1:
+            length += block_size * (block_size + 1) // 2
+        else:
+            length += abs(block_size)
+    return length, starts
+
+
+def convert_to_admm(sdpRelaxation):
+    """Convert the SDP relaxation to the standard form of the first-order
+    solver: minimize c^T x subject to A x + b = s, where s is in the product
+    of the positive semidefinite cones of the blocks and the nonnegative
+    orthant of the 1x1 and diagonal blocks. The off-diagonal elements are
+    scaled by sqrt(2), so that the Euclidean inner product of two vectors is
+    the trace inner product of the corresponding matrices.
+
+    :param sdpRelaxation: The SDP relaxation to convert.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+
+    :returns: tuple of the objective vector c, the triplets of the sparse
+              matrix A as a tuple of arrays, and the vector b.
+    """
+    if sdpRelaxation.complex_matrix:
+        raise Exception("The first-order solver does not support complex "
+                        "SDPs.")
+    n_vars = sdpRelaxation.n_vars
+    block_struct = sdpRelaxation.block_struct
+    length, starts = get_cone_layout(block_struct)
+    _, columns, values, block_index, i, j = \
+        convert_to_block_coo_arrays(sdpRelaxation)
+    widths = np.asarray(block_struct)[block_index]
+    is_psd = widths > 1
+    # Only the upper triangle of the blocks is stored
+    keep = ~is_psd | (i <= j)
+    block_index, i, j, widths, is_psd, columns, values = \
+        block_index[keep], i[keep], j[keep], widths[keep], is_psd[keep], \
+        columns[keep], values[keep]
+    # The elements of 1x1 and diagonal blocks are in the first row
+    positions = np.asarray(starts)[block_index] + \
+        np.where(is_psd, i * (2 * widths - i + 1) // 2 + j - i, j)
+    values = np.where(is_psd & (i != j), np.sqrt(2) * values, values)
+    constant = columns == 0
+    b = np.zeros(length)
+    b[positions[constant]] = values[constant]
+    c = np.asarray(sdpRelaxation.obj_facvar[:n_vars], dtype=np.float64)
+    return c, (positions[~constant], columns[~constant] - 1,
+               values[~constant]), b
+
+
+def _get_sparse_operators(triplets, shape):
+    """Return the product of a sparse matrix and of its transpose with a
+    vector.
+    """
+    rows, columns, values = triplets
+    try:
+        from scipy.sparse import coo_matrix
+    except ImportError:
+        def matvec(x):
+            return np.bincount(rows, values * x[columns], minlength=shape[0])
+
+        def rmatvec(x):
+            return np.bincount(columns, values * x[rows],
+                               minlength=shape[1])
+    else:
+        A = coo_matrix((values, (rows, columns)), shape=shape).tocsr()
+        AT = A.T.tocsr()
+        matvec, rmatvec = A.dot, AT.dot
+    return matvec, rmatvec
+
+
+def _unpack_block(vector, block_size):
+    """Convert the scaled upper triangle of a block to a symmetric matrix.
+    """
+    i, j = np.triu_indices(block_size)
+    values = np.where(i == j, vector, vector / np.sqrt(2))
+    matrix = np.zeros((block_size, block_size))
+    matrix[i, j] = values
+    matrix[j, i] = values
+    return matrix
+
+
+def _pack_block(matrix):
+    """Convert a symmetric matrix to its scaled upper triangle.
+    """
+    i, j = np.triu_indices(matrix.shape[0])
+    return np.where(i == j, matrix[i, j], np.sqrt(2) * matrix[i, j])
+
+
+def project_to_cone(vector, block_struct, starts):
+    """Project a vector to the cone of the first-order solver, which is the
+    product of the positive semidefinite cones of the blocks larger than 1x1
+    and the nonnegative orthant of the rest.
+    """
+    result = np.maximum(vector, 0)
+    for block_size, start in zip(block_struct, starts):
+        if block_size > 1:
+            end = start + block_size * (block_size + 1) // 2
+            eigenvalues, eigenvectors = \
+                np.linalg.eigh(_unpack_block(vector[start:end], block_size))
+            eigenvalues = np.maximum(eigenvalues, 0)
+            result[start:end] = _pack_block(
+                (eigenvectors * eigenvalues).dot(eigenvectors.T))
+    return result
+
+
+def unpack_solution(vector, block_struct, starts):
+    """Convert a vector of the first-order solver to a list of matrices in
+    the same block structure as the solutions of the other solvers.
+    """
+    blocks = []
+    for block_size, start in zip(block_struct, starts):
+        if block_size > 1:
+            end = start + block_size * (block_size + 1) // 2
+            blocks.append(_unpack_block(vector[start:end], block_size))
+        else:
+            blocks.append(np.diag(vector[start:start + abs(block_size)]))
+    return blocks
+
+
+def pack_solution(blocks, block_struct, starts, length):
+    """Convert a list of matrices in the block structure of the solution to a
+    vector of the first-order solver.
+    """
+    vector = np.zeros(length)
+    for block, block_size, start in zip(blocks, block_struct, starts):
+        block = np.asarray(block, dtype=np.float64)
+        if block_size > 1:
+            end = start + block_size * (block_size + 1) // 2
+            vector[start:end] = _pack_block(block)
+        else:
+            vector[start:start + abs(block_size)] = np.diag(block)
+    return vector
+
+
+def _conjugate_gradient(operator, rhs, x, preconditioner, tolerance,
+                        max_iters):
+    """Solve a positive definite system of linear equations with the
+    preconditioned conjugate gradient method, starting from x.
+    """
+    residual = rhs - operator(x)
+    z = preconditioner * residual
+    direction = z
+    rz = residual.dot(z)
+    threshold = tolerance * max(np.linalg.norm(rhs), 1)
+    for _ in range(max_iters):
+        if np.linalg.norm(residual) < threshold:
+            break
+        product = operator(direction)
+        step = rz / direction.dot(product)
+        x = x + step * direction
+        residual = residual - step * product
+        z = preconditioner * residual
+        rz_next = residual.dot(z)
+        direction = z + (rz_next / rz) * direction
+        rz = rz_next
+    return x
+
+
+def fit_variables(sdpRelaxation, x_mat):
+    """Find the values of the SDP variables that reproduce the primal
+    solution matrices in the least-squares sense. The primal solution of a
+    previous solve yields the moments this way.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param x_mat: The primal solution matrices.
+    :type x_mat: list of :class:`numpy.array`.
+
+    :returns: :class:`numpy.array` of the values of the SDP variables.
+    """
+    block_struct = sdpRelaxation.block_struct
+    length, starts = get_cone_layout(block_struct)
+    c, triplets, b = convert_to_admm(sdpRelaxation)
+    n_vars = len(c)
+    matvec, rmatvec = _get_sparse_operators(triplets, (length, n_vars))
+    sigma = 1e-10
+
+    def normal_operator(x):
+        return sigma * x + rmatvec(matvec(x))
+
+    preconditioner = 1 / (sigma + np.bincount(triplets[1], triplets[2] ** 2,
+                                              minlength=n_vars))
+    s = pack_solution(x_mat, block_struct, starts, length)
+    return _conjugate_gradient(normal_operator, rmatvec(s - b),
+                               np.zeros(n_vars), preconditioner, 1e-12,
+                               n_vars)
+
+
+def shift_to_interior(blocks, block_struct, margin):
+    """Shift the eigenvalues of the solution matrices, so that the smallest
+    one is at least `margin`. Interior-point methods need a starting point in
+    the interior of the cone.
+
+    :param blocks: The solution matrices.
+    :type blocks: list of :class:`numpy.array`.
+    :param block_struct: The block structure of the SDP.
+    :type block_struct: list of int.
+    :param margin: The smallest eigenvalue after the shift.
+    :type margin: float.
+
+    :returns: list of :class:`numpy.array`.
+    """
+    shifted = []
+    for block, block_size in zip(blocks, block_struct):
+        block = np.asarray(block, dtype=np.float64)
+        if block_size > 1:
+            smallest = np.linalg.eigvalsh(block)[0]
+            shifted.append(block + max(margin - smallest, 0) *
+                           np.eye(block_size))
+        else:
+            shifted.append(np.diag(np.maximum(np.diag(block), margin)))
+    return shifted
+
+
+def solve_with_admm(sdpRelaxation, solverparameters=None):
+    """Helper function to solve the SDP relaxation with the built-in
+    first-order solver. It does not need any external solver, but it only
+    converges to a moderate accuracy.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solverparameters: Optional parameters to the solver:
+
+                               - `"eps"`: Relative tolerance of the
+                                 residuals and the duality gap. The default
+                                 is 1e-6.
+                               - `"max_iters"`: Maximum number of
+                                 iterations. The default is 20000.
+                               - `"rho"`: Initial penalty parameter. The
+                                 default is 1.0.
+                               - `"alpha"`: Over-relaxation parameter. The
+                                 default is 1.6.
+                               - `"warm_start"`: Tuple of the primal and
+                                 dual solution matrices of a previous solve,
+                                 in the form of `x_mat` and `y_mat`.
+                               - `"timeout"`: Wall-clock limit in seconds.
+                                 The iterate at the limit is returned.
+                               - `"memory_limit"`: Memory limit in bytes.
+    :type solverparameters: dict.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    parameters = {"eps": 1e-6, "max_iters": 20000, "rho": 1.0, "alpha": 1.6,
+                  "warm_start": None, "timeout": None, "memory_limit": None}
+    if solverparameters is not None:
+        parameters.update(solverparameters)
+    if parameters["memory_limit"] is not None:
+        memory_limit = parameters["memory_limit"]
+        parameters["memory_limit"] = None
+        return run_with_limits(solve_with_admm, sdpRelaxation, parameters,
+                               memory_limit=memory_limit)
+    tstart = time.time()
+    eps, rho, alpha = parameters["eps"], parameters["rho"], parameters["alpha"]
+    block_struct = sdpRelaxation.block_struct
+    length, starts = get_cone_layout(block_struct)
+    c, triplets, b = convert_to_admm(sdpRelaxation)
+    n_vars = len(c)
+    matvec, rmatvec = _get_sparse_operators(triplets, (length, n_vars))
+    # The proximal term keeps the linear system positive definite
+    sigma = 1e-6
+
+    def normal_operator(x):
+        return sigma * x + rmatvec(matvec(x))
+
+    preconditioner = 1 / (sigma + np.bincount(triplets[1], triplets[2] ** 2,
+                                              minlength=n_vars))
+    s, u, x = np.zeros(length), np.zeros(length), np.zeros(n_vars)
+    if parameters["warm_start"] is not None:
+        x_mat, y_mat = parameters["warm_start"]
+        if x_mat is not None:
+            s = pack_solution(x_mat, block_struct, starts, length)
+            x = fit_variables(sdpRelaxation, x_mat)
+        if y_mat is not None:
+            u = -pack_solution(y_mat, block_struct, starts, length) / rho
+    norm_b, norm_c = np.linalg.norm(b), np.linalg.norm(c)
+    status = "unknown"
+    for iteration in range(parameters["max_iters"]):
+        x = _conjugate_gradient(normal_operator,
+                                sigma * x + rmatvec(s - b - u) - c / rho, x,
+                                preconditioner, 1e-10, n_vars)
+        affine = matvec(x) + b
+        relaxed = alpha * affine + (1 - alpha) * s
+        s = project_to_cone(relaxed + u, block_struct, starts)
+        u += relaxed - s
+        if iteration % 10 != 9:
+            continue
+        dual_vector = -rho * u
+        primal_residual = np.linalg.norm(affine - s) / (1 + norm_b)
+        dual_residual = np.linalg.norm(rmatvec(dual_vector) - c) / \
+            (1 + norm_c)
+        primal, dual = c.dot(x), -b.dot(dual_vector)
+        gap = abs(primal - dual) / (1 + abs(primal) + abs(dual))
+        if sdpRelaxation.verbose > 0 and iteration % 100 == 99:
+            print("%6d  %.2e  %.2e  %.2e  % .6e" %
+                  (iteration + 1, primal_residual, dual_residual, gap,
+                   primal))
+        if max(primal_residual, dual_residual, gap) < eps:
+            status = "optimal"
+            break
+        if parameters["timeout"] is not None and \
+                time.time() - tstart > parameters["timeout"]:
+            status = "timeout"
+            break
+        # Balance the residuals by adapting the penalty parameter
+        if primal_residual > 10 * dual_residual:
+            rho *= 2
+            u /= 2
+        elif dual_residual > 10 * primal_residual:
+            rho /= 2
+            u *= 2
+    dual_vector = -rho * u
+    x_mat = unpack_solution(s, block_struct, starts)
+    y_mat = unpack_solution(dual_vector, block_struct, starts)
+    primal = c.dot(x) + sdpRelaxation.constant_term
+    dual = -b.dot(dual_vector) + sdpRelaxation.constant_term
+    return primal, dual, x_mat, y_mat, status
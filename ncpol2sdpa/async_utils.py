@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains the asynchronous interface to the solvers. It requires
+Python 3.7 or later.
+
+Created on Sun Oct 18 16:40:12 2026
+
+@author: Peter Wittek
+"""
+import asyncio
+import time
+from .resource_utils import get_cut_short_solution, get_preexec_function, \
+    split_limits
+from .sdpa_utils import prepare_sdpa_run, parse_sdpa_run, remove_sdpa_files
+from .solver_common import check_storage, select_solver, \
+    get_solver_function, store_solution
+
+
+async def run_sdpa_async(sdpRelaxation, solverparameters=None,
+                         executor=None):
+    """Write out the SDP problem, run SDPA as an asynchronous subprocess, and
+    parse the output. The input file is written and the output is parsed in
+    the executor, so only the subprocess is awaited on the event loop.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solverparameters: Optional parameters to SDPA.
+    :type solverparameters: dict of str.
+    :param executor: Optional executor for writing the input file and
+                     parsing the output. The default executor of the event
+                     loop is used if it is not provided.
+    :type executor: :class:`concurrent.futures.Executor`.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    loop = asyncio.get_running_loop()
+    _, timeout, memory_limit = split_limits(solverparameters)
+    command_line, tmp_out_filename, tmp_filenames = \
+        await loop.run_in_executor(executor, prepare_sdpa_run, sdpRelaxation,
+                                   solverparameters)
+    kwargs = {"preexec_fn": get_preexec_function(memory_limit)}
+    if sdpRelaxation.verbose < 1:
+        kwargs["stdout"] = asyncio.subprocess.DEVNULL
+        kwargs["stderr"] = asyncio.subprocess.DEVNULL
+    process = await asyncio.create_subprocess_exec(*command_line, **kwargs)
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        remove_sdpa_files(sdpRelaxation, tmp_filenames)
+        return get_cut_short_solution("timeout")
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        remove_sdpa_files(sdpRelaxation, tmp_filenames)
+        raise
+    return await loop.run_in_executor(executor, parse_sdpa_run, sdpRelaxation,
+                                      tmp_out_filename, tmp_filenames,
+                                      process.returncode, memory_limit)
+
+
+async def solve_sdp_async(sdpRelaxation, solver=None, solverparameters=None,
+                          warm_start=False, executor=None, storage=None):
+    """Call a solver on the SDP relaxation without blocking the event loop.
+    SDPA runs as an asynchronous subprocess, and the other solvers run in an
+    executor. Upon successful solution, the primal and dual objective values
+    along with the solution matrices are set in the `sdpRelaxation` object,
+    as in :func:`ncpol2sdpa.solver_common.solve_sdp`. The relaxation must not
+    be modified until the solution is done, but other relaxations can be
+    generated in the meanwhile.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solver: The solver to be called, either `None`, "sdpa", "mosek",
+                   "cvxopt", or "admm". The default is `None`, which triggers
+                   autodetect.
+    :type solver: str.
+    :param solverparameters: Parameters to be passed to the solver, as in
+                             :func:`ncpol2sdpa.solver_common.solve_sdp`.
+    :type solverparameters: dict of str.
+    :param warm_start: Optional parameter to start from the current solution
+                       of the relaxation if it is solved.
+    :type warm_start: bool.
+    :param executor: Optional executor for the solvers that run in the
+                     Python process, and for writing and parsing the files
+                     of SDPA. The default executor of the event loop is used
+                     if it is not provided.
+    :type executor: :class:`concurrent.futures.Executor`.
+    :param storage: Optional parameter to keep the solution matrices in a
+                    memory-mapped file, as in
+                    :func:`ncpol2sdpa.solver_common.solve_sdp`.
+    :type storage: str.
+    :returns: tuple of the primal and dual optimum, and the solutions for the
+              primal and dual.
+    """
+    check_storage(storage)
+    solver, solverparameters = select_solver(sdpRelaxation, solver,
+                                             solverparameters, warm_start)
+    tstart = time.time()
+    if solver == "sdpa":
+        solution = await run_sdpa_async(sdpRelaxation, solverparameters,
+                                        executor)
+    else:
+        loop = asyncio.get_running_loop()
+        solution = await loop.run_in_executor(executor,
+                                              get_solver_function(solver),
+                                              sdpRelaxation, solverparameters)
+    return store_solution(sdpRelaxation, solution, time.time() - tstart,
+                          storage)
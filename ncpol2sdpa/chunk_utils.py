@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains the out-of-core storage of the finished blocks of the
+SDP. The rows of `F_struct` are moved to memory-mapped NPY chunks of
+triplets, so that the lil_matrix only holds the rows of the block that is
+being generated. The first row of the lil_matrix is the first row that was
+not moved.
+
+Created on Sun Oct 18 23:58:21 2026
+
+@author: Peter Wittek
+"""
+import os
+import tempfile
+from itertools import chain
+import numpy as np
+
+#: The number of nonzero elements in a chunk file.
+CHUNK_SIZE = 2 ** 20
+
+
+class TripletChunks(object):
+    """Row indices, column indices, and values of the nonzero elements of the
+    first rows of `F_struct` in memory-mapped NPY files. The rows are moved
+    in increasing order, and they are collected in memory until there are
+    enough of them to fill a chunk.
+
+    :param dtype: The data type of the values.
+    :type dtype: :class:`numpy.dtype`.
+    :param directory: Optional parameter for specifying the directory of the
+                      chunk files. By default, the temporary directory is
+                      used.
+    :type directory: str.
+    :param chunk_size: Optional parameter of the number of nonzero elements
+                       in a chunk file. The default is `CHUNK_SIZE`.
+    :type chunk_size: int.
+    """
+
+    def __init__(self, dtype, directory=None, chunk_size=None):
+        self.dtype = np.dtype([("row", np.int64), ("column", np.int64),
+                               ("value", dtype)])
+        self.directory = directory
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        #: The rows below this one are stored in the chunks.
+        self.end_row = 0
+        self._chunks = []
+        self._first_rows = []
+        self._buffer = []
+        self._buffer_size = 0
+        self._filenames = []
+
+    def __iter__(self):
+        """Iterate over the triplets in chunks of row-sorted arrays of row
+        indices, column indices, and values.
+        """
+        for triplets in chain(self._chunks, self._get_buffer()):
+            yield triplets["row"], triplets["column"], triplets["value"]
+
+    def __del__(self):
+        self._chunks = []
+        for filename in getattr(self, "_filenames", []):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    @property
+    def nnz(self):
+        """The number of nonzero elements stored.
+        """
+        return sum(len(chunk) for chunk in self._chunks) + self._buffer_size
+
+    def spill(self, F_struct, end_row):
+        """Move the rows of `F_struct`, which start at the end of the rows
+        stored so far, up to `end_row` to the chunks. The lil_matrix has to be
+        replaced by one that starts at `end_row` afterwards.
+
+        :param F_struct: The lil_matrix of the SDP.
+        :type F_struct: :class:`scipy.sparse.lil_matrix`.
+        :param end_row: The first row that is not moved.
+        :type end_row: int.
+        """
+        if end_row <= self.end_row:
+            return
+        rows, columns, values = \
+            get_lil_triplets(F_struct, 0, min(end_row - self.end_row,
+                                              F_struct.shape[0]))
+        triplets = np.empty(len(rows), dtype=self.dtype)
+        triplets["row"], triplets["column"], triplets["value"] = \
+            rows + self.end_row, columns, values
+        self.end_row = end_row
+        if len(triplets) > 0:
+            self._buffer.append(triplets)
+            self._buffer_size += len(triplets)
+        if self._buffer_size >= self.chunk_size:
+            self._flush()
+
+    def load(self, rows, columns, values, end_row):
+        """Store the triplets of the rows up to `end_row` in memory instead
+        of in chunk files, for instance, in the copy of the relaxation that
+        is sent to a solver process.
+
+        :param rows: The row indices sorted in increasing order.
+        :type rows: :class:`numpy.array`.
+        :param columns: The column indices.
+        :type columns: :class:`numpy.array`.
+        :param values: The values.
+        :type values: :class:`numpy.array`.
+        :param end_row: The first row that is not stored.
+        :type end_row: int.
+        """
+        self.truncate(0)
+        triplets = np.empty(len(rows), dtype=self.dtype)
+        triplets["row"], triplets["column"], triplets["value"] = \
+            rows, columns, values
+        self._buffer, self._buffer_size = [triplets], len(triplets)
+        self.end_row = end_row
+
+    def truncate(self, row):
+        """Drop the rows starting from `row`, for instance, when the
+        constraints are replaced.
+
+        :param row: The first row to drop.
+        :type row: int.
+        """
+        if row >= self.end_row:
+            return
+        buffer = self._get_buffer()
+        self._buffer, self._buffer_size = [], 0
+        while self._chunks and self._first_rows[-1] >= row:
+            self._chunks.pop()
+            self._first_rows.pop()
+        if self._chunks and self._chunks[-1]["row"][-1] >= row:
+            buffer.insert(0, np.array(self._chunks.pop()))
+            self._first_rows.pop()
+        for triplets in buffer:
+            triplets = triplets[triplets["row"] < row]
+            if len(triplets) > 0:
+                self._buffer.append(triplets)
+                self._buffer_size += len(triplets)
+        self.end_row = row
+
+    def get_row(self, row):
+        """Return the column indices and the values of a row that was moved
+        to the chunks.
+
+        :param row: The row.
+        :type row: int.
+        :returns: tuple of :class:`numpy.array`.
+        """
+        k = np.searchsorted(self._first_rows, row, side="right") - 1
+        candidates = self._get_buffer()
+        if k >= 0:
+            candidates.insert(0, self._chunks[k])
+        for triplets in candidates:
+            start, end = np.searchsorted(triplets["row"], [row, row + 1])
+            if end > start:
+                return triplets["column"][start:end], \
+                    triplets["value"][start:end]
+        return np.zeros(0, dtype=np.int64), \
+            np.zeros(0, dtype=self.dtype["value"])
+
+    def get_rows(self, start, end):
+        """Return the triplets of a range of rows that were moved to the
+        chunks.
+
+        :param start: The first row.
+        :type start: int.
+        :param end: The row after the last row.
+        :type end: int.
+        :returns: tuple of :class:`numpy.array` of the row indices, column
+                  indices, and values.
+        """
+        k = max(np.searchsorted(self._first_rows, start, side="right") - 1, 0)
+        parts = []
+        for triplets in chain(self._chunks[k:], self._get_buffer()):
+            first, last = np.searchsorted(triplets["row"], [start, end])
+            parts.append(triplets[first:last])
+            if last < len(triplets):
+                break
+        triplets = np.concatenate(parts) if parts else \
+            np.zeros(0, dtype=self.dtype)
+        return triplets["row"], triplets["column"], triplets["value"]
+
+    def get_selected_rows(self, rows):
+        """Return the triplets of a set of rows that were moved to the
+        chunks. Only the chunks that contain any of the rows are read.
+
+        :param rows: The distinct rows in increasing order.
+        :type rows: :class:`numpy.array`.
+        :returns: tuple of :class:`numpy.array` of the row indices, column
+                  indices, and values.
+        """
+        chunk_indices = np.unique(np.searchsorted(self._first_rows, rows,
+                                                  side="right") - 1)
+        parts = [_select_rows(self._chunks[k], rows)
+                 for k in chunk_indices if k >= 0]
+        parts.extend(_select_rows(triplets, rows)
+                     for triplets in self._get_buffer())
+        triplets = np.concatenate(parts) if parts else \
+            np.zeros(0, dtype=self.dtype)
+        return triplets["row"], triplets["column"], triplets["value"]
+
+    def _get_buffer(self):
+        if len(self._buffer) > 1:
+            self._buffer = [np.concatenate(self._buffer)]
+        return list(self._buffer)
+
+    def _flush(self):
+        triplets = self._get_buffer()[0]
+        handle, filename = tempfile.mkstemp(suffix=".npy",
+                                            dir=self.directory)
+        os.close(handle)
+        chunk = np.lib.format.open_memmap(filename, mode="w+",
+                                          dtype=self.dtype,
+                                          shape=triplets.shape)
+        chunk[:] = triplets
+        chunk.flush()
+        # The mapping remains valid after the file is unlinked on POSIX
+        # systems; elsewhere the file is removed with the object
+        try:
+            os.remove(filename)
+        except OSError:
+            self._filenames.append(filename)
+        self._chunks.append(chunk)
+        self._first_rows.append(triplets["row"][0])
+        self._buffer, self._buffer_size = [], 0
+
+
+def _select_rows(triplets, rows):
+    starts = np.searchsorted(triplets["row"], rows)
+    counts = np.searchsorted(triplets["row"], rows, side="right") - starts
+    positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+        np.arange(counts.sum())
+    return triplets[positions]
+
+
+def get_lil_triplets(F_struct, start, end):
+    """Return the triplets of a range of rows of a lil_matrix.
+
+    :returns: tuple of :class:`numpy.array` of the row indices, column
+              indices, and values.
+    """
+    lengths = np.fromiter((len(row) for row in F_struct.rows[start:end]),
+                          dtype=np.int64, count=end - start)
+    rows = np.repeat(np.arange(start, end, dtype=np.int64), lengths)
+    columns = np.fromiter(chain.from_iterable(F_struct.rows[start:end]),
+                          dtype=np.int64, count=len(rows))
+    values = np.fromiter(chain.from_iterable(F_struct.data[start:end]),
+                         dtype=F_struct.dtype, count=len(rows))
+    return rows, columns, values
+
+
+def get_first_row(F_chunks):
+    """Return the row of the SDP that is the first row of `F_struct`, which
+    is not zero in the out-of-core mode.
+
+    :param F_chunks: The chunks of the rows that were moved out of
+                     `F_struct`, or None.
+    :type F_chunks: :class:`ncpol2sdpa.chunk_utils.TripletChunks`.
+    :returns: int.
+    """
+    if F_chunks is None:
+        return 0
+    return F_chunks.end_row
+
+
+def get_rows(F_struct, F_chunks, start, end):
+    """Return the triplets of a range of rows of the SDP, which are either in
+    `F_struct` or in the chunks.
+
+    :param F_struct: The lil_matrix of the SDP.
+    :type F_struct: :class:`scipy.sparse.lil_matrix`.
+    :param F_chunks: The chunks of the rows that were moved out of
+                     `F_struct`, or None.
+    :type F_chunks: :class:`ncpol2sdpa.chunk_utils.TripletChunks`.
+    :param start: The first row.
+    :type start: int.
+    :param end: The row after the last row.
+    :type end: int.
+    :returns: tuple of :class:`numpy.array` of the row indices, column
+              indices, and values.
+    """
+    first_row = get_first_row(F_chunks)
+    start_in_memory = max(start, first_row) - first_row
+    end_in_memory = max(min(end - first_row, F_struct.shape[0]),
+                        start_in_memory)
+    rows, columns, values = get_lil_triplets(F_struct, start_in_memory,
+                                             end_in_memory)
+    in_memory = rows + first_row, columns, values
+    if start >= first_row:
+        return in_memory
+    spilled = F_chunks.get_rows(start, min(end, first_row))
+    return tuple(np.concatenate([spilled[k], in_memory[k]]) for k in range(3))
+
+
+def get_selected_rows(F_struct, F_chunks, rows):
+    """Return the triplets of a set of rows of the SDP, which are either in
+    `F_struct` or in the chunks.
+
+    :param F_struct: The lil_matrix of the SDP.
+    :type F_struct: :class:`scipy.sparse.lil_matrix`.
+    :param F_chunks: The chunks of the rows that were moved out of
+                     `F_struct`, or None.
+    :type F_chunks: :class:`ncpol2sdpa.chunk_utils.TripletChunks`.
+    :param rows: The distinct rows in increasing order.
+    :type rows: :class:`numpy.array`.
+    :returns: tuple of :class:`numpy.array` of the row indices, column
+              indices, and values.
+    """
+    parts = []
+    first_row = get_first_row(F_chunks)
+    split = np.searchsorted(rows, first_row)
+    if split > 0:
+        parts.append(F_chunks.get_selected_rows(rows[:split]))
+    rows = rows[split:]
+    rows = rows[rows < first_row + F_struct.shape[0]]
+    lil_rows = F_struct.rows[rows - first_row]
+    lil_data = F_struct.data[rows - first_row]
+    lengths = np.fromiter((len(row) for row in lil_rows), dtype=np.int64,
+                          count=len(rows))
+    parts.append((np.repeat(rows, lengths),
+                  np.fromiter(chain.from_iterable(lil_rows), dtype=np.int64,
+                              count=lengths.sum()),
+                  np.fromiter(chain.from_iterable(lil_data),
+                              dtype=F_struct.dtype, count=lengths.sum())))
+    return tuple(np.concatenate([part[k] for part in parts])
+                 for k in range(3))
+
+
+def get_row(F_struct, F_chunks, row):
+    """Return the column indices and the values of a row of the SDP, which
+    is either in `F_struct` or in the chunks.
+
+    :param F_struct: The lil_matrix of the SDP.
+    :type F_struct: :class:`scipy.sparse.lil_matrix`.
+    :param F_chunks: The chunks of the rows that were moved out of
+                     `F_struct`, or None.
+    :type F_chunks: :class:`ncpol2sdpa.chunk_utils.TripletChunks`.
+    :param row: The row.
+    :type row: int.
+    :returns: tuple of lists or of :class:`numpy.array`.
+    """
+    first_row = get_first_row(F_chunks)
+    if row < first_row:
+        return F_chunks.get_row(row)
+    if row - first_row >= F_struct.shape[0]:
+        return [], []
+    return F_struct.rows[row - first_row], F_struct.data[row - first_row]
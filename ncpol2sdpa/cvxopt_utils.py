@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains helper functions to solve the SDP relaxation directly
+with the semidefinite solver of CVXOPT.
+
+Created on Sun Oct 18 14:02:11 2026
+
+@author: Peter Wittek
+"""
+from __future__ import print_function
+import numpy as np
+from .admm_utils import fit_variables, shift_to_interior
+from .resource_utils import run_with_limits, split_limits
+from .sdpa_utils import convert_to_block_coo_arrays, get_block_layout
+
+
+def convert_to_cvxopt(sdpRelaxation):
+    """Convert an SDP relaxation to the arguments of `cvxopt.solvers.sdp`.
+    The SDP variables are the variables of CVXOPT, every block larger than
+    1x1 is a linear matrix inequality, and the rest are linear
+    inequalities. The entries of the upper triangle of a block in
+    `F_struct` are in the same position as the corresponding entries of the
+    lower triangle in the column-major order of CVXOPT.
+
+    :param sdpRelaxation: The SDP relaxation to convert.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+
+    :returns: dict of the keyword arguments `c`, `Gl`, `hl`, `Gs`, and `hs`.
+    """
+    from cvxopt import matrix, spmatrix
+    if sdpRelaxation.complex_matrix:
+        raise Exception("The CVXOPT backend does not support complex SDPs.")
+    n_vars = sdpRelaxation.n_vars
+    block_struct = sdpRelaxation.block_struct
+    psd_dims, n_linear, offsets = get_block_layout(block_struct)
+    _, columns, values, block_index, i, j = \
+        convert_to_block_coo_arrays(sdpRelaxation)
+    local_rows = i * np.abs(block_struct)[block_index] + j
+    # The constraint is F_0 + sum_k x_k F_k = h - G x
+    values = np.where(columns == 0, values, -values)
+    c = matrix(np.asarray(sdpRelaxation.obj_facvar[:n_vars],
+                          dtype=np.float64), (n_vars, 1))
+    Gs, hs = [], []
+    for block, block_size in enumerate(block_struct):
+        if block_size < 2:
+            continue
+        start, end = np.searchsorted(block_index, [block, block + 1])
+        constant = columns[start:end] == 0
+        Gs.append(spmatrix(values[start:end][~constant].tolist(),
+                           local_rows[start:end][~constant].tolist(),
+                           (columns[start:end][~constant] - 1).tolist(),
+                           (block_size ** 2, n_vars)))
+        h = np.zeros(block_size ** 2)
+        h[local_rows[start:end][constant]] = values[start:end][constant]
+        hs.append(matrix(h, (block_size, block_size)))
+    kwargs = {"c": c, "Gs": Gs, "hs": hs}
+    if n_linear > 0:
+        is_linear = np.asarray(block_struct)[block_index] < 2
+        linear_rows = np.asarray(offsets)[block_index[is_linear]] + \
+            local_rows[is_linear]
+        constant = columns[is_linear] == 0
+        kwargs["Gl"] = spmatrix(values[is_linear][~constant].tolist(),
+                               linear_rows[~constant].tolist(),
+                               (columns[is_linear][~constant] - 1).tolist(),
+                               (n_linear, n_vars))
+        h = np.zeros(n_linear)
+        h[linear_rows[constant]] = values[is_linear][constant]
+        kwargs["hl"] = matrix(h, (n_linear, 1))
+    return kwargs
+
+
+def get_cvxopt_start(sdpRelaxation, x_mat, y_mat, margin=1e-1):
+    """Convert the solution matrices of a previous solve to the starting
+    point of `cvxopt.solvers.sdp`. The matrices are shifted to the interior
+    of the cone, since CVXOPT only accepts strictly feasible slacks.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param x_mat: The primal solution matrices.
+    :type x_mat: list of :class:`numpy.array`.
+    :param y_mat: The dual solution matrices.
+    :type y_mat: list of :class:`numpy.array`.
+    :param margin: The smallest eigenvalue of the starting point.
+    :type margin: float.
+
+    :returns: dict of the keyword arguments `primalstart` and `dualstart`.
+    """
+    from cvxopt import matrix
+    block_struct = sdpRelaxation.block_struct
+    start = {}
+    for key, blocks, name in (("primalstart", x_mat, "s"),
+                              ("dualstart", y_mat, "z")):
+        if blocks is None:
+            continue
+        blocks = shift_to_interior(blocks, block_struct, margin)
+        start[key] = {
+            name + "s": [matrix(block) for block, block_size
+                         in zip(blocks, block_struct) if block_size > 1],
+            name + "l": matrix(np.concatenate(
+                [np.diag(block) for block, block_size
+                 in zip(blocks, block_struct) if block_size < 2] +
+                [np.zeros(0)]))}
+    if "primalstart" in start:
+        start["primalstart"]["x"] = matrix(fit_variables(sdpRelaxation,
+                                                         x_mat))
+    return start
+
+
+def _symmetrize(lower):
+    lower = np.tril(np.array(lower))
+    return lower + np.tril(lower, -1).T
+
+
+def solve_with_cvxopt(sdpRelaxation, solverparameters=None):
+    """Helper function to solve the SDP relaxation with
+    `cvxopt.solvers.sdp`, and parse the output. Complex SDPs are solved
+    through PICOS.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solverparameters: Optional parameters to CVXOPT, which are
+                             passed on as options, except for
+                             `"warm_start"`, the tuple of the primal and
+                             dual solution matrices of a previous solve,
+                             and the limits `"timeout"` in seconds and
+                             `"memory_limit"` in bytes.
+    :type solverparameters: dict of str.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    parameters, timeout, memory_limit = split_limits(solverparameters)
+    if timeout is not None or memory_limit is not None:
+        # CVXOPT cannot be interrupted, so it runs in a separate process
+        return run_with_limits(solve_with_cvxopt, sdpRelaxation, parameters,
+                               timeout, memory_limit)
+    if sdpRelaxation.complex_matrix:
+        from .picos_utils import solve_with_picos
+        if solverparameters is not None:
+            solverparameters = dict((key, value) for key, value
+                                    in solverparameters.items()
+                                    if key != "warm_start")
+        return solve_with_picos(sdpRelaxation, solverparameters)
+    from cvxopt import solvers
+    options = {"show_progress": sdpRelaxation.verbose > 0}
+    if solverparameters is not None:
+        options.update(solverparameters)
+    warm_start = options.pop("warm_start", None)
+    kwargs = convert_to_cvxopt(sdpRelaxation)
+    if warm_start is not None:
+        kwargs.update(get_cvxopt_start(sdpRelaxation, *warm_start))
+    solution = solvers.sdp(options=options, **kwargs)
+    x_mat, y_mat = None, None
+    if solution["ss"] is not None and solution["zs"] is not None:
+        psd_solution = iter(zip(solution["ss"], solution["zs"]))
+        _, _, offsets = get_block_layout(sdpRelaxation.block_struct)
+        x_mat, y_mat = [], []
+        for block_size, offset in zip(sdpRelaxation.block_struct, offsets):
+            if block_size > 1:
+                ss, zs = next(psd_solution)
+                x_mat.append(_symmetrize(ss))
+                y_mat.append(_symmetrize(zs))
+            else:
+                width = abs(block_size)
+                x_mat.append(np.diag(np.array(
+                    solution["sl"][offset:offset+width]).flatten()))
+                y_mat.append(np.diag(np.array(
+                    solution["zl"][offset:offset+width]).flatten()))
+    primal, dual = solution["primal objective"], solution["dual objective"]
+    if primal is not None:
+        primal += sdpRelaxation.constant_term
+    if dual is not None:
+        dual += sdpRelaxation.constant_term
+    return primal, dual, x_mat, y_mat, solution["status"]
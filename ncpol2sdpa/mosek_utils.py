@@ -8,7 +8,9 @@ Created on Tue Nov 18 10:51:14 2014
 """
 import sys
 import numpy as np
-from .sdpa_utils import convert_row_to_sdpa_index
+from .resource_utils import run_with_limits, split_limits
+from .sdpa_utils import convert_rows_to_sdpa_indices, convert_to_coo_arrays, \
+    get_block_layout, get_row_offsets
 
 
 def streamprinter(text):
@@ -18,29 +20,30 @@ def streamprinter(text):
     sys.stdout.flush()
 
 
-def moseksol_to_xmat(vec, block_struct):
-    n = int(np.sqrt(1+8*len(vec))-1)/2
-    if n*(n+1)/2 != len(vec):
+def convert_mosek_triangle(vec, block_size):
+    """Convert the lower triangular part of a symmetric matrix returned by
+    MOSEK to a dense matrix.
+    """
+    if block_size*(block_size+1) // 2 != len(vec):
         raise ValueError('vec should be of dimension n(n+1)/2')
-    M = np.zeros((block_struct[0], block_struct[0]))
-    row, column, block, index = 0, 0, 0, 0
-    result = []
-    while True:
-        if column == block_struct[block]:
-            row += 1
-            column = row
-            index += sum(block_struct[block+1:])
-        if row == block_struct[block]:
-            result.append(M.copy())
-            block += 1
-            if block == len(block_struct):
-                break
-            M = np.zeros((block_struct[block], block_struct[block]))
-            row, column = 0, 0
-        M[row, column] = vec[index]
-        M[column, row] = vec[index]
-        index += 1
-        column += 1
+    M = np.zeros((block_size, block_size))
+    # The lower triangle stored column by column is the upper triangle
+    # stored row by row
+    rows, columns = np.triu_indices(block_size)
+    M[rows, columns] = vec
+    M[columns, rows] = vec
+    return M
+
+
+def get_mosek_array(function, soltype, length, *args):
+    """Retrieve a solution array from MOSEK. Older versions of MOSEK take the
+    array to fill as the last argument, newer ones return it.
+    """
+    result = np.zeros(length)
+    try:
+        function(soltype, *(args + (result,)))
+    except TypeError:
+        result = np.asarray(function(soltype, *args), dtype=np.float64)
     return result
 
 
@@ -48,23 +51,50 @@ def parse_mosek_solution(sdpRelaxation, task):
     import mosek
     soltype = mosek.soltype.itr
     primal, dual = task.getprimalobj(soltype), task.getdualobj(soltype)
+    bar_dims, n_linear, offsets = \
+        get_block_layout(sdpRelaxation.block_struct)
+    if n_linear > 0:
+        linear_primal = get_mosek_array(task.getxx, soltype,
+                                        task.getnumvar())[:n_linear]
+        linear_dual = get_mosek_array(task.getslx, soltype,
+                                      task.getnumvar())[:n_linear]
     x_mat, y_mat = [], []
-    size_ = sum(bs for bs in sdpRelaxation.block_struct)
-    primal_solution = np.zeros(size_*(size_+1) // 2)
-    task.getbarxj(soltype, 0, primal_solution)
-    y_mat = moseksol_to_xmat(primal_solution, sdpRelaxation.block_struct)
-    dual_solution = np.zeros(size_*(size_+1) // 2)
-    task.getbarsj(soltype, 0, dual_solution)
-    x_mat = moseksol_to_xmat(dual_solution, sdpRelaxation.block_struct)
+    for block_size, offset in zip(sdpRelaxation.block_struct, offsets):
+        if block_size > 1:
+            length = block_size*(block_size+1) // 2
+            y_mat.append(convert_mosek_triangle(
+                get_mosek_array(task.getbarxj, soltype, length, offset),
+                block_size))
+            x_mat.append(convert_mosek_triangle(
+                get_mosek_array(task.getbarsj, soltype, length, offset),
+                block_size))
+        else:
+            width = abs(block_size)
+            y_mat.append(np.diag(linear_primal[offset:offset+width]))
+            x_mat.append(np.diag(linear_dual[offset:offset+width]))
     status = repr(task.getsolsta(soltype))
     return primal, dual, x_mat, y_mat, status
 
 
 def solve_with_mosek(sdpRelaxation, solverparameters=None):
+    parameters, timeout, memory_limit = split_limits(solverparameters)
+    if memory_limit is not None:
+        # MOSEK has no memory limit of its own, so it runs in a separate
+        # process
+        if timeout is not None:
+            parameters["timeout"] = timeout
+        return run_with_limits(solve_with_mosek, sdpRelaxation, parameters,
+                               memory_limit=memory_limit)
     task = convert_to_mosek(sdpRelaxation)
-    if solverparameters is not None:
-        import mosek
-        for par, val in solverparameters.items():
+    import mosek
+    if timeout is not None:
+        task.putdouparam(mosek.dparam.optimizer_max_time, float(timeout))
+    if parameters is not None:
+        for par, val in parameters.items():
+            # The interior-point optimizer of MOSEK cannot be warm-started on
+            # conic problems
+            if par == "warm_start":
+                continue
             try:
                 #get rid of a leading "mosek."
                 if(par.startswith("mosek.")):
@@ -91,67 +121,74 @@ def solve_with_mosek(sdpRelaxation, solverparameters=None):
                     task.putstrparam(mskpar, val)
             except AttributeError:
                 raise Exception('No mosek parameter found with the name mosek(.iparam|.dparam|.sparam|).'+str(par)+' that takes a value of type '+str(type(val))+'. See the mosek python API manual for valid parameters.')
-    task.optimize()
+    termination_code = task.optimize()
     primal, dual, x_mat, y_mat, status = parse_mosek_solution(sdpRelaxation,
                                                               task)
+    if termination_code == mosek.rescode.trm_max_time:
+        status = "timeout"
     return -primal+sdpRelaxation.constant_term, \
            -dual+sdpRelaxation.constant_term, x_mat, y_mat, status
 
 
-def convert_to_mosek_index(block_struct, row_offsets, block_offsets, row):
+def convert_to_mosek_index(block_struct, row_offsets, rows):
     """MOSEK requires a specific sparse format to define the lower-triangular
     part of a symmetric matrix. This function does the conversion from the
-    sparse upper triangular matrix format of Ncpol2SDPA.
+    sparse upper triangular matrix format of Ncpol2SDPA for an array of rows.
+    It returns the block indices and the positions within the blocks. For
+    diagonal blocks, the position is the index of the diagonal element.
     """
-    block_index, i, j = convert_row_to_sdpa_index(block_struct, row_offsets,
-                                                  row)
-
-    offset = block_offsets[block_index]
-    ci = offset + i
-    cj = offset + j
-    return cj, ci  # Note that MOSEK expect lower-triangular matrices
+    block_index, i, j = convert_rows_to_sdpa_indices(np.abs(block_struct),
+                                                     row_offsets, rows)
+    diagonal = np.asarray(block_struct)[block_index] < 0
+    if np.any(diagonal):
+        local = rows[diagonal] - np.asarray(row_offsets)[block_index[diagonal]]
+        i[diagonal], j[diagonal] = local, local
+    return block_index, j, i  # Note that MOSEK expect lower-triangular matrices
 
 
 def convert_to_mosek_matrix(sdpRelaxation):
     """Converts the entire sparse representation of the Fi constraint matrices
-    to sparse MOSEK matrices.
+    to sparse MOSEK matrices, with one bar variable for each block larger
+    than 1x1 and linear variables for the rest. Index zero of the variables
+    stands for the objective function.
+
+    :returns: tuple of the entries on the bar variables as arrays of
+              variables, bar variables, rows, columns and values, sorted by
+              variable and bar variable, and the entries on the linear
+              variables as arrays of variables, linear variables and values.
     """
-    barci = []
-    barcj = []
-    barcval = []
-    barai = []
-    baraj = []
-    baraval = []
-    for k in range(sdpRelaxation.n_vars):
-        barai.append([])
-        baraj.append([])
-        baraval.append([])
-    row_offsets = [0]
-    block_offsets = [0]
-    cumulative_sum = 0
-    cumulative_square_sum = 0
-    for block_size in sdpRelaxation.block_struct:
-        cumulative_sum += block_size
-        cumulative_square_sum += block_size ** 2
-        row_offsets.append(cumulative_square_sum)
-        block_offsets.append(cumulative_sum)
-    for row in range(len(sdpRelaxation.F_struct.rows)):
-        if len(sdpRelaxation.F_struct.rows[row]) > 0:
-            col_index = 0
-            for k in sdpRelaxation.F_struct.rows[row]:
-                value = sdpRelaxation.F_struct.data[row][col_index]
-                i, j = convert_to_mosek_index(sdpRelaxation.block_struct,
-                                              row_offsets, block_offsets, row)
-                if k > 0:
-                    barai[k - 1].append(i)
-                    baraj[k - 1].append(j)
-                    baraval[k - 1].append(-value)
-                else:
-                    barci.append(i)
-                    barcj.append(j)
-                    barcval.append(value)
-                col_index += 1
-    return barci, barcj, barcval, barai, baraj, baraval
+    block_struct = sdpRelaxation.block_struct
+    row_offsets = get_row_offsets(block_struct)
+    bar_dims, n_linear, offsets = get_block_layout(block_struct)
+    rows, columns, values = convert_to_coo_arrays(sdpRelaxation.F_struct,
+                                                  sdpRelaxation.F_chunks)
+    # The objective is F_0, the constraint matrices are -F_k
+    values = np.where(columns == 0, values, -values)
+    block_index, i, j = convert_to_mosek_index(block_struct, row_offsets,
+                                               rows)
+    offsets = np.asarray(offsets, dtype=np.int64)[block_index]
+    is_bar = np.asarray(block_struct)[block_index] > 1
+    bar_columns, barvars = columns[is_bar], offsets[is_bar]
+    order = np.lexsort((barvars, bar_columns))
+    bar = (bar_columns[order], barvars[order], i[is_bar][order],
+           j[is_bar][order], values[is_bar][order])
+    linear = (columns[~is_bar], offsets[~is_bar] + i[~is_bar],
+              values[~is_bar])
+    return bar, linear
+
+
+def append_sparse_symmat_list(task, dims, nz, subi, subj, valij):
+    """Append symmetric matrices to a MOSEK task in a single call. Older
+    versions of MOSEK take the array of the resulting indices as an
+    argument, newer ones return it.
+    """
+    try:
+        return np.asarray(task.appendsparsesymmatlist(dims, nz, subi, subj,
+                                                      valij), dtype=np.int64)
+    except TypeError:
+        idx = np.zeros(len(dims), dtype=np.int64)
+        task.appendsparsesymmatlist(dims, nz, subi, subj, valij, idx)
+        return idx
 
 
 def convert_to_mosek(sdpRelaxation):
@@ -173,33 +210,51 @@ def convert_to_mosek(sdpRelaxation):
             task.set_Stream(mosek.streamtype.log, streamprinter)
         return task
 
-    barci, barcj, barcval, barai, baraj, baraval = \
+    (bar_columns, barvars, bari, barj, barval), \
+        (linear_columns, linear_vars, linear_val) = \
         convert_to_mosek_matrix(sdpRelaxation)
-    bkc = [mosek.boundkey.fx] * sdpRelaxation.n_vars
-    blc = [-v for v in sdpRelaxation.obj_facvar]
-    buc = [-v for v in sdpRelaxation.obj_facvar]
+    bar_dims, n_linear, _ = get_block_layout(sdpRelaxation.block_struct)
+    numcon = sdpRelaxation.n_vars
+    bkc = [mosek.boundkey.fx] * numcon
+    blc = [-v for v in sdpRelaxation.obj_facvar[:numcon]]
+    buc = [-v for v in sdpRelaxation.obj_facvar[:numcon]]
 
     env = mosek.Env()
     task = env.Task(0, 0)
     if sdpRelaxation.verbose > 0:
         task.set_Stream(mosek.streamtype.log, streamprinter)
-    numvar = 0
-    numcon = len(bkc)
-    BARVARDIM = [sum(sdpRelaxation.block_struct)]
 
-    task.appendvars(numvar)
     task.appendcons(numcon)
-    task.appendbarvars(BARVARDIM)
-    for i in range(numcon):
-        task.putconbound(i, bkc[i], blc[i], buc[i])
-
-    symc = task.appendsparsesymmat(BARVARDIM[0], barci, barcj, barcval)
-    task.putbarcj(0, [symc], [1.0])
+    task.putconboundslice(0, numcon, bkc, blc, buc)
+    if n_linear > 0:
+        task.appendvars(n_linear)
+        task.putvarboundslice(0, n_linear, [mosek.boundkey.lo] * n_linear,
+                              [0.0] * n_linear, [float('inf')] * n_linear)
+        objective = linear_columns == 0
+        task.putclist(linear_vars[objective], linear_val[objective])
+        task.putaijlist(linear_columns[~objective] - 1,
+                        linear_vars[~objective], linear_val[~objective])
+    task.appendbarvars(bar_dims)
 
-    for i in range(len(barai)):
-        syma = task.appendsparsesymmat(BARVARDIM[0], barai[i], baraj[i],
-                                       baraval[i])
-        task.putbaraij(i, 0, [syma], [1.0])
+    # The symmetric matrices of every pair of a variable and a bar variable
+    # are appended in bulk
+    if len(bar_columns) > 0:
+        starts = np.nonzero(np.diff(bar_columns, prepend=-1) |
+                            np.diff(barvars, prepend=-1))[0]
+        nz = np.diff(np.append(starts, len(bar_columns)))
+        group_columns, group_barvars = bar_columns[starts], barvars[starts]
+        idx = append_sparse_symmat_list(
+            task, np.asarray(bar_dims, dtype=np.int32)[group_barvars], nz,
+            bari, barj, barval)
+        objective = group_columns == 0
+        for barvar, matrix in zip(group_barvars[objective], idx[objective]):
+            task.putbarcj(barvar, [matrix], [1.0])
+        cons = np.nonzero(~objective)[0]
+        if len(cons) > 0:
+            alphaptr = np.arange(len(cons) + 1, dtype=np.int64)
+            task.putbaraijlist(group_columns[cons] - 1, group_barvars[cons],
+                               alphaptr[:-1], alphaptr[1:], idx[cons],
+                               np.ones(len(cons)))
 
     # Input the objective sense (minimize/maximize)
     task.putobjsense(mosek.objsense.minimize)
@@ -0,0 +1,659 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains a lightweight representation of noncommutative
+polynomials as sparse maps from words to coefficients. A word is a tuple of
+integer letters, and an alphabet keeps track of the SymPy atoms the letters
+stand for. Products, adjoints and substitutions are computed on the words,
+so SymPy is only needed when a polynomial enters or leaves the
+representation.
+
+Created on Sun Oct 18 10:12:31 2026
+
+@author: Peter Wittek
+"""
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+from sympy import Add, Mul, Pow, S, expand
+
+
+class Alphabet(object):
+
+    """Bidirectional map between SymPy atoms and integer letters. The
+    adjoint of every letter is registered together with the letter itself.
+    The alphabet also interns words: every word is stored once, and it is
+    identified by an integer handle.
+    """
+
+    def __init__(self):
+        self.atoms = []
+        self.letters = {}
+        self.adjoints = []
+        self.commutative = []
+        self.has_commutative = False
+        self.words = []
+        self.handles = {}
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def _register(self, atom):
+        letter = len(self.atoms)
+        self.atoms.append(atom)
+        self.letters[atom] = letter
+        self.adjoints.append(letter)
+        is_commutative = bool(atom.is_commutative)
+        self.commutative.append(is_commutative)
+        if is_commutative:
+            self.has_commutative = True
+        return letter
+
+    def letter(self, atom):
+        """Return the letter of a SymPy atom, registering the atom and its
+        adjoint if the atom has not been seen before.
+        """
+        try:
+            return self.letters[atom]
+        except KeyError:
+            pass
+        if atom.is_number or atom.is_Add or atom.is_Mul or atom.is_Pow:
+            raise ValueError("Cannot represent " + str(atom) + " as a letter")
+        letter = self._register(atom)
+        adjoint_atom = atom.adjoint()
+        if adjoint_atom != atom:
+            try:
+                adjoint_letter = self.letters[adjoint_atom]
+            except KeyError:
+                adjoint_letter = self._register(adjoint_atom)
+            self.adjoints[letter] = adjoint_letter
+            self.adjoints[adjoint_letter] = letter
+        return letter
+
+    def intern(self, word):
+        """Return the handle of a word, storing the word if it has not been
+        seen before.
+        """
+        try:
+            return self.handles[word]
+        except KeyError:
+            handle = len(self.words)
+            self.words.append(word)
+            self.handles[word] = handle
+            return handle
+
+    def canonical(self, word):
+        """Bring a word to canonical form: commutative letters are sorted and
+        moved to the front, the order of noncommutative letters is kept.
+        """
+        if not self.has_commutative:
+            return word
+        commutative = self.commutative
+        comm_part = [letter for letter in word if commutative[letter]]
+        if len(comm_part) == 0:
+            return word
+        comm_part.sort()
+        return tuple(comm_part) + tuple(letter for letter in word
+                                        if not commutative[letter])
+
+    def adjoint(self, word):
+        """Return the adjoint of a word.
+        """
+        adjoints = self.adjoints
+        return self.canonical(tuple(adjoints[letter]
+                                    for letter in reversed(word)))
+
+    def word(self, monomial):
+        """Convert a SymPy monomial without a scalar factor to a word.
+        """
+        return self._split_term(monomial)[0]
+
+    def _split_term(self, term):
+        coeff = 1.0
+        letters = []
+        for factor in Mul.make_args(term):
+            if factor.is_number:
+                coeff *= complex(factor)
+            elif isinstance(factor, Pow):
+                if not (factor.exp.is_Integer and factor.exp > 0):
+                    raise ValueError("Cannot represent " + str(factor) +
+                                     " in a word")
+                letters.extend([self.letter(factor.base)] * int(factor.exp))
+            else:
+                letters.append(self.letter(factor))
+        return self.canonical(tuple(letters)), _simplify_coeff(coeff)
+
+    def to_expr(self, word):
+        """Convert a word back to a SymPy monomial.
+        """
+        monomial = S.One
+        for letter in word:
+            monomial = monomial * self.atoms[letter]
+        return monomial
+
+
+def _simplify_coeff(coeff):
+    if isinstance(coeff, complex) and coeff.imag == 0:
+        return coeff.real
+    elif isinstance(coeff, int):
+        return float(coeff)
+    return coeff
+
+
+class NCPolynomial(object):
+
+    """Sparse representation of a noncommutative polynomial as a dictionary
+    that maps words to coefficients.
+
+    :param terms: Optional dictionary of words and coefficients.
+    :type terms: dict of tuple of int.
+    :param alphabet: The alphabet the letters of the words belong to.
+    :type alphabet: :class:`ncpol2sdpa.nc_polynomial.Alphabet`.
+    """
+
+    __slots__ = ('terms', 'alphabet')
+
+    def __init__(self, terms=None, alphabet=None):
+        if terms is None:
+            terms = {}
+        self.terms = terms
+        self.alphabet = alphabet
+
+    @classmethod
+    def from_expr(cls, expr, alphabet):
+        """Convert a SymPy expression to a polynomial. The expression is
+        expanded once.
+
+        :param expr: The polynomial to convert.
+        :type expr: :class:`sympy.core.expr.Expr`.
+        :param alphabet: The alphabet to register the atoms with.
+        :type alphabet: :class:`ncpol2sdpa.nc_polynomial.Alphabet`.
+
+        :returns: :class:`ncpol2sdpa.nc_polynomial.NCPolynomial`.
+        """
+        if isinstance(expr, NCOperator):
+            expr = expr._polynomial()
+        if isinstance(expr, NCPolynomial):
+            return expr.translate(alphabet)
+        terms = {}
+        if isinstance(expr, (int, float, complex)):
+            if expr != 0:
+                terms[()] = _simplify_coeff(expr)
+            return cls(terms, alphabet)
+        for term in Add.make_args(expand(expr)):
+            if term == 0:
+                continue
+            word, coeff = alphabet._split_term(term)
+            terms[word] = terms.get(word, 0) + coeff
+        return cls(terms, alphabet).prune()
+
+    @classmethod
+    def from_word(cls, word, alphabet, coeff=1):
+        return cls({word: coeff}, alphabet)
+
+    def translate(self, alphabet):
+        """Return the polynomial with its words in another alphabet. Only the
+        atoms of the letters that occur in the polynomial are registered with
+        the other alphabet.
+
+        :param alphabet: The alphabet of the new polynomial.
+        :type alphabet: :class:`ncpol2sdpa.nc_polynomial.Alphabet`.
+
+        :returns: :class:`ncpol2sdpa.nc_polynomial.NCPolynomial`.
+        """
+        if alphabet is self.alphabet:
+            return self
+        atoms, letters, terms = self.alphabet.atoms, {}, {}
+        for word, coeff in self.terms.items():
+            new_word = []
+            for letter in word:
+                try:
+                    new_word.append(letters[letter])
+                except KeyError:
+                    letters[letter] = alphabet.letter(atoms[letter])
+                    new_word.append(letters[letter])
+            new_word = alphabet.canonical(tuple(new_word))
+            terms[new_word] = terms.get(new_word, 0) + coeff
+        return NCPolynomial(terms, alphabet).prune()
+
+    def prune(self):
+        """Remove the terms with zero coefficients in place.
+        """
+        for word in [word for word, coeff in self.terms.items()
+                     if coeff == 0]:
+            del self.terms[word]
+        return self
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms.items())
+
+    def __eq__(self, other):
+        # Other objects are compared as SymPy expressions, which is also what
+        # SymPy does when the polynomial is on the right-hand side, so that
+        # the equality agrees with the hash
+        if isinstance(other, NCOperator):
+            other = other._polynomial()
+        if isinstance(other, NCPolynomial):
+            return self.terms == other.translate(self.alphabet).terms
+        return self.to_expr() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.to_expr())
+
+    def __neg__(self):
+        return NCPolynomial(dict((word, -coeff)
+                                 for word, coeff in self.terms.items()),
+                            self.alphabet)
+
+    def __add__(self, other):
+        other = NCPolynomial.from_expr(other, self.alphabet)
+        terms = dict(self.terms)
+        for word, coeff in other.terms.items():
+            terms[word] = terms.get(word, 0) + coeff
+        return NCPolynomial(terms, self.alphabet).prune()
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self + (-NCPolynomial.from_expr(other, self.alphabet))
+
+    def __rsub__(self, other):
+        return NCPolynomial.from_expr(other, self.alphabet) + (-self)
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float, complex)):
+            if other == 0:
+                return NCPolynomial({}, self.alphabet)
+            return NCPolynomial(dict((word, coeff*other)
+                                     for word, coeff in self.terms.items()),
+                                self.alphabet)
+        other = NCPolynomial.from_expr(other, self.alphabet)
+        canonical = self.alphabet.canonical
+        terms = {}
+        for word1, coeff1 in self.terms.items():
+            for word2, coeff2 in other.terms.items():
+                word = canonical(word1 + word2)
+                terms[word] = terms.get(word, 0) + coeff1*coeff2
+        return NCPolynomial(terms, self.alphabet).prune()
+
+    def __rmul__(self, other):
+        if isinstance(other, (int, float, complex)):
+            return self * other
+        return NCPolynomial.from_expr(other, self.alphabet) * self
+
+    def __truediv__(self, other):
+        return self * (1 / other)
+
+    __div__ = __truediv__
+
+    def __pow__(self, exponent):
+        if not isinstance(exponent, int) or exponent < 0:
+            raise ValueError("Only nonnegative integer powers are supported")
+        polynomial = NCPolynomial({(): 1}, self.alphabet)
+        for _ in range(exponent):
+            polynomial = polynomial * self
+        return polynomial
+
+    def adjoint(self):
+        """Return the adjoint of the polynomial.
+        """
+        adjoint = self.alphabet.adjoint
+        return NCPolynomial(dict((adjoint(word), coeff.conjugate())
+                                 for word, coeff in self.terms.items()),
+                            self.alphabet)
+
+    def degree(self):
+        """Return the degree of the polynomial.
+        """
+        if len(self.terms) == 0:
+            return 0
+        return max(len(word) for word in self.terms)
+
+    def substitute(self, rules):
+        """Apply substitution rules until none of them changes the
+        polynomial.
+
+        :param rules: The rules obtained by `convert_substitutions`.
+        :type rules: list of tuple.
+
+        :returns: :class:`ncpol2sdpa.nc_polynomial.NCPolynomial`.
+        """
+        if len(rules) == 0:
+            return self
+        polynomial = self
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in rules:
+                terms = {}
+                for word, coeff in polynomial.terms.items():
+                    replaced = _replace_first(word, lhs, rhs, self.alphabet)
+                    if replaced is None:
+                        terms[word] = terms.get(word, 0) + coeff
+                        continue
+                    changed = True
+                    for new_word, new_coeff in replaced.items():
+                        terms[new_word] = terms.get(new_word, 0) + \
+                            coeff*new_coeff
+                polynomial = NCPolynomial(terms, self.alphabet).prune()
+        return polynomial
+
+    def to_expr(self):
+        """Convert the polynomial to a SymPy expression. Integral
+        coefficients become integers.
+
+        :returns: :class:`sympy.core.expr.Expr`.
+        """
+        expr = S.Zero
+        for word, coeff in self.terms.items():
+            if isinstance(coeff, float) and coeff.is_integer():
+                coeff = int(coeff)
+            expr += coeff * self.alphabet.to_expr(word)
+        return expr
+
+    _sympy_ = to_expr
+
+    def __repr__(self):
+        return str(self.to_expr())
+
+
+class NCOperator(object):
+
+    """Lightweight noncommutative or commutative operator for building the
+    polynomials of a problem. It wraps a SymPy atom, which is created
+    together with the operator, and it has a fixed integer id, which is its
+    letter in an alphabet shared by all such operators. Sums and products of
+    operators are polynomials in word representation, so the objective
+    function and the constraints are built without SymPy. The relaxation
+    itself works with the SymPy atoms, and it interns its monomials in an
+    alphabet of its own.
+
+    :param atom: The SymPy atom the operator stands for.
+    :type atom: :class:`sympy.physics.quantum.operator.Operator` or
+                :class:`sympy.Symbol`.
+    """
+
+    __slots__ = ('id', 'hermitian', 'commutative', '_atom', '_hash',
+                 '_adjoint')
+
+    #: The alphabet shared by the lightweight operators. It only holds the
+    #: letters of the operators, words are not interned in it.
+    alphabet = Alphabet()
+
+    def __init__(self, atom):
+        self._atom = atom
+        self.id = NCOperator.alphabet.letter(atom)
+        self.commutative = NCOperator.alphabet.commutative[self.id]
+        self.hermitian = NCOperator.alphabet.adjoints[self.id] == self.id
+        self._hash = hash(atom)
+        self._adjoint = self if self.hermitian else None
+
+    @property
+    def name(self):
+        return str(self._atom)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, NCOperator):
+            return self.id == other.id
+        return self._atom == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def adjoint(self):
+        """Return the adjoint of the operator.
+        """
+        if self._adjoint is None:
+            self._adjoint = NCOperator(
+                NCOperator.alphabet.atoms[NCOperator.alphabet.adjoints[
+                    self.id]])
+            self._adjoint._adjoint = self
+        return self._adjoint
+
+    def _polynomial(self):
+        return NCPolynomial.from_word((self.id,), NCOperator.alphabet)
+
+    def __neg__(self):
+        return -self._polynomial()
+
+    def __add__(self, other):
+        return self._polynomial() + other
+
+    def __radd__(self, other):
+        return other + self._polynomial()
+
+    def __sub__(self, other):
+        return self._polynomial() - other
+
+    def __rsub__(self, other):
+        return other - self._polynomial()
+
+    def __mul__(self, other):
+        return self._polynomial() * other
+
+    def __rmul__(self, other):
+        return other * self._polynomial()
+
+    def __truediv__(self, other):
+        return self._polynomial() / other
+
+    __div__ = __truediv__
+
+    def __pow__(self, exponent):
+        return self._polynomial() ** exponent
+
+    def _sympy_(self):
+        return self._atom
+
+    def __repr__(self):
+        return self.name
+
+
+class MonomialIndex(MutableMapping):
+
+    """Dictionary that maps monomials to SDP variables. The monomials are
+    interned as words in an alphabet, so the index is an integer map from
+    word handles to variables. A SymPy monomial is only split into a word
+    the first time it is seen, and its handle is cached, so a lookup costs
+    two dictionary lookups. Callers that hold words look them up by
+    `index_of_word`. The reverse lookup from variables to monomials takes
+    constant time. Monomials that cannot be represented as words are kept
+    in an ordinary dictionary.
+
+    :param alphabet: The alphabet to intern the monomials in.
+    :type alphabet: :class:`ncpol2sdpa.nc_polynomial.Alphabet`.
+    """
+
+    def __init__(self, alphabet):
+        self.alphabet = alphabet
+        self._index = {}
+        self._other = {}
+        self._reverse = {}
+        self._handles = {}
+
+    def _word(self, monomial):
+        if isinstance(monomial, (int, float, complex)):
+            return None
+        try:
+            word, coeff = self.alphabet._split_term(monomial)
+        except (AttributeError, TypeError, ValueError):
+            return None
+        if coeff != 1:
+            return None
+        return word
+
+    def _handle(self, monomial):
+        """Return the handle of the word of a monomial, or None if the
+        monomial is not a word. The monomial is split into a word only once.
+        """
+        try:
+            return self._handles[monomial]
+        except KeyError:
+            word = self._word(monomial)
+            handle = None if word is None else self.alphabet.intern(word)
+            self._handles[monomial] = handle
+            return handle
+
+    def __getitem__(self, monomial):
+        try:
+            handle = self._handles[monomial]
+        except KeyError:
+            handle = self._handle(monomial)
+        if handle is None:
+            return self._other[monomial]
+        return self._index[handle]
+
+    def __setitem__(self, monomial, k):
+        handle = self._handle(monomial)
+        if handle is None:
+            key, index = (False, monomial), self._other
+        else:
+            key, index = (True, handle), self._index
+        if self._reverse is not None:
+            if key[1] in index and index[key[1]] != k:
+                self._reverse = None
+            else:
+                self._reverse.setdefault(k, key)
+        index[key[1]] = k
+
+    def __delitem__(self, monomial):
+        handle = self._handle(monomial)
+        if handle is None:
+            del self._other[monomial]
+        else:
+            del self._index[handle]
+        self._reverse = None
+
+    def __contains__(self, monomial):
+        try:
+            self[monomial]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        words = self.alphabet.words
+        for handle in self._index:
+            yield self.alphabet.to_expr(words[handle])
+        for monomial in self._other:
+            yield monomial
+
+    def __len__(self):
+        return len(self._index) + len(self._other)
+
+    def items(self):
+        words = self.alphabet.words
+        return [(self.alphabet.to_expr(words[handle]), k)
+                for handle, k in self._index.items()] + \
+            list(self._other.items())
+
+    def index_of_word(self, word):
+        """Return the SDP variable of a monomial given as a word. It raises
+        KeyError if the monomial is not in the index.
+        """
+        return self._index[self.alphabet.handles[word]]
+
+    def monomial(self, k):
+        """Return the first monomial that was mapped to a variable, or None
+        if there is no such monomial.
+
+        :param k: The index of the SDP variable.
+        :type k: int.
+
+        :returns: :class:`sympy.core.expr.Expr` or None.
+        """
+        if self._reverse is None:
+            self._reverse = {}
+            for handle, k0 in self._index.items():
+                self._reverse.setdefault(k0, (True, handle))
+            for monomial, k0 in self._other.items():
+                self._reverse.setdefault(k0, (False, monomial))
+        try:
+            is_word, key = self._reverse[k]
+        except KeyError:
+            return None
+        if is_word:
+            return self.alphabet.to_expr(self.alphabet.words[key])
+        return key
+
+
+def _replace_first(word, lhs, rhs, alphabet):
+    """Replace the first occurrence of the left-hand side of a rule in a
+    word. Commutative letters of the left-hand side can be anywhere in the
+    commutative part of the word, noncommutative letters must form a
+    contiguous subword.
+    """
+    lhs_comm, lhs_ncomm = lhs
+    if len(lhs_comm) + len(lhs_ncomm) > len(word):
+        return None
+    commutative = alphabet.commutative
+    if alphabet.has_commutative:
+        n_comm = 0
+        while n_comm < len(word) and commutative[word[n_comm]]:
+            n_comm += 1
+        comm_part, ncomm_part = list(word[:n_comm]), word[n_comm:]
+    else:
+        comm_part, ncomm_part = [], word
+    for letter in lhs_comm:
+        try:
+            comm_part.remove(letter)
+        except ValueError:
+            return None
+    if len(lhs_ncomm) > 0:
+        length = len(lhs_ncomm)
+        for i in range(len(ncomm_part) - length + 1):
+            if ncomm_part[i:i+length] == lhs_ncomm:
+                left, right = ncomm_part[:i], ncomm_part[i+length:]
+                break
+        else:
+            return None
+    else:
+        left, right = (), ncomm_part
+    prefix = tuple(comm_part) + left
+    canonical = alphabet.canonical
+    terms = {}
+    for rhs_word, coeff in rhs.terms.items():
+        new_word = canonical(prefix + rhs_word + right)
+        terms[new_word] = terms.get(new_word, 0) + coeff
+    return terms
+
+
+def convert_substitutions(substitutions, alphabet):
+    """Convert a dictionary of SymPy substitution rules to rules acting on
+    words.
+
+    :param substitutions: The substitution rules.
+    :type substitutions: dict of :class:`sympy.core.exp.Expr`.
+    :param alphabet: The alphabet to register the atoms with.
+    :type alphabet: :class:`ncpol2sdpa.nc_polynomial.Alphabet`.
+
+    :returns: list of tuple of the left-hand side split into its commutative
+              and noncommutative letters, and the right-hand side as a
+              :class:`ncpol2sdpa.nc_polynomial.NCPolynomial`.
+    """
+    rules = []
+    for lhs, rhs in substitutions.items():
+        lhs_polynomial = NCPolynomial.from_expr(lhs, alphabet)
+        if len(lhs_polynomial) != 1:
+            raise ValueError("The left-hand side of a substitution must be a"
+                             " monomial: " + str(lhs))
+        (word, coeff), = lhs_polynomial.terms.items()
+        if coeff != 1 or len(word) == 0:
+            raise ValueError("The left-hand side of a substitution must be a"
+                             " monomial: " + str(lhs))
+        rhs_polynomial = NCPolynomial.from_expr(rhs, alphabet)
+        lhs_comm = tuple(letter for letter in word
+                         if alphabet.commutative[letter])
+        lhs_ncomm = tuple(letter for letter in word
+                          if not alphabet.commutative[letter])
+        rules.append(((lhs_comm, lhs_ncomm), rhs_polynomial))
+    return rules
@@ -7,9 +7,13 @@ Created on Thu May  2 16:03:05 2013
 
 @author: Peter Wittek
 """
+import re
+from numbers import Integral
 from sympy import adjoint, conjugate, S, Symbol, Pow, Number, expand, I
 from sympy.physics.quantum import HermitianOperator, Operator
 from sympy.physics.quantum.qexpr import split_commutative_parts
+import numpy as np
+from .nc_polynomial import NCOperator
 try:
     from scipy.sparse import lil_matrix
 except ImportError:
@@ -28,7 +32,9 @@ def flatten(lol):
     for element in lol:
         if element is None:
             continue
-        elif not isinstance(element, list) and not isinstance(element, tuple):
+        elif (not isinstance(element, list) and
+              not isinstance(element, tuple)) or \
+                is_coefficient_array(element):
             new_list.append(element)
         elif len(element) > 0:
             new_list.extend(flatten(element))
@@ -121,6 +127,9 @@ def get_support(variables, polynomial):
                 tmp_support[variables.index(s.adjoint())] = 1
             elif isinstance(s, Operator):
                 tmp_support[variables.index(s)] = 1
+            elif isinstance(s, Symbol) and s in variables:
+                # Commutative variables are symbols
+                tmp_support[variables.index(s)] = 1
         support.append(tmp_support)
     return support
 
@@ -239,6 +248,8 @@ def fast_substitute(monomial, old_sub, new_sub):
     # This is a temporary hack
     if not isinstance(new_sub, int) and not isinstance(new_sub, float):
         new_comm_factors, _ = split_commutative_parts(new_sub)
+    else:
+        new_comm_factors = [new_sub]
     comm_monomial = 1
     is_constant_term = False
     if len(comm_factors) == 1 and is_number_type(comm_factors[0]):
@@ -362,7 +373,8 @@ def fast_substitute(monomial, old_sub, new_sub):
         return new_monomial
 
 
-def generate_variables(name, n_vars=1, hermitian=None, commutative=True):
+def generate_variables(name, n_vars=1, hermitian=None, commutative=True,
+                       lightweight=False):
     """Generates a number of commutative or noncommutative variables
 
     :param name: The prefix in the symbolic representation of the noncommuting
@@ -376,10 +388,16 @@ def generate_variables(name, n_vars=1, hermitian=None, commutative=True):
     :param commutative: Optional parameter to request commutative variables.
                         Commutative variables are Hermitian by default.
     :type commutative: bool.
+    :param lightweight: Optional parameter to request lightweight operators
+                        that wrap the variables, so that the polynomials of
+                        the problem are built without SymPy.
+    :type lightweight: bool.
 
     :returns: list of :class:`sympy.physics.quantum.operator.Operator` or
               :class:`sympy.physics.quantum.operator.HermitianOperator`
-              variables or `sympy.Symbol`
+              variables or `sympy.Symbol`, or
+              :class:`ncpol2sdpa.nc_polynomial.NCOperator` if lightweight
+              variables are requested.
 
     :Example:
 
@@ -402,10 +420,13 @@ def generate_variables(name, n_vars=1, hermitian=None, commutative=True):
             variables.append(HermitianOperator(var_name))
         else:
             variables.append(Operator(var_name))
+    if lightweight:
+        variables = [NCOperator(variable) for variable in variables]
     return variables
 
 
-def generate_operators(name, n_vars=1, hermitian=None, commutative=False):
+def generate_operators(name, n_vars=1, hermitian=None, commutative=False,
+                       lightweight=False):
     """Generates a number of commutative or noncommutative operators
 
     :param name: The prefix in the symbolic representation of the noncommuting
@@ -419,10 +440,15 @@ def generate_operators(name, n_vars=1, hermitian=None, commutative=False):
     :param commutative: Optional parameter to request commutative variables.
                         Commutative variables are Hermitian by default.
     :type commutative: bool.
+    :param lightweight: Optional parameter to request lightweight operators
+                        that wrap the variables, so that the polynomials of
+                        the problem are built without SymPy.
+    :type lightweight: bool.
 
     :returns: list of :class:`sympy.physics.quantum.operator.Operator` or
               :class:`sympy.physics.quantum.operator.HermitianOperator`
-              variables
+              variables, or :class:`ncpol2sdpa.nc_polynomial.NCOperator` if
+              lightweight operators are requested.
 
     :Example:
 
@@ -441,6 +467,8 @@ def generate_operators(name, n_vars=1, hermitian=None, commutative=False):
         else:
             variables.append(Operator(var_name))
         variables[-1].is_commutative = commutative
+    if lightweight:
+        variables = [NCOperator(variable) for variable in variables]
     return variables
 
 
@@ -569,6 +597,25 @@ def convert_monomial_to_string(monomial):
     return monomial_str
 
 
+def reverse_monomial_index(monomial_index):
+    """Return a function that maps SDP variables to the first monomial in
+    the monomial index, or to None. The lookup takes constant time.
+
+    :param monomial_index: The monomial index of the SDP relaxation.
+    :type monomial_index: :class:`ncpol2sdpa.nc_polynomial.MonomialIndex`
+                          or dict of :class:`sympy.core.expr.Expr`.
+
+    :returns: function.
+    """
+    try:
+        return monomial_index.monomial
+    except AttributeError:
+        reverse = {}
+        for key, k in monomial_index.items():
+            reverse.setdefault(k, key)
+        return reverse.get
+
+
 def save_monomial_index(filename, monomial_index):
     """Save a monomial dictionary for debugging purposes.
 
@@ -578,12 +625,14 @@ def save_monomial_index(filename, monomial_index):
     :type monomial_index: dict of :class:`sympy.core.expr.Expr`.
 
     """
-    monomial_translation = [''] * (len(monomial_index) + 1)
-    for key, k in monomial_index.items():
-        monomial_translation[k] = convert_monomial_to_string(key)
+    get_monomial = reverse_monomial_index(monomial_index)
     file_ = open(filename, 'w')
-    for k in range(len(monomial_translation)):
-        file_.write('%s %s\n' % (k, monomial_translation[k]))
+    for k in range(len(monomial_index) + 1):
+        monomial = get_monomial(k)
+        if monomial is None:
+            file_.write('%s %s\n' % (k, ''))
+        else:
+            file_.write('%s %s\n' % (k, convert_monomial_to_string(monomial)))
     file_.close()
 
 
@@ -634,8 +683,132 @@ def find_variable_set(variable_sets, polynomial):
     return -1
 
 
+def is_coefficient_array(polynomial):
+    """Returns whether a polynomial is given by the coefficients of the
+    variables of the SDP, either as a pair of an index array and a coefficient
+    array, or as a dictionary mapping indices to coefficients. The index zero
+    stands for the constant term.
+    """
+    if isinstance(polynomial, dict):
+        return True
+    return isinstance(polynomial, tuple) and len(polynomial) == 2 and \
+        isinstance(polynomial[0], np.ndarray) and \
+        isinstance(polynomial[1], np.ndarray)
+
+
+def get_coefficient_array(polynomial):
+    """Returns the index array and the coefficient array of a polynomial
+    given by its coefficients. The indices must be integers.
+
+    :param polynomial: A pair of arrays or a dictionary of coefficients.
+    :type polynomial: tuple of :class:`numpy.array` or dict of int.
+
+    :returns: tuple of :class:`numpy.array`.
+    """
+    if isinstance(polynomial, dict):
+        for key in polynomial:
+            if not isinstance(key, Integral) or isinstance(key, bool):
+                raise Exception("The keys of a dictionary of coefficients "
+                                "must be the integer indices of SDP "
+                                "variables, not %s." % str(key))
+        indices = np.fromiter(polynomial.keys(), dtype=np.int64,
+                              count=len(polynomial))
+        coeffs = np.array(list(polynomial.values()))
+    else:
+        if not np.issubdtype(polynomial[0].dtype, np.integer):
+            raise Exception("The index array must be of an integer type, "
+                            "not %s." % polynomial[0].dtype)
+        indices = np.asarray(polynomial[0], dtype=np.int64)
+        coeffs = np.asarray(polynomial[1])
+    if indices.shape != coeffs.shape or indices.ndim != 1:
+        raise Exception("The index and coefficient arrays must be "
+                        "one-dimensional and of the same length.")
+    return indices, coeffs
+
+
+def negate_coefficient_array(polynomial):
+    """Returns the negative of a polynomial given by its coefficients.
+    """
+    if isinstance(polynomial, dict):
+        return dict((k, -coeff) for k, coeff in polynomial.items())
+    return (polynomial[0], -polynomial[1])
+
+
+_EXPRESSION_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|"
+                               r"\.\d+(?:[eE][-+]?\d+)?)|([-+*\[\],]))")
+
+
+def _tokenize_expression(expr):
+    position, tokens = 0, []
+    expr = expr.rstrip()
+    while position < len(expr):
+        match = _EXPRESSION_TOKEN.match(expr, position)
+        if match is None:
+            raise Exception("Cannot parse the expression %s at position %d."
+                            % (expr, position))
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+    return tokens
+
+
+def parse_expression(expr):
+    """Parse a string expression of a linear combination of the elements of
+    the moment matrices, such as "0[0,1]-2*1[2,3]+0.5". The number before
+    the brackets is the index of the block, and the numbers in the brackets
+    are the row and the column of the element.
+
+    :param expr: The expression.
+    :type expr: str.
+
+    :returns: tuple of the constant term and the list of the terms as tuples
+              of the coefficient, the block, the row, and the column.
+    """
+    tokens = _tokenize_expression(expr) + [None]
+    constant, terms = 0.0, []
+    position = 0
+
+    def read(expected):
+        token = tokens[position]
+        if token is None or (token in "-+*[]," if expected == "number"
+                             else token != expected):
+            raise Exception("Expected %s in the expression %s." %
+                            (expected, expr))
+        return token, position + 1
+
+    while tokens[position] is not None:
+        sign = 1.0
+        if tokens[position] in ("+", "-"):
+            sign = -1.0 if tokens[position] == "-" else 1.0
+            position += 1
+        elif position > 0:
+            raise Exception("Expected + or - in the expression %s." % expr)
+        number, position = read("number")
+        coeff = None
+        if tokens[position] == "*":
+            coeff = float(number)
+            position += 1
+            number, position = read("number")
+        if tokens[position] == "[":
+            _, position = read("[")
+            row, position = read("number")
+            _, position = read(",")
+            column, position = read("number")
+            _, position = read("]")
+            try:
+                terms.append((sign*(1.0 if coeff is None else coeff),
+                              int(number), int(row), int(column)))
+            except ValueError:
+                raise Exception("The indices of the moment matrices must be "
+                                "integers in the expression %s." % expr)
+        elif coeff is None:
+            constant += sign*float(number)
+        else:
+            raise Exception("Expected [ in the expression %s." % expr)
+    return constant, terms
+
+
 def check_simple_substitution(equality):
-    if isinstance(equality, str):
+    if isinstance(equality, str) or is_coefficient_array(equality):
         return (0, 0)
     elif equality.is_Relational:
         eq = convert_relational(equality)
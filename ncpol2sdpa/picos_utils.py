@@ -8,11 +8,13 @@ Created on Wed Dec 10 18:33:34 2014
 """
 from __future__ import print_function
 import numpy as np
+from .chunk_utils import get_row
 
 
-def solve_with_cvxopt(sdpRelaxation, solverparameters=None):
+def solve_with_picos(sdpRelaxation, solverparameters=None):
     """Helper function to convert the SDP problem to PICOS
-    and call CVXOPT solver, and parse the output.
+    and call CVXOPT solver, and parse the output. It is used for complex
+    SDPs.
 
     :param sdpRelaxation: The SDP relaxation to be solved.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
@@ -67,22 +69,22 @@ def convert_to_picos(sdpRelaxation, duplicate_moment_matrix=False):
     for block_size in sdpRelaxation.block_struct:
         x, Ix, Jx = [], [], []
         c, Ic, Jc = [], [], []
-        for i, row in enumerate(sdpRelaxation.F_struct.rows[row_offset:
-                                                            row_offset +
-                                                            block_size**2]):
+        for i in range(block_size**2):
+            row, data = get_row(sdpRelaxation.F_struct,
+                                sdpRelaxation.F_chunks, row_offset + i)
             for j, column in enumerate(row):
                 if column > 0:
-                    x.append(sdpRelaxation.F_struct.data[row_offset+i][j])
+                    x.append(data[j])
                     Ix.append(i)
                     Jx.append(column-1)
                     i0 = (i//block_size)+(i % block_size)*block_size
                     if i != i0:
-                        x.append(sdpRelaxation.F_struct.data[row_offset+i][j])
+                        x.append(data[j])
                         Ix.append(i0)
                         Jx.append(column-1)
 
                 else:
-                    c.append(sdpRelaxation.F_struct.data[row_offset+i][j])
+                    c.append(data[j])
                     Ic.append(i%block_size)
                     Jc.append(i//block_size)
         permutation = cvx.spmatrix(x, Ix, Jx, (block_size**2,
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains the profile of the phases of generating and solving a
+relaxation, and the hooks that report the progress.
+
+Created on Sun Oct 18 23:12:40 2026
+
+@author: Peter Wittek
+"""
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _is_tracing_memory():
+    return tracemalloc is not None and tracemalloc.is_tracing() and \
+        hasattr(tracemalloc, "reset_peak")
+
+
+def _get_max_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Profile(object):
+    """Wall time, peak memory, and counters of the phases of a relaxation.
+    The peak memory of a phase is only measured if `tracemalloc` is tracing,
+    otherwise it is `None`. The maximum resident set size of the process at
+    the end of each phase is recorded irrespective of that, in the units of
+    `resource.getrusage`. Work that is done in the inner loops is recorded
+    in timers, which only accumulate the wall time and the number of calls.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.timers = OrderedDict()
+        self.tracer = None
+        self._peaks = []
+
+    def reset(self):
+        """Clear the phases, the counters, and the timers.
+        """
+        self.phases.clear()
+        self.counters.clear()
+        self.timers.clear()
+
+    def count(self, name, increment=1):
+        """Increment a counter.
+
+        :param name: The name of the counter.
+        :type name: str.
+        :param increment: Optional parameter of the increment.
+        :type increment: int.
+        """
+        self.counters[name] = self.counters.get(name, 0) + increment
+
+    def add_time(self, name, elapsed):
+        """Add the wall time of a call to a timer. Unlike a phase, a timer
+        has no span and no memory measurement, so it is cheap enough for
+        the inner loops.
+
+        :param name: The name of the timer.
+        :type name: str.
+        :param elapsed: The wall time of the call in seconds.
+        :type elapsed: float.
+        """
+        try:
+            timer = self.timers[name]
+        except KeyError:
+            timer = self.timers[name] = [0.0, 0]
+        timer[0] += elapsed
+        timer[1] += 1
+
+    @contextmanager
+    def phase(self, name, span=True):
+        """Context manager that adds the wall time and the peak memory of the
+        enclosed code to a phase. A phase can be entered several times, and
+        phases can be nested. If a tracer is set, the phase is also a span of
+        the tracer.
+
+        :param name: The name of the phase.
+        :type name: str.
+        :param span: Optional parameter to disable the span for phases that
+                     are entered very often.
+        :type span: bool.
+        """
+        if span and self.tracer is not None:
+            with self.tracer.start_as_current_span(name):
+                with self.phase(name, False):
+                    yield
+            return
+        tracing = _is_tracing_memory()
+        if tracing:
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        tstart = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - tstart
+            peak = None
+            if tracing:
+                peak = max(self._peaks.pop(),
+                           tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            record = self.phases.setdefault(name, {"time": 0.0, "calls": 0,
+                                                   "peak_memory": None,
+                                                   "max_rss": None})
+            record["time"] += elapsed
+            record["calls"] += 1
+            if peak is not None:
+                record["peak_memory"] = max(record["peak_memory"] or 0, peak)
+            record["max_rss"] = _get_max_rss()
+
+    def to_dict(self):
+        """Return the profile as a dictionary of plain types.
+
+        :returns: dict with the keys "phases", "counters", and "timers".
+        """
+        return {"phases": OrderedDict((name, dict(record))
+                                      for name, record in self.phases.items()),
+                "counters": OrderedDict(self.counters),
+                "timers": OrderedDict((name, {"time": timer[0],
+                                              "calls": timer[1]})
+                                      for name, timer in self.timers.items())}
+
+
+class Progress(object):
+    """Throttled progress hook. The callback is called at most once in every
+    interval, and always when a phase is done.
+
+    :param callback: The function that receives the name of the phase, the
+                     number of items done, and the total number of items.
+    :type callback: function.
+    :param interval: Optional parameter of the minimum time in seconds
+                     between two calls.
+    :type interval: float.
+    """
+
+    def __init__(self, callback, interval=0.1):
+        self.callback = callback
+        self.interval = interval
+        self._last_call = 0
+
+    def __call__(self, phase, done, total):
+        now = time.time()
+        if done < total and now - self._last_call < self.interval:
+            return
+        self._last_call = now
+        self.callback(phase, done, total)
+
+
+def print_progress(phase, done, total):
+    """Progress callback that writes the progress in a single line of the
+    standard output. It is the default if the relaxation is verbose.
+    """
+    sys.stdout.write("\r\x1b[K%s: %d/%d" % (phase.capitalize(), done, total))
+    if done >= total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
@@ -4,7 +4,6 @@ Created on Wed Nov  10 11:24:48 2015
 
 @author: Peter Wittek
 """
-import sys
 from math import sqrt
 from sympy import S
 from sympy.physics.quantum.dagger import Dagger
@@ -70,6 +69,8 @@ class RdmHierarchy(SdpRelaxation):
         self.circulant = circulant
         self.correspondence = {}
         self.m_block = 0
+        # The correspondences are resolved on SymPy expressions
+        self._alphabet = None
 
     def _push_monomials(self, monomials, n_vars, row_offset, coords, N):
         monomial0 = apply_substitutions(monomials[0], self.substitutions,
@@ -236,6 +237,8 @@ class RdmHierarchy(SdpRelaxation):
             for block_size in self.block_struct[0:block_index]:
                 row_offset += block_size ** 2
         N = len(monomialsA)
+        first_entry = processed_entries
+        n_entries = sum(max(N - rowB, 0) for rowB in range(len(monomialsB)))
         for rowB in range(len(monomialsB)):
             for columnA in range(rowB, len(monomialsA)):
                 processed_entries += 1
@@ -243,15 +246,9 @@ class RdmHierarchy(SdpRelaxation):
                     monomialsA[columnA]
                 n_vars = self._push_monomial(monomial, n_vars, row_offset,
                                              rowB, columnA, N, 0, 0, 1)
-            if self.verbose > 0:
-                percentage = \
-                    "{0:.0f}%".format(float(processed_entries-1)/self.n_vars *
-                                      100)
-                sys.stdout.write("\r\x1b[KCurrent number of SDP variables: %d"
-                                 " (done: %s)" % (n_vars, percentage))
-                sys.stdout.flush()
-        if self.verbose > 0:
-            sys.stdout.write("\r")
+            if self._progress is not None:
+                self._progress("moment matrix",
+                               processed_entries - first_entry, n_entries)
         return n_vars, block_index + 1, processed_entries
 
     def _generate_moment_matrix(self, n_vars, block_index, processed_entries,
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains helper functions to limit the wall-clock time and the
+memory of the solvers.
+
+Created on Sun Oct 18 17:32:05 2026
+
+@author: Peter Wittek
+"""
+import threading
+import time
+
+
+def split_limits(solverparameters):
+    """Separate the resource limits from the rest of the solver parameters.
+
+    :param solverparameters: The solver parameters, possibly with the keys
+                             `"timeout"` and `"memory_limit"`.
+    :type solverparameters: dict.
+    :returns: tuple of the remaining solver parameters, the wall-clock limit
+              in seconds, and the memory limit in bytes.
+    """
+    if solverparameters is None:
+        return None, None, None
+    parameters = dict((key, value) for key, value in solverparameters.items()
+                      if key not in ("timeout", "memory_limit"))
+    return parameters, solverparameters.get("timeout"), \
+        solverparameters.get("memory_limit")
+
+
+def limit_memory(memory_limit):
+    """Limit the address space of the current process. It only works on
+    POSIX systems.
+
+    :param memory_limit: The limit in bytes.
+    :type memory_limit: int.
+    """
+    import resource
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def get_preexec_function(memory_limit):
+    """Return the function that sets the memory limit in a solver
+    subprocess, or `None` if there is no limit.
+    """
+    if memory_limit is None:
+        return None
+    return lambda: limit_memory(memory_limit)
+
+
+def get_cut_short_solution(status):
+    """Return the solution of a solve that was cut short by a limit.
+
+    :param status: The status, either "timeout" or "memory limit".
+    :type status: str.
+    """
+    return None, None, None, None, status
+
+
+def _run_child(connection, function, args, memory_limit):
+    if memory_limit is not None:
+        limit_memory(memory_limit)
+    try:
+        result = function(*args)
+    except MemoryError:
+        connection.send((False, "memory limit"))
+    except Exception as exception:
+        connection.send((False, exception))
+    else:
+        connection.send((True, result))
+    connection.close()
+
+
+def get_solver_copy(sdpRelaxation):
+    """Return a copy of the relaxation with only what the solvers read, which
+    is sent to a solver process that is not forked. The hooks of the
+    relaxation are left out, since the progress callback and the tracer
+    cannot be pickled in general, and the rows of the SDP are collected from
+    the lil_matrix and the memory-mapped chunks into a single array of
+    triplets.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :returns: :class:`ncpol2sdpa.sdp_relaxation.Relaxation`.
+    """
+    from scipy.sparse import lil_matrix
+    from .chunk_utils import TripletChunks, get_first_row
+    from .sdp_relaxation import Relaxation
+    from .sdpa_utils import convert_to_coo_arrays
+    F_struct = sdpRelaxation.F_struct
+    solver_copy = Relaxation()
+    for name in ("n_vars", "block_struct", "obj_facvar", "constant_term",
+                 "complex_matrix", "verbose"):
+        setattr(solver_copy, name, getattr(sdpRelaxation, name))
+    solver_copy.F_struct = lil_matrix((0, F_struct.shape[1]),
+                                      dtype=F_struct.dtype)
+    solver_copy.F_chunks = TripletChunks(F_struct.dtype)
+    solver_copy.F_chunks.load(*convert_to_coo_arrays(F_struct,
+                                                     sdpRelaxation.F_chunks),
+                              end_row=get_first_row(sdpRelaxation.F_chunks) +
+                              F_struct.shape[0])
+    return solver_copy
+
+
+def run_with_limits(function, sdpRelaxation, solverparameters, timeout=None,
+                    memory_limit=None):
+    """Call a solver function in a child process that is killed if it
+    exceeds the wall-clock limit, and whose address space is limited. The
+    solvers that run in the Python process are cut short this way. The
+    process is forked if it is called from the main thread. Forking from
+    other threads, such as the executor of :func:`solve_async`, can deadlock
+    the child on locks held by the other threads, so the process is started
+    by a fork server or it is spawned instead, and it receives the copy of
+    the relaxation returned by :func:`get_solver_copy`.
+
+    :param function: The function that solves the SDP relaxation.
+    :type function: function.
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solverparameters: The parameters of the function.
+    :type solverparameters: dict.
+    :param timeout: Optional wall-clock limit in seconds.
+    :type timeout: float.
+    :param memory_limit: Optional memory limit in bytes.
+    :type memory_limit: int.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    import multiprocessing
+    if not hasattr(multiprocessing, "get_context"):
+        raise Exception("Resource limits on this solver require Python 3.")
+    if threading.current_thread() is threading.main_thread():
+        methods = ["fork"]
+    else:
+        methods = ["forkserver", "spawn"]
+    available = multiprocessing.get_all_start_methods()
+    methods = [method for method in methods if method in available]
+    if len(methods) == 0:
+        raise Exception("Resource limits on this solver need processes "
+                        "started by fork when it is called from the main "
+                        "thread.")
+    if methods[0] != "fork":
+        sdpRelaxation = get_solver_copy(sdpRelaxation)
+    context = multiprocessing.get_context(methods[0])
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(target=_run_child,
+                              args=(child_connection, function,
+                                    (sdpRelaxation, solverparameters),
+                                    memory_limit))
+    process.start()
+    child_connection.close()
+    deadline = None if timeout is None else time.time() + timeout
+    try:
+        if not parent_connection.poll(None if deadline is None else
+                                      max(deadline - time.time(), 0)):
+            process.kill()
+            return get_cut_short_solution("timeout")
+        success, result = parent_connection.recv()
+    except EOFError:
+        # The process died without returning, which happens if it runs out
+        # of memory outside of the Python allocator
+        if memory_limit is not None:
+            return get_cut_short_solution("memory limit")
+        raise Exception("The solver process terminated unexpectedly.")
+    finally:
+        parent_connection.close()
+        process.join()
+    if success:
+        return result
+    elif result == "memory limit":
+        return get_cut_short_solution(result)
+    raise result
+
+
+# Approximate number of bytes of a row and of a nonzero element of the
+# lil_matrix of the relaxation, and of a monomial with its entry in the
+# monomial index, measured with tracemalloc
+BYTES_PER_ROW = 128
+BYTES_PER_NONZERO = 72
+BYTES_PER_MONOMIAL = 2048
+
+
+def _get_real_embedding(block_struct, n_vars, nnz, complex_matrix):
+    """Return the size of the real SDP that the solvers receive for a complex
+    relaxation: every block and the number of variables doubles, and every
+    nonzero element turns into up to four.
+    """
+    if complex_matrix:
+        return [2 * block_size for block_size in block_struct], 2 * n_vars, \
+            4 * nnz
+    return list(block_struct), n_vars, nnz
+
+
+def estimate_build_memory(block_struct, n_vars, nnz):
+    """Estimate the memory that the relaxation needs to generate the SDP.
+
+    :param block_struct: The block structure of the SDP.
+    :type block_struct: list of int.
+    :param n_vars: The number of variables of the SDP.
+    :type n_vars: int.
+    :param nnz: The number of nonzero elements of the SDP.
+    :type nnz: int.
+    :returns: int -- the estimate in bytes.
+    """
+    n_rows = sum(block_size ** 2 for block_size in block_struct)
+    return BYTES_PER_ROW * n_rows + BYTES_PER_NONZERO * nnz + \
+        BYTES_PER_MONOMIAL * n_vars
+
+
+def estimate_solver_memory(block_struct, n_vars, nnz, complex_matrix=False):
+    """Estimate the peak memory of each solver from the size of the SDP. The
+    interior-point solvers are dominated by the dense Schur complement matrix
+    and a few dense copies of the blocks, and CVXOPT also forms the scaled
+    constraint matrix densely. The first-order solver only keeps the sparse
+    constraint matrix, a few vectors, and the eigendecomposition of the
+    largest block. The estimates are meant for comparing the levels of a
+    relaxation and for choosing a machine, not as exact figures.
+
+    :param block_struct: The block structure of the SDP.
+    :type block_struct: list of int.
+    :param n_vars: The number of variables of the SDP.
+    :type n_vars: int.
+    :param nnz: The number of nonzero elements of the SDP.
+    :type nnz: int.
+    :param complex_matrix: Optional parameter to indicate that the SDP is
+                           complex, which the solvers receive in its real
+                           embedding.
+    :type complex_matrix: bool.
+    :returns: dict of the estimate in bytes for "sdpa", "mosek", "cvxopt",
+              and "admm", with None for the solvers that do not support the
+              SDP.
+    """
+    block_struct, n_vars, nnz = _get_real_embedding(block_struct, n_vars, nnz,
+                                                    complex_matrix)
+    n_full = sum(block_size ** 2 for block_size in block_struct
+                 if block_size > 1)
+    n_packed = sum(block_size * (block_size + 1) // 2
+                   for block_size in block_struct if block_size > 1)
+    n_linear = sum(abs(block_size) for block_size in block_struct
+                   if block_size < 2)
+    largest = max([abs(block_size) for block_size in block_struct] + [0])
+    schur = 8 * n_vars ** 2
+    memory = {"sdpa": schur + 8 * 12 * (n_full + n_linear) + 24 * nnz,
+              "mosek": schur + 8 * 8 * (n_packed + n_linear) + 16 * nnz,
+              "cvxopt": None, "admm": None}
+    if not complex_matrix:
+        memory["cvxopt"] = schur + 8 * (n_full + n_linear) * (n_vars + 20) + \
+            16 * nnz
+        memory["admm"] = 24 * nnz + 8 * 10 * (n_packed + n_linear + n_vars) + \
+            8 * 4 * largest ** 2
+    return memory
+
+
+def estimate_sdpa_file_size(block_struct, n_vars, nnz, complex_matrix=False):
+    """Estimate the size of the SDP relaxation exported in the sparse SDPA
+    format. Every nonzero element is a line of four indices and a value.
+
+    :param block_struct: The block structure of the SDP.
+    :type block_struct: list of int.
+    :param n_vars: The number of variables of the SDP.
+    :type n_vars: int.
+    :param nnz: The number of nonzero elements of the SDP.
+    :type nnz: int.
+    :param complex_matrix: Optional parameter to indicate that the SDP is
+                           complex, which is exported in its real embedding.
+    :type complex_matrix: bool.
+    :returns: int -- the estimate in bytes.
+    """
+    block_struct, n_vars, nnz = _get_real_embedding(block_struct, n_vars, nnz,
+                                                    complex_matrix)
+    largest = max([abs(block_size) for block_size in block_struct] + [1])
+    # The coefficients of the relaxations are mostly short numbers like 1.0
+    # or -0.5
+    line = len(str(n_vars)) + len(str(len(block_struct))) + \
+        2 * len(str(largest)) + 8 + 5
+    header = 100 + len(str(block_struct)) + 6 * n_vars
+    return header + line * nnz
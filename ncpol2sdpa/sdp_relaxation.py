@@ -8,11 +8,12 @@ Created on Sun May 26 15:06:17 2013
 @author: Peter Wittek
 """
 from __future__ import division, print_function
-import sys
+import copy
+import json
+import time
 from math import floor, sqrt
-from sympy import S, Expr, expand
+from sympy import Add, S, Expr, expand
 import numpy as np
-import time
 try:
     import multiprocessing
     from functools import partial
@@ -26,16 +27,27 @@ except ImportError:
 from .nc_utils import apply_substitutions, build_permutation_matrix, \
                       check_simple_substitution, convert_relational, \
                       find_variable_set, flatten, \
-                      get_all_monomials, is_number_type, \
+                      get_all_monomials, get_coefficient_array, \
+                      is_coefficient_array, is_number_type, \
+                      negate_coefficient_array, parse_expression, \
                       is_pure_substitution_rule, iscomplex, ncdegree, \
                       pick_monomials_up_to_degree, save_monomial_index, \
                       separate_scalar_factor, simplify_polynomial, unique
+from .nc_polynomial import Alphabet, MonomialIndex, NCOperator, \
+    NCPolynomial, convert_substitutions
 from .solver_common import find_solution_ranks, get_sos_decomposition, \
-                           get_xmat_value, solve_sdp, extract_dual_value
+                           get_sos_certificate, get_xmat_value, \
+                           extract_optimizers, solve_sdp, extract_dual_value
 from .mosek_utils import convert_to_mosek
 from .picos_utils import convert_to_picos
-from .sdpa_utils import write_to_sdpa, write_to_human_readable
+from .sdpa_utils import write_to_sdpa, write_to_human_readable, \
+    convert_to_coo_arrays, get_row_offsets
+from .chunk_utils import TripletChunks, get_first_row, get_rows, \
+    get_selected_rows
 from .chordal_extension import find_variable_cliques
+from .profile_utils import Profile, Progress, print_progress
+from .resource_utils import estimate_build_memory, estimate_sdpa_file_size, \
+    estimate_solver_memory
 
 
 class Relaxation(object):
@@ -45,6 +57,7 @@ class Relaxation(object):
         """
         self.n_vars = 0
         self.F_struct = None
+        self.F_chunks = None
         self.block_struct = []
         self.obj_facvar = 0
         self.constant_term = 0
@@ -55,9 +68,14 @@ class Relaxation(object):
         self.y_mat = None
         self.solution_time = None
         self.status = "unsolved"
+        self._moment_vector = None
+        self._dual_products = None
         self.constraints_hash = None
+        self.profile = Profile()
+        self._progress = None
 
-    def solve(self, solver=None, solverparameters=None):
+    def solve(self, solver=None, solverparameters=None, warm_start=False,
+              storage=None):
         """Call a solver on the SDP relaxation. Upon successful solution, it
         returns the primal and dual objective values along with the solution
         matrices. It also sets these values in the `sdpRelaxation` object,
@@ -66,8 +84,8 @@ class Relaxation(object):
         :param sdpRelaxation: The SDP relaxation to be solved.
         :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
         :param solver: The solver to be called, either `None`, "sdpa", "mosek",
-                       or "cvxopt". The default is `None`, which triggers
-                       autodetect.
+                       "cvxopt", or "admm". The default is `None`, which
+                       triggers autodetect.
         :type solver: str.
         :param solverparameters: Parameters to be passed to the solver. Actual
                                  options depend on the solver:
@@ -85,14 +103,130 @@ class Relaxation(object):
                                  arguments are passed on.
 
                                  Cvxopt:
-                                 Refer to the PICOS documentation. All
-                                 arguments are passed on.
+                                 Refer to the CVXOPT documentation. All
+                                 arguments are passed on as options of
+                                 `cvxopt.solvers.sdp`.
+
+                                 Admm:
+                                 The built-in first-order solver. Refer to
+                                 :func:`ncpol2sdpa.admm_utils.solve_with_admm`
+                                 for the options.
+
+                                 The parameter `"warm_start"` is a tuple of
+                                 the primal and dual solution matrices of a
+                                 previous solve, which is used as the
+                                 starting point by SDPA, Cvxopt and Admm. It
+                                 is ignored by Mosek.
+
+                                 The parameters `"timeout"` and
+                                 `"memory_limit"` limit the wall-clock time in
+                                 seconds and the address space in bytes of the
+                                 solver. A solve that is cut short has the
+                                 status "timeout" or "memory limit".
         :type solverparameters: dict of str.
+        :param warm_start: Optional parameter to start from the current
+                           solution if the relaxation is solved. It is useful
+                           if only the objective function changed since the
+                           last solve.
+        :type warm_start: bool.
+        :param storage: Optional parameter to keep the solution matrices in a
+                        memory-mapped file: "memmap" stores the blocks in
+                        full, and "packed" stores the upper triangles. The
+                        default is `None`, which keeps them as a list of
+                        arrays in memory.
+        :type storage: str.
         """
         if self.F_struct is None:
             raise Exception("Relaxation is not generated yet. Call "
                             "'SdpRelaxation.get_relaxation' first")
-        solve_sdp(self, solver, solverparameters)
+        with self.profile.phase("solve"):
+            solve_sdp(self, solver, solverparameters, warm_start, storage)
+
+    def solve_async(self, solver=None, solverparameters=None,
+                    warm_start=False, executor=None, storage=None):
+        """Call a solver on the SDP relaxation without blocking the event
+        loop of `asyncio`. SDPA runs as an asynchronous subprocess, and the
+        other solvers run in an executor. The solution is set in the object
+        once the returned awaitable is done. The relaxation must not be
+        changed in the meanwhile. It requires Python 3.7 or later.
+
+        :param solver: The solver to be called, either `None`, "sdpa", "mosek",
+                       "cvxopt", or "admm". The default is `None`, which
+                       triggers autodetect.
+        :type solver: str.
+        :param solverparameters: Parameters to be passed to the solver, as in
+                                 :func:`solve`.
+        :type solverparameters: dict of str.
+        :param warm_start: Optional parameter to start from the current
+                           solution if the relaxation is solved.
+        :type warm_start: bool.
+        :param executor: Optional executor for the solvers that run in the
+                         Python process. The default executor of the event
+                         loop is used if it is not provided.
+        :type executor: :class:`concurrent.futures.Executor`.
+        :param storage: Optional parameter to keep the solution matrices in a
+                        memory-mapped file, as in :func:`solve`.
+        :type storage: str.
+        :returns: awaitable of the primal and dual optimum, and the
+                  solutions for the primal and dual.
+        """
+        if self.F_struct is None:
+            raise Exception("Relaxation is not generated yet. Call "
+                            "'SdpRelaxation.get_relaxation' first")
+        from .async_utils import solve_sdp_async
+        return solve_sdp_async(self, solver, solverparameters, warm_start,
+                               executor, storage)
+
+    def set_hooks(self, progress=None, tracer=None, interval=0.1):
+        """Set the hooks that report the progress of generating the
+        relaxation. By default, the progress is only printed if the
+        relaxation is verbose.
+
+        :param progress: Optional callback that receives the name of the
+                         phase, the number of items done, and the total
+                         number of items. It is called at most once in every
+                         interval, and always at the end of a phase.
+        :type progress: function.
+        :param tracer: Optional tracer in the style of OpenTelemetry. Each
+                       phase of the profile is run in
+                       `tracer.start_as_current_span(phase)`.
+        :type tracer: :class:`opentelemetry.trace.Tracer`.
+        :param interval: Optional parameter of the minimum time in seconds
+                         between two calls of the progress callback.
+        :type interval: float.
+        """
+        if progress is None:
+            self._progress = None
+        else:
+            self._progress = Progress(progress, interval)
+        self.profile.tracer = tracer
+
+    def get_profile(self, filename=None):
+        """Return the profile of the relaxation: the wall time, the peak
+        memory, and the number of calls of each phase, the wall time and the
+        number of the substitutions, the counters of the cache hits, and the
+        number of nonzero elements in each block. The peak memory is only
+        measured if `tracemalloc` is tracing.
+
+        :param filename: Optional parameter to write the profile to a file
+                         in JSON.
+        :type filename: str.
+        :returns: dict of the profile.
+        """
+        profile = self.profile.to_dict()
+        nnz_per_block = []
+        if self.F_struct is not None and len(self.block_struct) > 0:
+            row_offsets = get_row_offsets(self.block_struct)
+            rows, _, _ = convert_to_coo_arrays(self.F_struct, self.F_chunks)
+            block_index = np.searchsorted(row_offsets, rows, side="right") - 1
+            nnz_per_block = np.bincount(
+                block_index, minlength=len(self.block_struct)).tolist()
+        profile["nnz_per_block"] = nnz_per_block
+        profile["solution_time"] = self.solution_time
+        if filename is not None:
+            with open(filename, "w") as file_:
+                json.dump(profile, file_, indent=2)
+        return profile
 
 
 class SdpRelaxation(Relaxation):
@@ -125,6 +259,12 @@ class SdpRelaxation(Relaxation):
     :type normalized: bool.
     :param parallel: Optional parameter for allowing parallel computations.
     :type parallel: bool.
+    :param out_of_core: Optional parameter to move the finished blocks of the
+                        SDP to memory-mapped chunk files while the relaxation
+                        is generated, for relaxations whose lil_matrix does
+                        not fit in memory. Only the block being generated is
+                        kept in `F_struct`.
+    :type out_of_core: bool.
 
     Attributes:
       - `monomial_sets`: The monomial sets that generate the moment matrix blocks.
@@ -147,18 +287,17 @@ class SdpRelaxation(Relaxation):
 
     """
     def __init__(self, variables, parameters=None, verbose=0, normalized=True,
-                 parallel=False):
+                 parallel=False, out_of_core=False):
         """Constructor for the class.
         """
         super(SdpRelaxation, self).__init__()
+        self.out_of_core = out_of_core
         self.substitutions = {}
-
-        #: Dictionary that maps monomials to SDP variables.
-        self.monomial_index = {}
-
         self.var_offsets = [0]
         self.variables = []
         self.verbose = verbose
+        if verbose > 0:
+            self._progress = Progress(print_progress)
         self.localizing_monomial_sets = None
         self.normalized = normalized
         self.constraint_starting_block = 0
@@ -168,10 +307,25 @@ class SdpRelaxation(Relaxation):
         self.constraints = []
         self.moment_substitutions = {}
         self.complex_matrix = False
+        # Word representation of polynomials used for the objective and the
+        # localizing matrices
+        self._alphabet = Alphabet()
+        self._word_substitutions = None
+        self._word_moment_substitutions = None
+        self._product_table = {}
+        self._constraint_polynomials = []
         n_noncommutative_hermitian = 0
         n_noncommutative_nonhermitian = 0
         n_commutative_hermitian = 0
         n_commutative_nonhermitian = 0
+        if any(isinstance(v, NCOperator) for v in flatten([variables])):
+            # The relaxation works with the SymPy atoms of lightweight
+            # operators, and polynomials built from them are translated to the
+            # alphabet of the relaxation
+            variables = _to_sympy(variables)
+
+        #: Dictionary that maps monomials to SDP variables.
+        self.monomial_index = MonomialIndex(self._alphabet)
         if isinstance(variables, list):
             if len(variables) > 0 and (isinstance(variables[0], list) or
                                        isinstance(variables[0], tuple)):
@@ -235,6 +389,16 @@ class SdpRelaxation(Relaxation):
     # ROUTINES RELATED TO GENERATING THE MOMENT MATRICES                   #
     ########################################################################
 
+    def _apply_substitutions(self, monomial):
+        """Apply the substitution rules of the relaxation to a monomial, and
+        record it in the timer of the profile.
+        """
+        tstart = time.time()
+        monomial = apply_substitutions(monomial, self.substitutions,
+                                       self.pure_substitution_rules)
+        self.profile.add_time("substitution", time.time() - tstart)
+        return monomial
+
     def _process_monomial(self, monomial, n_vars):
         """Process a single monomial when building the moment matrix.
         """
@@ -250,19 +414,20 @@ class SdpRelaxation(Relaxation):
                 # If yes, then we improve sparsity by reusing the
                 # previous variable to denote this entry in the matrix
                 k = self.monomial_index[monomial]
+                self.profile.count("monomial_index_hits")
             except KeyError:
                 # Otherwise we define a new entry in the associated
                 # array recording the monomials, and add an entry in
                 # the moment matrix
                 k = n_vars + 1
                 self.monomial_index[monomial] = k
+                self.profile.count("monomial_index_misses")
         return k, coeff
 
     def _push_monomial(self, monomial, n_vars, row_offset, rowA, columnA, N,
                        rowB, columnB, lenB, prevent_substitutions=False):
         if not prevent_substitutions:
-            monomial = apply_substitutions(monomial, self.substitutions,
-                                           self.pure_substitution_rules)
+            monomial = self._apply_substitutions(monomial)
         if is_number_type(monomial):
             if rowA == 0 and columnA == 0 and rowB == 0 and columnB == 0 and \
               monomial == 1.0:
@@ -303,11 +468,12 @@ class SdpRelaxation(Relaxation):
         block_index -- current block index in the SDP matrix
         monomials -- |W_d| set of words of length up to the relaxation level
         """
-        row_offset = 0
+        row_offset = -get_first_row(self.F_chunks)
         if block_index > 0:
             for block_size in self.block_struct[0:block_index]:
                 row_offset += block_size ** 2
         N = len(monomialsA)*len(monomialsB)
+        first_entry, n_entries = processed_entries, N * (N + 1) // 2
         if not self._parallel:
             # We process the M_d(u,w) entries in the moment matrix
             for rowA in range(len(monomialsA)):
@@ -333,15 +499,11 @@ class SdpRelaxation(Relaxation):
                                                          row_offset, rowA,
                                                          columnA, N, rowB,
                                                          columnB, len(monomialsB))
-                if self.verbose > 0:
-                    percentage = \
-                        "{0:.0f}%".format(float(processed_entries-1)/self.n_vars *
-                                          100)
-                    sys.stdout.write("\r\x1b[KCurrent number of SDP variables: %d"
-                                     " (done: %s)" % (n_vars, percentage))
-                    sys.stdout.flush()
+                if self._progress is not None:
+                    self._progress("moment matrix",
+                                   processed_entries - first_entry,
+                                   n_entries)
         else:
-            time0 = time.time()
             pool = multiprocessing.Pool()
             func = partial(assemble_monomial_and_do_substitutions, monomialsA=monomialsA, monomialsB=monomialsB, ppt=ppt, substitutions=self.substitutions, pure_substitution_rules=self.pure_substitution_rules)
             chunksize = max(int(sqrt(len(monomialsA)*len(monomialsB)*len(monomialsA)/2)/multiprocessing.cpu_count()),1)#this is just a guess and can be optimized
@@ -359,20 +521,14 @@ class SdpRelaxation(Relaxation):
                                              columnA, N, rowB,
                                              columnB, len(monomialsB),
                                              prevent_substitutions=True)
-                if self.verbose > 0:
-                    percentage = \
-                        "{0:.0f}%".format(float(processed_entries-1)/self.n_vars *
-                                          100)
-                    sys.stdout.write("\r\x1b[KCurrent number of SDP variables: %d"
-                                     " (done: %s, working in %s processes for %s seconds with a chunksize of %s)" % (n_vars, percentage, multiprocessing.cpu_count(), int(time.time()-time0), chunksize))
-                    sys.stdout.flush()
+                if self._progress is not None:
+                    self._progress("moment matrix",
+                                   processed_entries - first_entry,
+                                   n_entries)
 
             pool.close()
             pool.join()
 
-
-        if self.verbose > 0:
-            sys.stdout.write("\r")
         return n_vars, block_index + 1, processed_entries
 
     def _generate_all_moment_matrix_blocks(self, n_vars, block_index):
@@ -396,8 +552,87 @@ class SdpRelaxation(Relaxation):
                         processed_entries,
                         monomials, [S.One])
             self.var_offsets.append(n_vars)
+            self._spill_blocks(block_index)
         return n_vars, block_index
 
+    ########################################################################
+    # ROUTINES RELATED TO THE WORD REPRESENTATION OF POLYNOMIALS           #
+    ########################################################################
+
+    def _prepare_word_representation(self):
+        """Convert the substitution rules to rules acting on words. If a rule
+        cannot be represented, polynomials are processed with SymPy.
+        """
+        self._word_moment_substitutions = None
+        self._word_substitutions = None
+        if self._alphabet is None:
+            return
+        try:
+            self._word_substitutions = \
+                convert_substitutions(self.substitutions, self._alphabet)
+        except ValueError:
+            pass
+
+    def _to_polynomial(self, expr):
+        """Convert a SymPy polynomial to its word representation with the
+        substitutions applied. It returns None if the polynomial has to be
+        processed with SymPy.
+        """
+        if self._word_substitutions is None:
+            return None
+        if not isinstance(expr, (int, float, complex, NCOperator,
+                                 NCPolynomial)) and expr.is_Relational:
+            expr = convert_relational(expr)
+        try:
+            polynomial = NCPolynomial.from_expr(expr, self._alphabet)
+        except ValueError:
+            return None
+        return polynomial.substitute(self._word_substitutions)
+
+    def __build_word_moment_substitutions(self):
+        self._product_table = {}
+        self._word_moment_substitutions = {}
+        for monomial, value in self.moment_substitutions.items():
+            try:
+                self._word_moment_substitutions[
+                    self._alphabet.word(monomial)] = value
+            except ValueError:
+                pass
+
+    def _get_index_of_polynomial(self, polynomial, daggered=False):
+        """Returns the indices of the monomials of a polynomial in word
+        representation, or None if a monomial could not be found.
+        """
+        if self._word_moment_substitutions is None:
+            self.__build_word_moment_substitutions()
+        result = []
+        for word, coeff in polynomial:
+            if len(word) == 0:
+                result.append((0, coeff))
+                continue
+            try:
+                result.append((0, self._word_moment_substitutions[word] *
+                               coeff))
+                continue
+            except KeyError:
+                pass
+            try:
+                result.append((self.monomial_index.index_of_word(word),
+                               coeff))
+            except KeyError:
+                if daggered:
+                    return None
+                dag_polynomial = \
+                    NCPolynomial.from_word(self._alphabet.adjoint(word),
+                                           self._alphabet)
+                dag_result = self._get_index_of_polynomial(
+                    dag_polynomial.substitute(self._word_substitutions),
+                    daggered=True)
+                if dag_result is None:
+                    return None
+                result += [(k, coeff0*coeff) for k, coeff0 in dag_result]
+        return result
+
     ########################################################################
     # ROUTINES RELATED TO GENERATING THE LOCALIZING MATRICES AND PROCESSING#
     # CONSTRAINTS                                                          #
@@ -409,9 +644,7 @@ class SdpRelaxation(Relaxation):
         """
         processed_element, coeff1 = separate_scalar_factor(element)
         if enablesubstitution:
-            processed_element = \
-                apply_substitutions(processed_element, self.substitutions,
-                                    self.pure_substitution_rules)
+            processed_element = self._apply_substitutions(processed_element)
         # Given the monomial, we need its mapping L_y(w) to push it into
         # a corresponding constraint matrix
         if processed_element.is_Number:
@@ -466,12 +699,155 @@ class SdpRelaxation(Relaxation):
         else:
             elements = polynomial.as_coeff_mul()[1][0].as_coeff_add()[1]
         # Identify its constituent monomials
+        row = row_offset - get_first_row(self.F_chunks) + i * width + j
         for element in elements:
             results = self._get_index_of_monomial(element)
             # k identifies the mapped value of a word (monomial) w
             for (k, coeff) in results:
                 if k > -1 and coeff != 0:
-                    self.F_struct[row_offset + i * width + j, k] += coeff
+                    self.F_struct[row, k] += coeff
+
+    def __get_product_indices(self, word):
+        """Return the indices of the normalised product u^dagger m w given
+        as a single word. The products are memoized, so they are calculated
+        once across all entries and all constraints.
+        """
+        try:
+            indices = self._product_table[word]
+            self.profile.count("product_table_hits")
+            return indices
+        except KeyError:
+            self.profile.count("product_table_misses")
+            polynomial = NCPolynomial.from_word(word, self._alphabet)
+            indices = self._get_index_of_polynomial(
+                polynomial.substitute(self._word_substitutions))
+            self._product_table[word] = indices
+            return indices
+
+    def __push_localizing_matrix(self, polynomial, monomials, block_index,
+                                 row_offset):
+        """Push the localizing matrix of a polynomial in word representation
+        to the F structure. The matrix is assembled as a linear combination
+        of the product tables of the terms of the polynomial. It returns the
+        entries that have to be processed with SymPy.
+        """
+        alphabet = self._alphabet
+        try:
+            words = [alphabet.word(monomial) for monomial in monomials]
+        except ValueError:
+            return [(row, column) for row in range(len(monomials))
+                    for column in range(row, len(monomials))]
+        adjoint_words = [alphabet.adjoint(word) for word in words]
+        width = self.block_struct[block_index - 1]
+        rows, columns, values, failed = [], [], [], set()
+        for term, coeff in polynomial:
+            for row, adjoint_word in enumerate(adjoint_words):
+                left = adjoint_word + term
+                for column in range(row, len(words)):
+                    indices = self.__get_product_indices(
+                        alphabet.canonical(left + words[column]))
+                    if indices is None:
+                        failed.add((row, column))
+                        continue
+                    for k, coeff0 in indices:
+                        rows.append(row * width + column)
+                        columns.append(k)
+                        values.append(coeff*coeff0)
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        values = np.array(values, dtype=self.F_struct.dtype)
+        if len(failed) > 0:
+            keep = ~np.isin(rows, [row * width + column
+                                   for row, column in failed])
+            rows, columns, values = rows[keep], columns[keep], values[keep]
+        self.__add_triplets(rows + row_offset, columns, values)
+        return sorted(failed)
+
+    def __add_triplets(self, rows, columns, values):
+        """Add sparse triplets to the F structure, summing duplicate entries.
+        """
+        if len(rows) == 0:
+            return
+        rows = rows - get_first_row(self.F_chunks)
+        order = np.lexsort((columns, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        unique = np.ones(len(rows), dtype=bool)
+        unique[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        starts = np.nonzero(unique)[0]
+        rows, columns = rows[starts], columns[starts]
+        values = np.add.reduceat(values, starts)
+        nonzero = values != 0
+        rows, columns, values = rows[nonzero], columns[nonzero], \
+            values[nonzero]
+        row_starts = np.searchsorted(rows, np.unique(rows))
+        row_ends = np.append(row_starts[1:], len(rows))
+        for start, end in zip(row_starts, row_ends):
+            row = rows[start]
+            if len(self.F_struct.rows[row]) == 0:
+                self.F_struct.rows[row] = columns[start:end].tolist()
+                self.F_struct.data[row] = values[start:end].tolist()
+            else:
+                for k, value in zip(columns[start:end], values[start:end]):
+                    self.F_struct[row, k] += value
+
+    def __get_coefficient_array(self, polynomial):
+        """Return the index and coefficient arrays of a polynomial given by
+        its coefficients, checking that the indices refer to existing
+        variables of the SDP.
+        """
+        indices, coeffs = get_coefficient_array(polynomial)
+        if len(indices) > 0 and (indices.min() < 0 or
+                                 indices.max() > self.n_vars):
+            raise Exception("The indices of the coefficients must be between "
+                            "0 and %d." % self.n_vars)
+        return indices, coeffs
+
+    def __get_moment_constraints(self, row_offsets):
+        """Return the triplets of the moment constraints given by string
+        expressions or by their coefficients, sorted by the rows, so that
+        they can be pushed to the F structure in a single update.
+
+        :param row_offsets: The first row of the block of each constraint.
+        :type row_offsets: list of int.
+        :returns: tuple of :class:`numpy.array` of the row indices, column
+                  indices, and values.
+        """
+        rows, indices, coeffs = [], [], []
+        expressions, expression_rows = [], []
+        for constraint, row_offset in zip(self.constraints, row_offsets):
+            if isinstance(constraint, str):
+                expressions.append(constraint)
+                expression_rows.append(row_offset)
+            elif is_coefficient_array(constraint):
+                indices_, coeffs_ = self.__get_coefficient_array(constraint)
+                rows.append(np.full(len(indices_), row_offset,
+                                    dtype=np.int64))
+                indices.append(indices_)
+                coeffs.append(coeffs_)
+        if len(expressions) > 0:
+            index, indices_, coeffs_ = self.__parse_expressions(expressions)
+            rows.append(np.array(expression_rows, dtype=np.int64)[index])
+            indices.append(indices_)
+            coeffs.append(coeffs_)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), \
+                np.zeros(0, dtype=self.F_struct.dtype)
+        rows = np.concatenate(rows)
+        order = np.argsort(rows, kind="mergesort")
+        return rows[order], np.concatenate(indices)[order], \
+            np.concatenate(coeffs).astype(self.F_struct.dtype)[order]
+
+    def __push_moment_constraint(self, moment_constraints, row_offsets,
+                                 block_index):
+        """Push the triplets of the moment constraint in the block before
+        block_index to the F structure, and move the block out of memory in
+        the out-of-core mode.
+        """
+        start, end = np.searchsorted(moment_constraints[0],
+                                     row_offsets[block_index-1:block_index+1])
+        self.__add_triplets(*[triplets[start:end]
+                              for triplets in moment_constraints])
+        self._spill_blocks(block_index)
 
     def _get_facvar(self, polynomial):
         """Return dense vector representation of a polynomial. This function is
@@ -479,7 +855,20 @@ class SdpRelaxation(Relaxation):
         sparse entries to the constraint matrices, it returns a dense
         vector.
         """
+        if is_coefficient_array(polynomial):
+            indices, coeffs = self.__get_coefficient_array(polynomial)
+            facvar = np.zeros(self.n_vars + 1,
+                              dtype=np.result_type(np.float64, coeffs))
+            np.add.at(facvar, indices, coeffs)
+            return facvar
         facvar = [0] * (self.n_vars + 1)
+        if isinstance(polynomial, NCPolynomial):
+            results = self._get_index_of_polynomial(polynomial)
+            if results is not None:
+                for (k, coeff) in results:
+                    facvar[k] += coeff
+                return facvar
+            polynomial = polynomial.to_expr()
         # Preprocess the polynomial for uniform handling later
         if is_number_type(polynomial):
             facvar[0] = polynomial
@@ -505,45 +894,59 @@ class SdpRelaxation(Relaxation):
                        SDP relaxation
         """
         initial_block_index = block_index
-        row_offsets = [0]
-        for block, block_size in enumerate(self.block_struct):
-            row_offsets.append(row_offsets[block] + block_size ** 2)
-
-
-
-
-
+        row_offsets = get_row_offsets(self.block_struct)
+        moment_constraints = \
+            self.__get_moment_constraints(row_offsets[initial_block_index:])
+        # In the out-of-core mode, only the current block is in memory, so
+        # the moment constraints are pushed one by one
+        if self.F_chunks is None:
+            self.__add_triplets(*moment_constraints)
         if not self._parallel:
             for k, ineq in enumerate(self.constraints):
                 block_index += 1
-                if isinstance(ineq, str):
-                    self.__parse_expression(ineq, row_offsets[block_index-1])
+                if isinstance(ineq, str) or is_coefficient_array(ineq):
+                    if self.F_chunks is not None:
+                        self.__push_moment_constraint(moment_constraints,
+                                                      row_offsets,
+                                                      block_index)
                     continue
                 if ineq.is_Relational:
                     ineq = convert_relational(ineq)
                 monomials = self.localizing_monomial_sets[block_index -
                                                           initial_block_index-1]
-                # Process M_y(gy)(u,w) entries
-                for row in range(len(monomials)):
-                    for column in range(row, len(monomials)):
-                        # Calculate the moments of polynomial entries
-                        polynomial = \
-                            simplify_polynomial(
-                                monomials[row].adjoint() * expand(ineq) *
-                                monomials[column], self.substitutions)
-                        self.__push_facvar_sparse(polynomial, block_index,
-                                                  row_offsets[block_index-1],
-                                                  row, column)
-                if self.verbose > 0:
-                    sys.stdout.write("\r\x1b[KProcessing %d/%d constraints..." %
-                                     (k+1, len(self.constraints)))
-                    sys.stdout.flush()
+                ineq_polynomial = self._constraint_polynomials[k]
+                if ineq_polynomial is None:
+                    entries = [(row, column)
+                               for row in range(len(monomials))
+                               for column in range(row, len(monomials))]
+                else:
+                    entries = \
+                        self.__push_localizing_matrix(ineq_polynomial,
+                                                      monomials, block_index,
+                                                      row_offsets[block_index-1])
+                # Process the remaining M_y(gy)(u,w) entries
+                for row, column in entries:
+                    # Calculate the moments of polynomial entries
+                    polynomial = \
+                        simplify_polynomial(
+                            monomials[row].adjoint() * expand(ineq) *
+                            monomials[column], self.substitutions)
+                    self.__push_facvar_sparse(polynomial, block_index,
+                                              row_offsets[block_index-1],
+                                              row, column)
+                self._spill_blocks(block_index)
+                if self._progress is not None:
+                    self._progress("localizing matrices", k + 1,
+                                   len(self.constraints))
         else:
             pool = multiprocessing.Pool()
             for k, ineq in enumerate(self.constraints):
                 block_index += 1
-                if isinstance(ineq, str):
-                    self.__parse_expression(ineq, row_offsets[block_index-1])
+                if isinstance(ineq, str) or is_coefficient_array(ineq):
+                    if self.F_chunks is not None:
+                        self.__push_moment_constraint(moment_constraints,
+                                                      row_offsets,
+                                                      block_index)
                     continue
                 if ineq.is_Relational:
                     ineq = convert_relational(ineq)
@@ -561,16 +964,14 @@ class SdpRelaxation(Relaxation):
                     self.__push_facvar_sparse(polynomial, block_index,
                                               row_offsets[block_index-1],
                                               row, column)
-                if self.verbose > 0:
-                    sys.stdout.write("\r\x1b[KProcessing %d/%d constraints..." %
-                                     (k+1, len(self.constraints)))
-                    sys.stdout.flush()
+                self._spill_blocks(block_index)
+                if self._progress is not None:
+                    self._progress("localizing matrices", k + 1,
+                                   len(self.constraints))
 
             pool.close()
             pool.join()
-
-        if self.verbose > 0:
-            sys.stdout.write("\n")
+        self._spill_blocks(block_index)
         return block_index
 
     def __process_equalities(self, equalities, momentequalities):
@@ -584,6 +985,10 @@ class SdpRelaxation(Relaxation):
         n_rows = 0
         if equalities is not None:
             for equality in equalities:
+                if is_coefficient_array(equality):
+                    monomial_sets.append([S.One])
+                    n_rows += 1
+                    continue
                 # Find the order of the localizing matrix
                 if equality.is_Relational:
                     equality = convert_relational(equality)
@@ -614,11 +1019,14 @@ class SdpRelaxation(Relaxation):
             for row in range(len(monomial_sets[i])):
                 for column in range(row, len(monomial_sets[i])):
                     # Calculate the moments of polynomial entries
-                    polynomial = \
-                        simplify_polynomial(monomial_sets[i][row].adjoint() *
-                                            equality*monomial_sets[i][column],
-                                            self.substitutions)
-                    A[n_rows] = self._get_facvar(polynomial)
+                    if is_coefficient_array(equality):
+                        A[n_rows] = self._get_facvar(equality)
+                    else:
+                        polynomial = \
+                            simplify_polynomial(
+                                monomial_sets[i][row].adjoint() * equality *
+                                monomial_sets[i][column], self.substitutions)
+                        A[n_rows] = self._get_facvar(polynomial)
                     # This is something really weird: we want the constant
                     # terms in equalities to be positive. Otherwise funny
                     # things happen in the QR decomposition and the basis
@@ -658,15 +1066,17 @@ class SdpRelaxation(Relaxation):
         for block_size in self.block_struct[0:block_index]:
             row_offset += block_size ** 2
         width = self.block_struct[0]
-        for row in range(width**2):
-            self.F_struct[row_offset + row,
-                          n_vars+1:n_vars + original_n_vars+2] =\
-              self.F_struct[row, :original_n_vars+1]
+        # The copy is the first block shifted to new rows and to new columns
+        rows, columns, values = get_rows(self.F_struct, self.F_chunks, 0,
+                                         width**2)
+        keep = columns <= original_n_vars
+        self.__add_triplets(rows[keep] + row_offset,
+                            columns[keep] + n_vars + 1, values[keep])
         return n_vars + original_n_vars + 1, block_index + 1
 
     def __add_new_momentmatrix(self, n_vars, block_index):
         self.var_offsets.append(n_vars)
-        row_offset = 0
+        row_offset = -get_first_row(self.F_chunks)
         for block_size in self.block_struct[0:block_index]:
             row_offset += block_size ** 2
         width = self.block_struct[0]
@@ -683,23 +1093,20 @@ class SdpRelaxation(Relaxation):
         lenA = len(self.monomial_sets[0])
         lenB = len(self.monomial_sets[1])
         N = lenA*lenB
-        for rowA in range(lenA):
-            for columnA in range(rowA, lenA):
-                for rowB in range(lenB):
-                    start_columnB = 0
-                    if rowA == columnA:
-                        start_columnB = rowB
-                    for columnB in range(start_columnB, rowB):
-                        original_row = self.F_struct[row_offset + rowA*N*lenB +
-                                                     rowB * N +
-                                                     columnA * lenB + columnB]
-                        self.F_struct[row_offset + rowA*N*lenB +
-                                      rowB * N +
-                                      columnA * lenB + columnB] = \
-                            self.F_struct[row_offset + rowA*N*lenB +
-                                          columnB * N + columnA * lenB + rowB]
-                        self.F_struct[row_offset + rowA*N*lenB + columnB * N +
-                                      columnA * lenB + rowB] = original_row
+        rows, columns, values = get_rows(self.F_struct, self.F_chunks,
+                                         row_offset, row_offset + N**2)
+        for row in np.unique(rows) - get_first_row(self.F_chunks):
+            self.F_struct.rows[row] = []
+            self.F_struct.data[row] = []
+        # The partial transpose swaps the indices of the second subsystem in
+        # the off-diagonal blocks of the first subsystem
+        i, j = np.divmod(rows - row_offset, N)
+        rowA, rowB = np.divmod(i, lenB)
+        columnA, columnB = np.divmod(j, lenB)
+        swap = rowA < columnA
+        rowB[swap], columnB[swap] = columnB[swap], rowB[swap]
+        rows = row_offset + (rowA*lenB + rowB)*N + columnA*lenB + columnB
+        self.__add_triplets(rows, columns, values)
 
     def __add_extra_momentmatrices(self, extramomentmatrices, n_vars,
                                    block_index):
@@ -713,6 +1120,7 @@ class SdpRelaxation(Relaxation):
                         copy = True
                     if parameter == "ppt":
                         ppt = True
+                self._spill_blocks(block_index)
                 if copy:
                     n_vars, block_index = \
                       self.__duplicate_momentmatrix(original_n_vars, n_vars,
@@ -724,32 +1132,55 @@ class SdpRelaxation(Relaxation):
                     self.__impose_ppt(block_index)
         return n_vars, block_index
 
-    def __parse_expression(self, expr, row_offset):
-        if expr.find("]") > -1:
-            sub_exprs = expr.split(']')
-            for sub_expr in sub_exprs:
-                startindex = 0
-                if sub_expr.startswith('-') or sub_expr.startswith('+'):
-                    startindex = 1
-                ind = sub_expr.find('[')
-                if ind > -1:
-                    idx = sub_expr[ind+1:].split(",")
-                    i, j = int(idx[0]), int(idx[1])
-                    mm_ind = int(sub_expr[startindex:ind])
-                    if sub_expr.find('*') > -1:
-                        value = float(sub_expr[:sub_expr.find('*')])
-                    elif sub_expr.startswith('-'):
-                        value = -1.0
-                    else:
-                        value = 1.0
-                    base_row_offset = sum([bs**2 for bs in
-                                           self.block_struct[:mm_ind]])
-                    width = self.block_struct[mm_ind]
-                    self.F_struct[row_offset] += \
-                        value*self.F_struct[base_row_offset + i*width + j]
+    def __parse_expressions(self, expressions):
+        """Convert string expressions of linear combinations of the elements
+        of the moment matrices to sparse coefficient vectors over the SDP
+        variables. The elements of the lower triangles are read from the
+        upper triangles.
+
+        :returns: tuple of :class:`numpy.array` of the index of the
+                  expression, the index of the SDP variable, and the
+                  coefficient of the nonzero elements.
+        """
+        row_offsets = np.cumsum([0] + [bs**2 for bs in self.block_struct])
+        index, rows, coeffs, conjugate = [], [], [], []
+        constant_index, constants = [], []
+        for k, expr in enumerate(expressions):
+            constant, terms = parse_expression(expr)
+            if constant != 0:
+                constant_index.append(k)
+                constants.append(constant)
+            for coeff, block, i, j in terms:
+                if block >= len(self.block_struct) or \
+                        max(i, j) >= abs(self.block_struct[block]) or \
+                        (self.block_struct[block] < 0 and i != j):
+                    raise Exception("The element %d[%d,%d] in the "
+                                    "expression %s does not exist." %
+                                    (block, i, j, expr))
+                index.append(k)
+                if self.block_struct[block] < 0:
+                    rows.append(row_offsets[block] + i)
                 else:
-                    value = float(sub_expr)
-                    self.F_struct[row_offset, 0] += value
+                    rows.append(row_offsets[block] +
+                                min(i, j)*self.block_struct[block] + max(i, j))
+                coeffs.append(coeff)
+                conjugate.append(i > j)
+        index, rows = np.array(index, dtype=np.int64), \
+            np.array(rows, dtype=np.int64)
+        constant_index = np.array(constant_index, dtype=np.int64)
+        F_rows, F_columns, F_values = \
+            get_selected_rows(self.F_struct, self.F_chunks, np.unique(rows))
+        # The nonzero elements of the row of every term
+        starts = np.searchsorted(F_rows, rows)
+        counts = np.searchsorted(F_rows, rows, side="right") - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+            np.arange(counts.sum())
+        values = np.where(np.repeat(conjugate, counts),
+                          np.conj(F_values[positions]), F_values[positions])
+        return np.append(np.repeat(index, counts), constant_index), \
+            np.append(F_columns[positions],
+                      np.zeros(len(constants), dtype=np.int64)), \
+            np.append(np.repeat(coeffs, counts) * values, constants)
 
     ########################################################################
     # ROUTINES RELATED TO INITIALIZING DATA STRUCTURES                     #
@@ -796,6 +1227,10 @@ class SdpRelaxation(Relaxation):
             # Find the order of the localizing matrix
             if isinstance(constraint, str):
                 ineq_order = 2 * self.level
+            elif is_coefficient_array(constraint):
+                ineq_order = 2 * self.level
+                if np.iscomplexobj(get_coefficient_array(constraint)[1]):
+                    self.complex_matrix = True
             else:
                 if constraint.is_Relational:
                     constraint = convert_relational(constraint)
@@ -911,10 +1346,45 @@ class SdpRelaxation(Relaxation):
         row_offset = 0
         for block in range(self.constraint_starting_block):
             row_offset += self.block_struct[block]**2
+        if self.F_chunks is not None:
+            self.F_chunks.truncate(row_offset)
+            self.F_struct = \
+                self.__allocate_F_struct(self.F_struct.shape[1],
+                                         self.F_struct.dtype,
+                                         self.constraint_starting_block)
+            return
         for row in range(row_offset, len(self.F_struct.rows)):
             self.F_struct.rows[row] = []
             self.F_struct.data[row] = []
 
+    def __allocate_F_struct(self, n_columns, dtype, block_index=0):
+        """Allocate the lil_matrix of the F structure. In the out-of-core
+        mode, it only holds the rows of the block given by block_index, which
+        is the block being generated.
+        """
+        if self.F_chunks is None:
+            n_rows = sum([bs**2 for bs in self.block_struct])
+        elif block_index < len(self.block_struct):
+            n_rows = self.block_struct[block_index]**2
+        else:
+            n_rows = 0
+        return lil_matrix((n_rows, n_columns), dtype=dtype)
+
+    def _spill_blocks(self, block_index):
+        """Move the finished blocks before block_index from F_struct to the
+        chunk files in the out-of-core mode, and continue with the block
+        given by block_index in F_struct.
+        """
+        if self.F_chunks is None:
+            return
+        end_row = sum(block_size**2 for block_size in
+                      self.block_struct[:block_index])
+        if end_row > self.F_chunks.end_row:
+            self.F_chunks.spill(self.F_struct, end_row)
+            self.F_struct = self.__allocate_F_struct(self.F_struct.shape[1],
+                                                     self.F_struct.dtype,
+                                                     block_index)
+
     ########################################################################
     # PUBLIC ROUTINES EXPOSED TO THE USER                                  #
     ########################################################################
@@ -927,7 +1397,9 @@ class SdpRelaxation(Relaxation):
         only if the moment matrix already exists. Call it if you want to
         replace your constraints. The number of the respective types of
         constraints and the maximum degree of each constraint must remain the
-        same.
+        same. Constraints that are linear in the SDP variables can also be
+        given by their coefficients in the same way as the objective function
+        in `set_objective`; they are treated as moment constraints.
 
         :param inequalities: Optional parameter to list inequality constraints.
         :type inequalities: list of :class:`sympy.core.exp.Expr`.
@@ -946,12 +1418,25 @@ class SdpRelaxation(Relaxation):
                                  equalities by solving the linear equations.
         :type removeequalities: bool.
         """
+        inequalities, equalities, bounds, momentinequalities, \
+            momentequalities = _to_sympy([inequalities, equalities, bounds,
+                                          momentinequalities,
+                                          momentequalities])
+        if removeequalities and self.F_chunks is not None:
+            raise Exception("Equalities cannot be removed in the out-of-core "
+                            "mode.")
         if block_index == 0 or block_index == self.constraint_starting_block:
-            if self.constraints_hash == hash(frozenset((str(inequalities),str(equalities),str(bounds),str(momentinequalities),str(momentequalities),str(removeequalities)))):
+            constraints_hash = hash(frozenset((
+                _constraint_key(inequalities), _constraint_key(equalities),
+                _constraint_key(bounds), _constraint_key(momentinequalities),
+                _constraint_key(momentequalities), str(removeequalities))))
+            if self.constraints_hash == constraints_hash:
                 return
-            self.constraints_hash = hash(frozenset((str(inequalities),str(equalities),str(bounds),str(momentinequalities),str(momentequalities),str(removeequalities))))
+            self.constraints_hash = constraints_hash
 
         self.status = "unsolved"
+        self._moment_vector = None
+        self._dual_products = None
         if block_index == 0:
             block_index = self.constraint_starting_block
             self.__wipe_F_struct_from_constraints()
@@ -959,6 +1444,11 @@ class SdpRelaxation(Relaxation):
         if not (removeequalities or equalities is None):
             # Equalities are converted to pairs of inequalities
             for equality in equalities:
+                if is_coefficient_array(equality):
+                    self.constraints.append(equality)
+                    self.constraints.append(
+                        negate_coefficient_array(equality))
+                    continue
                 if equality.is_Relational:
                     equality = convert_relational(equality)
                 self.constraints.append(equality)
@@ -977,35 +1467,57 @@ class SdpRelaxation(Relaxation):
                     if not removeequalities:
                         self.constraints.append(meq)
                         if isinstance(meq, str):
-                            tmp = meq.replace("+", "p")
-                            tmp = tmp.replace("-", "+")
-                            tmp = tmp.replace("p", "-")
-                            self.constraints.append(tmp)
+                            _, indices, coeffs = \
+                                self.__parse_expressions([meq])
+                            self.constraints.append((indices, -coeffs))
+                        elif is_coefficient_array(meq):
+                            self.constraints.append(
+                                negate_coefficient_array(meq))
                         else:
                             self.constraints.append(-meq)
                     else:
                         reduced_moment_equalities.append(meq)
-        self.__process_inequalities(block_index)
+        self._constraint_polynomials = \
+            [None if isinstance(constraint, str) or
+             is_coefficient_array(constraint)
+             else self._to_polynomial(constraint)
+             for constraint in self.constraints]
+        with self.profile.phase("localizing matrices"):
+            self.__process_inequalities(block_index)
         if reduced_moment_equalities == []:
             reduced_moment_equalities = None
         if removeequalities:
-            self.__remove_equalities(equalities, reduced_moment_equalities)
+            with self.profile.phase("equality removal"):
+                self.__remove_equalities(equalities,
+                                         reduced_moment_equalities)
 
     def set_objective(self, objective, extraobjexpr=None):
         """Set or change the objective function of the polynomial optimization
         problem.
 
-        :param objective: Describes the objective function.
-        :type objective: :class:`sympy.core.expr.Expr`
+        :param objective: Describes the objective function. Alternatively,
+                          the coefficients of the SDP variables can be given
+                          as a pair of an index array and a coefficient array,
+                          or as a dictionary mapping indices to coefficients.
+                          The index of a monomial can be looked up in
+                          `monomial_index`, and the index zero stands for the
+                          constant term.
+        :type objective: :class:`sympy.core.expr.Expr` or tuple of
+                         :class:`numpy.array` or dict of int.
         :param extraobjexpr: Optional parameter of a string expression of a
                              linear combination of moment matrix elements to be
                              included in the objective function
         :type extraobjexpr: str.
         """
         if objective is not None:
-            facvar = \
-                self._get_facvar(simplify_polynomial(objective,
-                                                     self.substitutions))
+            if is_coefficient_array(objective):
+                polynomial = objective
+            else:
+                polynomial = self._to_polynomial(objective)
+            if polynomial is None:
+                polynomial = simplify_polynomial(_to_sympy(objective),
+                                                 self.substitutions)
+            facvar = self._get_facvar(polynomial)
             self.obj_facvar = facvar[1:]
             self.constant_term = facvar[0]
             if self.verbose > 0 and facvar[0] != 0:
@@ -1014,29 +1526,15 @@ class SdpRelaxation(Relaxation):
                       % facvar[0])
         else:
             self.obj_facvar = self._get_facvar(0)[1:]
+            self.constant_term = 0
         if extraobjexpr is not None:
-            for sub_expr in extraobjexpr.split(']'):
-                startindex = 0
-                if sub_expr.startswith('-') or sub_expr.startswith('+'):
-                    startindex = 1
-                ind = sub_expr.find('[')
-                if ind > -1:
-                    idx = sub_expr[ind+1:].split(",")
-                    i, j = int(idx[0]), int(idx[1])
-                    mm_ind = int(sub_expr[startindex:ind])
-                    if sub_expr.find('*') > -1:
-                        value = float(sub_expr[:sub_expr.find('*')])
-                    elif sub_expr.startswith('-'):
-                        value = -1.0
-                    else:
-                        value = 1.0
-                    base_row_offset = sum([bs**2 for bs in
-                                           self.block_struct[:mm_ind]])
-                    width = self.block_struct[mm_ind]
-                    for column in self.F_struct[base_row_offset + i*width + j].rows[0]:
-                        self.obj_facvar[column-1] = \
-                            value*self.F_struct[base_row_offset + i*width + j,
-                                                column]
+            _, indices, coeffs = self.__parse_expressions([extraobjexpr])
+            obj_facvar = np.array(self.obj_facvar,
+                                  dtype=np.result_type(np.float64, coeffs))
+            np.add.at(obj_facvar, indices[indices > 0] - 1,
+                      coeffs[indices > 0])
+            self.obj_facvar = obj_facvar
+            self.constant_term += coeffs[indices == 0].sum()
 
     def __getitem__(self, index):
         """Obtained the value for a polynomial in a solved relaxation.
@@ -1047,9 +1545,10 @@ class SdpRelaxation(Relaxation):
         :returns: The value of the polynomial extracted from the solved SDP.
         :rtype: float
         """
+        index = _to_sympy(index)
         if not isinstance(index, Expr):
             raise Exception("Not a monomial or polynomial!")
-        elif self.status == "unsolved":
+        elif self.status == "unsolved" or self.x_mat is None:
             raise Exception("SDP relaxation is not solved yet!")
         else:
             return get_xmat_value(index, self)
@@ -1061,21 +1560,29 @@ class SdpRelaxation(Relaxation):
         :param sdpRelaxation: The SDP relaxation to be solved.
         :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
         :param threshold: Optional parameter for specifying the threshold value
-                          below which the eigenvalues and entries of the
-                          eigenvectors are disregarded.
+                          below which the coefficients of the polynomials
+                          are disregarded.
         :type threshold: float.
         :returns: The SOS decomposition of [sigma_0, sigma_1, ..., sigma_m]
         :rtype: list of :class:`sympy.core.exp.Expr`.
         """
         return get_sos_decomposition(self, threshold=threshold)
 
+    def get_sos_certificate(self):
+        """Given a solution of the dual problem, it returns the numeric SOS
+        certificate with the factor matrices of the blocks. The polynomials
+        are only expanded symbolically on request.
+
+        :returns: The SOS certificate of [sigma_0, sigma_1, ..., sigma_m]
+        :rtype: :class:`ncpol2sdpa.solver_common.SosCertificate`.
+        """
+        return get_sos_certificate(self)
+
     def extract_dual_value(self, monomial, blocks=None):
         """Given a solution of the dual problem and a monomial, it returns the
         inner product of the corresponding coefficient matrix and the dual
         solution. It can be restricted to certain blocks.
 
-        :param monomial: The monomial for which the value is requested.
-        :type monomial: :class:`sympy.core.exp.Expr`.
         :param monomial: The monomial for which the value is requested.
         :type monomial: :class:`sympy.core.exp.Expr`.
         :param blocks: Optional parameter to specify the blocks to be included.
@@ -1085,8 +1592,10 @@ class SdpRelaxation(Relaxation):
         """
         return extract_dual_value(self, monomial, blocks)
 
-    def find_solution_ranks(self, xmat=None, baselevel=0):
-        """Helper function to detect rank loop in the solution matrix.
+    def find_solution_ranks(self, xmat=None, baselevel=0, tolerance=1e-6):
+        """Helper function to detect rank loop in the solution matrix. The
+        ranks of the nested submatrices are read off a single Cholesky
+        factorisation.
 
         :param sdpRelaxation: The SDP relaxation.
         :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
@@ -1098,10 +1607,32 @@ class SdpRelaxation(Relaxation):
                            relaxation for which the rank loop should be tested
                            against.
         :type base_level: int.
+        :param tolerance: Optional parameter for specifying the threshold of
+                          the rank relative to the largest diagonal element.
+        :type tolerance: float.
         :returns: list of int -- the ranks of the solution matrix with in the
                   order of increasing degree.
         """
-        return find_solution_ranks(self, xmat=xmat, baselevel=baselevel)
+        return find_solution_ranks(self, xmat=xmat, baselevel=baselevel,
+                                   tolerance=tolerance)
+
+    def extract_optimizers(self, xmat=None, tolerance=1e-6):
+        """Extract the optimal operators by the GNS construction if the
+        solution of the moment matrix is a flat extension. For commutative
+        variables, :func:`ncpol2sdpa.solver_common.get_atoms` turns the
+        operators into points.
+
+        :param x_mat: Optional parameter providing the primal solution of the
+                      moment matrix. If not provided, the solution is extracted
+                      from the sdpRelaxation object.
+        :type x_mat: :class:`numpy.array`.
+        :param tolerance: Optional parameter for specifying the threshold of
+                          the rank relative to the largest diagonal element.
+        :type tolerance: float.
+        :returns: tuple of a dict of the variables to their matrices, and the
+                  state vector.
+        """
+        return extract_optimizers(self, xmat=xmat, tolerance=tolerance)
 
     def write_to_file(self, filename, filetype=None):
         """Write the relaxation to a file.
@@ -1128,15 +1659,16 @@ class SdpRelaxation(Relaxation):
         elif filetype is None:
             raise Exception("Cannot detect filetype from extension!")
 
-        if filetype == "sdpa":
-            write_to_sdpa(self, filename)
-        elif filetype == "mosek":
-            task = convert_to_mosek(self)
-            task.writedata(filename)
-        elif filetype == "csv":
-            write_to_human_readable(self, filename)
-        else:
-            raise Exception("Unknown filetype")
+        with self.profile.phase("export"):
+            if filetype == "sdpa":
+                write_to_sdpa(self, filename)
+            elif filetype == "mosek":
+                task = convert_to_mosek(self)
+                task.writedata(filename)
+            elif filetype == "csv":
+                write_to_human_readable(self, filename)
+            else:
+                raise Exception("Unknown filetype")
 
     def save_monomial_index(self, filename):
         """Write the monomial index to a file.
@@ -1237,6 +1769,14 @@ class SdpRelaxation(Relaxation):
         if self.level < -1:
             raise Exception("Invalid level of relaxation")
         self.level = level
+        self.profile.reset()
+        inequalities, equalities, bounds, momentinequalities, \
+            momentequalities, extramonomials, localizing_monomials = \
+            _to_sympy([inequalities, equalities, bounds, momentinequalities,
+                       momentequalities, extramonomials, localizing_monomials])
+        if substitutions is not None:
+            substitutions = dict((_to_sympy(lhs), _to_sympy(rhs))
+                                 for lhs, rhs in substitutions.items())
         if substitutions is None:
             self.substitutions = {}
         else:
@@ -1246,10 +1786,15 @@ class SdpRelaxation(Relaxation):
                     self.pure_substitution_rules = False
                 if iscomplex(lhs) or iscomplex(rhs):
                     self.complex_matrix = True
-        if chordal_extension:
-            self.variables = find_variable_cliques(self.variables, objective,
-                                                   inequalities, equalities)
-        self.__generate_monomial_sets(extramonomials)
+        with self.profile.phase("word representation"):
+            self._prepare_word_representation()
+        with self.profile.phase("monomial generation"):
+            if chordal_extension:
+                self.variables = find_variable_cliques(self.variables,
+                                                       objective,
+                                                       inequalities,
+                                                       equalities)
+            self.__generate_monomial_sets(extramonomials)
         self.localizing_monomial_sets = localizing_monomials
 
         if bounds is not None:
@@ -1270,25 +1815,32 @@ class SdpRelaxation(Relaxation):
                 if copy:
                     self.n_vars += self.n_vars + 1
                 else:
-                    self.n_vars += (self.block_struct[0]**2)/2
+                    self.n_vars += self.block_struct[0] * \
+                        (self.block_struct[0] + 1) // 2
         if self.complex_matrix:
             dtype = np.complex128
         else:
             dtype = np.float64
-        self.F_struct = lil_matrix((sum([bs**2 for bs in self.block_struct]),
-                                    self.n_vars + 1), dtype=dtype)
+        self.F_chunks = None
+        if self.out_of_core:
+            self.F_chunks = TripletChunks(dtype)
+        self.F_struct = self.__allocate_F_struct(self.n_vars + 1, dtype)
 
         if self.verbose > 0:
             print(('Estimated number of SDP variables: %d' % self.n_vars))
             print('Generating moment matrix...')
         # Generate moment matrices
-        new_n_vars, block_index = self.__add_parameters()
-        new_n_vars, block_index = \
-            self._generate_all_moment_matrix_blocks(new_n_vars, block_index)
-        if extramomentmatrices is not None:
+        with self.profile.phase("moment matrix"):
+            new_n_vars, block_index = self.__add_parameters()
+            self._spill_blocks(block_index)
             new_n_vars, block_index = \
-                self.__add_extra_momentmatrices(extramomentmatrices,
-                                                new_n_vars, block_index)
+                self._generate_all_moment_matrix_blocks(new_n_vars,
+                                                        block_index)
+            if extramomentmatrices is not None:
+                new_n_vars, block_index = \
+                    self.__add_extra_momentmatrices(extramomentmatrices,
+                                                    new_n_vars, block_index)
+            self._spill_blocks(block_index)
         # The initial estimate for the size of F_struct was overly generous.
         self.n_vars = new_n_vars
         # We don't correct the size of F_struct, because that would trigger
@@ -1298,13 +1850,162 @@ class SdpRelaxation(Relaxation):
         if self.verbose > 0:
             print(('Reduced number of SDP variables: %d' % self.n_vars))
         # Objective function
-        self.set_objective(objective, extraobjexpr)
+        with self.profile.phase("objective"):
+            self.set_objective(objective, extraobjexpr)
         # Process constraints
         self.constraint_starting_block = block_index
         self.process_constraints(inequalities, equalities, bounds,
                                  momentinequalities, momentequalities,
                                  block_index, removeequalities)
 
+    def estimate(self, level, objective=None, inequalities=None,
+                 equalities=None, substitutions=None, bounds=None,
+                 momentinequalities=None, momentequalities=None,
+                 removeequalities=False, extramonomials=None,
+                 extramomentmatrices=None, localizing_monomials=None,
+                 chordal_extension=False):
+        """Estimate the size of the SDP relaxation without generating it. The
+        monomials and the block structure are calculated the same way as in
+        `get_relaxation`, but the moment and localizing matrices are not
+        generated, and the relaxation itself is not changed. The parameters
+        are the same as those of `get_relaxation`.
+
+        The number of variables is the same upper bound that
+        `get_relaxation` starts from, and the number of nonzero elements
+        assumes that every entry of a localizing matrix has as many terms as
+        the constraint times the longest right-hand side of the substitution
+        rules. The memory of the solvers is a rough model of their dominant
+        data structures.
+
+        :returns: dict with the keys "block_struct", "n_vars", "nnz",
+                  "file_size" for the size of the exported SDPA file,
+                  and "memory", a dict of the estimated memory in bytes for
+                  "build" and for each solver, with None for the solvers
+                  that do not support the relaxation.
+        """
+        inequalities, equalities, bounds, momentinequalities, \
+            momentequalities, extramonomials, localizing_monomials = \
+            _to_sympy([inequalities, equalities, bounds, momentinequalities,
+                       momentequalities, extramonomials, localizing_monomials])
+        if substitutions is not None:
+            substitutions = dict((_to_sympy(lhs), _to_sympy(rhs))
+                                 for lhs, rhs in substitutions.items())
+        # The structure is calculated on a copy, so that the relaxation can
+        # still be generated
+        relaxation = copy.copy(self)
+        relaxation.verbose = 0
+        relaxation.level = level
+        relaxation.monomial_sets = []
+        relaxation.moment_substitutions = {}
+        relaxation.localizing_monomial_sets = localizing_monomials
+        relaxation.substitutions = {}
+        if substitutions is not None:
+            relaxation.substitutions = substitutions
+            for lhs, rhs in substitutions.items():
+                if iscomplex(lhs) or iscomplex(rhs):
+                    relaxation.complex_matrix = True
+        if chordal_extension:
+            relaxation.variables = find_variable_cliques(self.variables,
+                                                         objective,
+                                                         inequalities,
+                                                         equalities)
+        relaxation.__generate_monomial_sets(extramonomials)
+        relaxation._calculate_block_structure(inequalities, equalities,
+                                              bounds, momentinequalities,
+                                              momentequalities,
+                                              extramomentmatrices,
+                                              removeequalities)
+        relaxation._estimate_n_vars()
+        n_vars = relaxation.n_vars
+        if extramomentmatrices is not None:
+            for parameters in extramomentmatrices:
+                if "copy" in parameters:
+                    n_vars += n_vars + 1
+                else:
+                    n_vars += relaxation.block_struct[0] * \
+                        (relaxation.block_struct[0] + 1) // 2
+        # The number of terms of the constraints in the order of the
+        # localizing matrices
+        n_terms = [_count_terms(ineq, n_vars)
+                   for ineq in flatten([inequalities or []])]
+        if not removeequalities:
+            for eq in flatten([equalities or []]):
+                n_terms += 2 * [_count_terms(eq, n_vars)]
+        for ineq in flatten([bounds or [], momentinequalities or []]):
+            n_terms.append(_count_terms(ineq, n_vars))
+        for moment_eq in flatten([momentequalities or []]):
+            if check_simple_substitution(moment_eq) == (0, 0) and \
+                    not removeequalities:
+                n_terms += 2 * [_count_terms(moment_eq, n_vars)]
+        # Substitution rules with polynomials on the right-hand side turn the
+        # entries of the moment matrix into polynomials
+        n_substituted_terms = max([_count_terms(rhs, n_vars) for rhs in
+                                   relaxation.substitutions.values()] + [1])
+        block_struct = relaxation.block_struct
+        n_moment_blocks = len(block_struct) - len(n_terms)
+        nnz = 0
+        for k, block_size in enumerate(block_struct):
+            if block_size < 0:
+                nnz += -block_size
+            elif k < n_moment_blocks:
+                nnz += block_size * (block_size + 1) // 2 * \
+                    n_substituted_terms
+            else:
+                nnz += block_size * (block_size + 1) // 2 * \
+                    min(n_terms[k - n_moment_blocks] * n_substituted_terms,
+                        n_vars + 1)
+        complex_matrix = relaxation.complex_matrix
+        memory = estimate_solver_memory(block_struct, n_vars, nnz,
+                                        complex_matrix)
+        memory["build"] = estimate_build_memory(block_struct, n_vars, nnz)
+        return {"block_struct": block_struct,
+                "n_vars": n_vars,
+                "nnz": nnz,
+                "file_size": estimate_sdpa_file_size(block_struct, n_vars,
+                                                     nnz, complex_matrix),
+                "memory": memory}
+
+
+def _to_sympy(expr):
+    """Convert lightweight operators and polynomials to SymPy expressions,
+    descending into lists. Everything else is returned unchanged.
+    """
+    if isinstance(expr, (NCOperator, NCPolynomial)):
+        return expr._sympy_()
+    elif isinstance(expr, list):
+        return [_to_sympy(element) for element in expr]
+    return expr
+
+
+def _constraint_key(constraints):
+    """Return a string identifying a list of constraints. Coefficient arrays
+    are included in full, since the string representation of NumPy arrays
+    is truncated.
+    """
+    if constraints is None:
+        return str(constraints)
+    return str([(constraint[0].tobytes(), constraint[1].tobytes())
+                if isinstance(constraint, tuple) and
+                is_coefficient_array(constraint) else constraint
+                for constraint in flatten([constraints])])
+
+
+def _count_terms(constraint, n_vars):
+    """Return the number of terms of a constraint, which is at most the
+    number of variables of the SDP and the constant term.
+    """
+    if isinstance(constraint, str):
+        return n_vars + 1
+    elif is_number_type(constraint):
+        return 1
+    elif is_coefficient_array(constraint):
+        n_terms = len(get_coefficient_array(constraint)[0])
+    else:
+        if constraint.is_Relational:
+            constraint = convert_relational(constraint)
+        n_terms = len(Add.make_args(expand(constraint)))
+    return min(n_terms, n_vars + 1)
+
 
 def moment_of_entry(pos, monomials, ineq, substitutions):
     row = pos[0]
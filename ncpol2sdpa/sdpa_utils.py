@@ -7,11 +7,19 @@ Created on Fri May 16 13:52:58 2014
 @author: Peter Wittek
 """
 from bisect import bisect_left
-from subprocess import call
+from subprocess import Popen
 import tempfile
 import os
 import numpy as np
-from .nc_utils import convert_monomial_to_string
+try:
+    from subprocess import TimeoutExpired
+except ImportError:
+    # Python 2 cannot wait for a subprocess with a timeout
+    TimeoutExpired = None
+from .chunk_utils import get_first_row, get_row, get_rows
+from .nc_utils import convert_monomial_to_string, reverse_monomial_index
+from .resource_utils import get_cut_short_solution, get_preexec_function, \
+    split_limits
 
 
 def parse_solution_matrix(iterator):
@@ -35,6 +43,9 @@ def parse_solution_matrix(iterator):
             if row.find('}') != row.rfind('}') or not in_matrix:
                 break
             i += 1
+        if sol_mat is not None and not in_matrix:
+            # Diagonal blocks are written as a single row
+            sol_mat = np.diag(sol_mat[0])
         solution_matrix.append(sol_mat)
         if row.startswith('}'):
             break
@@ -122,52 +133,169 @@ def detect_sdpa(solverparameters):
     return which(solverexecutable)
 
 
-def solve_with_sdpa(sdpRelaxation, solverparameters=None):
-    """Helper function to write out the SDP problem to a temporary
-    file, call the solver, and parse the output.
+def prepare_sdpa_run(sdpRelaxation, solverparameters=None):
+    """Helper function to write out the SDP problem and the optional initial
+    point to temporary files, and assemble the command line of SDPA.
 
     :param sdpRelaxation: The SDP relaxation to be solved.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
     :param solverparameters: Optional parameters to SDPA.
     :type solverparameters: dict of str.
-    :returns: tuple of float and list -- the primal and dual solution of the
-              SDP, respectively, and a status string.
+    :returns: tuple of the command line, the name of the output file, and the
+              list of temporary files.
     """
     solverexecutable = detect_sdpa(solverparameters)
     if solverexecutable is None:
         raise OSError("SDPA is not in the path or the executable provided is" +
                       " not correct")
-    primal, dual = 0, 0
     tempfile_ = tempfile.NamedTemporaryFile()
     tmp_filename = tempfile_.name
     tempfile_.close()
     tmp_dats_filename = tmp_filename + ".dat-s"
     tmp_out_filename = tmp_filename + ".out"
+    tmp_filenames = [tmp_dats_filename, tmp_out_filename]
     write_to_sdpa(sdpRelaxation, tmp_dats_filename)
     command_line = [solverexecutable, "-ds", tmp_dats_filename,
                     "-o", tmp_out_filename]
     if solverparameters is not None:
         for key, value in list(solverparameters.items()):
-            if key == "executable":
+            if key in ("executable", "timeout", "memory_limit"):
                 continue
             elif key == "paramsfile":
                 command_line.extend(["-p", value])
+            elif key == "warm_start":
+                # The initial point is in the real embedding for complex
+                # SDPs, so it is only written for real ones
+                if value is None or sdpRelaxation.complex_matrix:
+                    continue
+                tmp_init_filename = tmp_filename + ".ini-s"
+                tmp_filenames.append(tmp_init_filename)
+                write_sdpa_initial_point(sdpRelaxation, value[0], value[1],
+                                         tmp_init_filename)
+                command_line.extend(["-is", tmp_init_filename])
             else:
                 raise Exception("Unknown parameter for SDPA: " + key)
-    if sdpRelaxation.verbose < 1:
-        with open(os.devnull, "w") as fnull:
-            call(command_line, stdout=fnull, stderr=fnull)
-    else:
-        call(command_line)
+    return command_line, tmp_out_filename, tmp_filenames
+
+
+def remove_sdpa_files(sdpRelaxation, tmp_filenames):
+    """Helper function to remove the temporary files of SDPA unless the
+    verbosity is at debug level.
+    """
+    if sdpRelaxation.verbose < 2:
+        for filename in tmp_filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+def parse_sdpa_run(sdpRelaxation, tmp_out_filename, tmp_filenames,
+                   returncode=0, memory_limit=None):
+    """Helper function to parse the output of SDPA and remove the temporary
+    files.
+
+    :param sdpRelaxation: The SDP relaxation that was solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param tmp_out_filename: The name of the output file.
+    :type tmp_out_filename: str.
+    :param tmp_filenames: The temporary files.
+    :type tmp_filenames: list of str.
+    :param returncode: The exit code of SDPA, which is negative if it was
+                       killed by a signal.
+    :type returncode: int.
+    :param memory_limit: The memory limit of SDPA in bytes if there was one.
+    :type memory_limit: int.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    if returncode < 0 and memory_limit is not None:
+        # SDPA is killed by a signal, for instance, when it aborts because an
+        # allocation fails under the memory limit
+        remove_sdpa_files(sdpRelaxation, tmp_filenames)
+        return get_cut_short_solution("memory limit")
+    elif returncode != 0:
+        remove_sdpa_files(sdpRelaxation, tmp_filenames)
+        raise Exception("SDPA terminated with return code %d." % returncode)
     primal, dual, x_mat, y_mat, status = read_sdpa_out(tmp_out_filename, True,
                                                        True)
-    if sdpRelaxation.verbose < 2:
-        os.remove(tmp_dats_filename)
-        os.remove(tmp_out_filename)
+    remove_sdpa_files(sdpRelaxation, tmp_filenames)
     return primal+sdpRelaxation.constant_term, \
         dual+sdpRelaxation.constant_term, x_mat, y_mat, status
 
 
+def solve_with_sdpa(sdpRelaxation, solverparameters=None):
+    """Helper function to write out the SDP problem to a temporary
+    file, call the solver, and parse the output.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solverparameters: Optional parameters to SDPA.
+    :type solverparameters: dict of str.
+    :returns: tuple of float and list -- the primal and dual solution of the
+              SDP, respectively, and a status string.
+    """
+    _, timeout, memory_limit = split_limits(solverparameters)
+    if timeout is not None and TimeoutExpired is None:
+        raise Exception("The timeout of SDPA requires Python 3.")
+    command_line, tmp_out_filename, tmp_filenames = \
+        prepare_sdpa_run(sdpRelaxation, solverparameters)
+    with open(os.devnull, "w") as fnull:
+        output = fnull if sdpRelaxation.verbose < 1 else None
+        process = Popen(command_line, stdout=output, stderr=output,
+                        preexec_fn=get_preexec_function(memory_limit))
+        if timeout is None:
+            process.wait()
+        else:
+            try:
+                process.wait(timeout)
+            except TimeoutExpired:
+                process.kill()
+                process.wait()
+                remove_sdpa_files(sdpRelaxation, tmp_filenames)
+                return get_cut_short_solution("timeout")
+    return parse_sdpa_run(sdpRelaxation, tmp_out_filename, tmp_filenames,
+                          process.returncode, memory_limit)
+
+
+def write_sdpa_initial_point(sdpRelaxation, x_mat, y_mat, filename,
+                             margin=1e-1):
+    """Write the solution of a previous solve as an initial point of SDPA in
+    the sparse format. The matrices are shifted to the interior of the cone,
+    since SDPA needs positive definite starting matrices. Missing matrices
+    are replaced by identity matrices.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param x_mat: The primal solution matrices.
+    :type x_mat: list of :class:`numpy.array`.
+    :param y_mat: The dual solution matrices.
+    :type y_mat: list of :class:`numpy.array`.
+    :param filename: The name of the file.
+    :type filename: str.
+    :param margin: The smallest eigenvalue of the starting point.
+    :type margin: float.
+    """
+    from .admm_utils import fit_variables, shift_to_interior
+    block_struct = sdpRelaxation.block_struct
+    if x_mat is None:
+        x_vec = np.zeros(sdpRelaxation.n_vars)
+    else:
+        x_vec = fit_variables(sdpRelaxation, x_mat)
+    file_ = open(filename, 'w')
+    file_.write('{' + ', '.join(str(value) for value in x_vec) + '}\n')
+    for target, blocks in ((1, x_mat), (2, y_mat)):
+        if blocks is None:
+            blocks = [np.eye(abs(block_size)) for block_size in block_struct]
+        blocks = shift_to_interior(blocks, block_struct, margin)
+        for block_index, block in enumerate(blocks):
+            i, j = np.triu_indices(block.shape[0])
+            keep = block[i, j] != 0
+            for row, column in zip(i[keep], j[keep]):
+                file_.write('{0}\t{1}\t{2}\t{3}\t{4}\n'.format(
+                    target, block_index + 1, row + 1, column + 1,
+                    block[row, column]))
+    file_.close()
+
+
 def convert_row_to_sdpa_index(block_struct, row_offsets, row):
     """Helper function to map to sparse SDPA index values.
     """
@@ -178,8 +306,137 @@ def convert_row_to_sdpa_index(block_struct, row_offsets, row):
     return block_index, i, j
 
 
+def convert_rows_to_sdpa_indices(block_struct, row_offsets, rows):
+    """Vectorised version of `convert_row_to_sdpa_index` that maps an array
+    of rows to arrays of block indices and positions within the blocks.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    block_index = np.searchsorted(np.asarray(row_offsets[1:]), rows + 1)
+    widths = np.asarray(block_struct, dtype=np.int64)[block_index]
+    i, j = np.divmod(rows - np.asarray(row_offsets)[block_index], widths)
+    return block_index, i, j
+
+
+def convert_to_coo_arrays(F_struct, F_chunks=None):
+    """Return the row indices, column indices and values of the nonzero
+    elements of a lil_matrix as NumPy arrays sorted by the rows. If the
+    finished blocks were moved out of the lil_matrix, their chunks are
+    included.
+    """
+    first_row = get_first_row(F_chunks)
+    rows, columns, values = get_rows(F_struct, F_chunks, first_row,
+                                     first_row + F_struct.shape[0])
+    if F_chunks is not None and F_chunks.nnz > 0:
+        chunks = list(F_chunks) + [(rows, columns, values)]
+        # The rows of the chunks precede the rows left in the lil_matrix
+        rows, columns, values = [np.concatenate([chunk[k] for chunk in chunks])
+                                 for k in range(3)]
+    return rows, columns, values
+
+
+def get_row_offsets(block_struct):
+    """Return the first row of each block in `F_struct`, followed by the
+    total number of rows.
+
+    :param block_struct: The block structure of the SDP.
+    :type block_struct: list of int.
+    :returns: list of int.
+    """
+    row_offsets = [0]
+    for block_size in block_struct:
+        row_offsets.append(row_offsets[-1] + block_size ** 2)
+    return row_offsets
+
+
+def convert_to_block_coo_arrays(sdpRelaxation):
+    """Return the nonzero elements of the SDP relaxation sorted by the rows
+    of `F_struct`, together with their positions in the blocks. The columns
+    beyond the SDP variables are dropped. The elements of diagonal blocks
+    are in the first row of their block.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :returns: tuple of :class:`numpy.array` of the row indices, column
+              indices, values, block indices, and the row and column indices
+              within the blocks.
+    """
+    block_struct = sdpRelaxation.block_struct
+    rows, columns, values = convert_to_coo_arrays(sdpRelaxation.F_struct,
+                                                  sdpRelaxation.F_chunks)
+    keep = columns <= sdpRelaxation.n_vars
+    rows, columns, values = rows[keep], columns[keep], values[keep]
+    block_index, i, j = \
+        convert_rows_to_sdpa_indices(np.abs(block_struct),
+                                     get_row_offsets(block_struct), rows)
+    return rows, columns, values, block_index, i, j
+
+
+def get_block_layout(block_struct):
+    """Map the blocks of the SDP to the variables of a solver. Every block
+    larger than 1x1 becomes a semidefinite variable of its own, whereas 1x1
+    blocks and the elements of diagonal blocks become nonnegative linear
+    variables.
+
+    :returns: tuple of the dimensions of the semidefinite variables, the
+              number of linear variables, and for each block the index of its
+              semidefinite variable or its first linear variable.
+    """
+    bar_dims, n_linear, offsets = [], 0, []
+    for block_size in block_struct:
+        if block_size > 1:
+            offsets.append(len(bar_dims))
+            bar_dims.append(block_size)
+        else:
+            offsets.append(n_linear)
+            n_linear += abs(block_size)
+    return bar_dims, n_linear, offsets
+
+
+def _get_sdpa_lines(sdpRelaxation, row_offsets, rows, columns, values):
+    """Return the lines of the sparse SDPA format of row-sorted nonzero
+    elements of the SDP, ordered by the coefficient matrices. Complex
+    blocks are written in their real embedding.
+    """
+    n_vars = sdpRelaxation.n_vars
+    block_index, i, j = \
+        convert_rows_to_sdpa_indices(sdpRelaxation.block_struct, row_offsets,
+                                     rows)
+    values = np.where(columns == 0, -values, values)
+    if not np.iscomplexobj(values):
+        order = np.argsort(columns, kind="mergesort")
+        entries = [(columns[order], block_index[order], i[order], j[order],
+                    values[order])]
+    else:
+        bs = np.asarray(sdpRelaxation.block_struct)[block_index]
+        real, imag = values.real != 0, values.imag != 0
+        # Every element turns into a pair of elements in the real part and
+        # in the imaginary part, which follow each other in the order of
+        # the rows
+        parts = [(real, columns, i, j, values.real),
+                 (real, columns, i + bs, j + bs, values.real),
+                 (imag, columns + n_vars, i, j + bs, values.imag),
+                 (imag, columns + n_vars, j, i + bs, -values.imag)]
+        keys = [np.concatenate([part[0].nonzero()[0] for part in parts]),
+                np.repeat(np.arange(len(parts)),
+                          [part[0].sum() for part in parts])]
+        entries = [np.concatenate([part[k][part[0]] for part in parts])
+                   for k in range(1, 5)]
+        order = np.lexsort((keys[1], keys[0], entries[0]))
+        entries = [(entries[0][order], block_index[keys[0][order]],
+                    entries[1][order], entries[2][order], entries[3][order])]
+    for matno, block, row, column, value in entries:
+        for line in zip(matno.tolist(), (block + 1).tolist(),
+                        (row + 1).tolist(), (column + 1).tolist(),
+                        value.tolist()):
+            yield '{0}\t{1}\t{2}\t{3}\t{4}\n'.format(*line)
+
+
 def write_to_sdpa(sdpRelaxation, filename):
-    """Write the SDP relaxation to SDPA format.
+    """Write the SDP relaxation to SDPA format. The lines of the coefficient
+    matrices are ordered by the SDP variables, except in the out-of-core
+    mode, where they are ordered by the SDP variables within each chunk of
+    rows. The sparse SDPA format does not require an order, so the files
+    describe the same problem.
 
     :param sdpRelaxation: The SDP relaxation to write.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
@@ -187,45 +444,20 @@ def write_to_sdpa(sdpRelaxation, filename):
     :type filename: str.
     """
     # Coefficient matrices
-    row_offsets = [0]
-    cumulative_sum = 0
-    for block_size in sdpRelaxation.block_struct:
-        cumulative_sum += block_size ** 2
-        row_offsets.append(cumulative_sum)
+    row_offsets = get_row_offsets(sdpRelaxation.block_struct)
     multiplier = 1
     if sdpRelaxation.F_struct.dtype == np.complex128:
         multiplier = 2
-    lines = [[] for _ in range(multiplier*sdpRelaxation.n_vars+1)]
-    for row in range(len(sdpRelaxation.F_struct.rows)):
-        if len(sdpRelaxation.F_struct.rows[row]) > 0:
-            col_index = 0
-            for k in sdpRelaxation.F_struct.rows[row]:
-                value = sdpRelaxation.F_struct.data[row][col_index]
-                col_index += 1
-                block_index, i, j = convert_row_to_sdpa_index(
-                    sdpRelaxation.block_struct, row_offsets, row)
-                if k == 0:
-                    value *= -1
-                if sdpRelaxation.F_struct.dtype == np.float64:
-                    lines[k].append('{0}\t{1}\t{2}\t{3}\n'.format(
-                        block_index + 1, i + 1, j + 1, value))
-                else:
-                    bs = sdpRelaxation.block_struct[block_index]
-                    if value.real != 0:
-                        lines[k].append('{0}\t{1}\t{2}\t{3}\n'.format(
-                            block_index + 1, i + 1, j + 1, value.real))
-                        lines[k].append('{0}\t{1}\t{2}\t{3}\n'.format(
-                            block_index + 1, i + bs + 1, j + bs + 1,
-                            value.real))
-                    if value.imag != 0:
-                        lines[k + sdpRelaxation.n_vars].append(
-                            '{0}\t{1}\t{2}\t{3}\n'.format(
-                                block_index + 1, i + 1, j + bs + 1,
-                                value.imag))
-                        lines[k + sdpRelaxation.n_vars].append(
-                            '{0}\t{1}\t{2}\t{3}\n'.format(
-                                block_index + 1, j + 1, i + bs + 1,
-                                -value.imag))
+    # The chunks of the out-of-core mode are written one by one, followed by
+    # the rows that are in memory, so the lines are ordered by the
+    # coefficient matrices within each chunk only
+    sources = []
+    if sdpRelaxation.F_chunks is not None:
+        sources.extend(sdpRelaxation.F_chunks)
+    first_row = get_first_row(sdpRelaxation.F_chunks)
+    sources.append(get_rows(sdpRelaxation.F_struct, sdpRelaxation.F_chunks,
+                            first_row,
+                            first_row + sdpRelaxation.F_struct.shape[0]))
     file_ = open(filename, 'w')
     file_.write('"file ' + filename + ' generated by ncpol2sdpa"\n')
     file_.write(str(multiplier*sdpRelaxation.n_vars) + ' = number of vars\n')
@@ -242,95 +474,109 @@ def write_to_sdpa(sdpRelaxation, filename):
     if multiplier == 2:
         objective += ', ' + objective
     file_.write('{'+objective+'}\n')
-    for k, line in enumerate(lines):
-        if line == []:
-            continue
-        for item in line:
-            file_.write('{0}\t'.format(k)+item)
+    for rows, columns, values in sources:
+        file_.write(''.join(_get_sdpa_lines(sdpRelaxation, row_offsets, rows,
+                                            columns, values)))
     file_.close()
 
 
-def convert_to_human_readable(sdpRelaxation):
-    """Convert the SDP relaxation to a human-readable format.
-
-    :param sdpRelaxation: The SDP relaxation to write.
-    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
-    :returns: tuple of the objective function in a string and a matrix of
-              strings as the symbolic representation of the moment matrix
+def _get_monomial_strings(monomial_index):
+    """Return a function that maps SDP variables to the string of the first
+    monomial in the monomial index, or to an empty string. The strings are
+    memoized.
     """
+    get_monomial = reverse_monomial_index(monomial_index)
+    strings = {}
+
+    def get_string(k):
+        try:
+            return strings[k]
+        except KeyError:
+            monomial = get_monomial(k)
+            if monomial is None:
+                strings[k] = ""
+            else:
+                strings[k] = convert_monomial_to_string(monomial)
+            return strings[k]
+    return get_string
+
 
+def _convert_objective_to_human_readable(sdpRelaxation, get_string):
     objective = ""
-    indices_in_objective = []
     for i, tmp in enumerate(sdpRelaxation.obj_facvar):
-        candidates = [key for key, v in
-                      sdpRelaxation.monomial_index.items() if v == i+1]
-        if len(candidates) > 0:
-            monomial = convert_monomial_to_string(candidates[0])
-        else:
-            monomial = ""
         if tmp > 0:
-            objective += "+"+str(tmp)+monomial
-            indices_in_objective.append(i)
+            objective += "+"+str(tmp)+get_string(i+1)
         elif tmp < 0:
-            objective += str(tmp)+monomial
-            indices_in_objective.append(i)
+            objective += str(tmp)+get_string(i+1)
+    return objective
 
-    matrix_size = 0
-    cumulative_sum = 0
-    row_offsets = [0]
-    block_offset = [0]
+
+def _generate_human_readable_lines(sdpRelaxation, get_string):
+    """Generate the lines of the symbolic representation of the moment
+    matrix one by one, so that the dense matrix of strings is never stored.
+    Each line has the length of the total size of the blocks.
+    """
+    matrix_size = sum(abs(bs) for bs in sdpRelaxation.block_struct)
+    F_struct = sdpRelaxation.F_struct
+    row_offset, offset = 0, 0
     for bs in sdpRelaxation.block_struct:
-        matrix_size += abs(bs)
-        cumulative_sum += bs ** 2
-        row_offsets.append(cumulative_sum)
-        block_offset.append(matrix_size)
-
-    matrix = []
-    for i in range(matrix_size):
-        matrix_line = ["0"] * matrix_size
-        matrix.append(matrix_line)
-
-    for row in range(len(sdpRelaxation.F_struct.rows)):
-        if len(sdpRelaxation.F_struct.rows[row]) > 0:
-            col_index = 0
-            for k in sdpRelaxation.F_struct.rows[row]:
-                value = sdpRelaxation.F_struct.data[row][col_index]
-                col_index += 1
-                block_index, i, j = convert_row_to_sdpa_index(
-                    sdpRelaxation.block_struct, row_offsets, row)
-                candidates = [key for key, v in
-                              sdpRelaxation.monomial_index.items()
-                              if v == k]
-                if len(candidates) > 0:
-                    monomial = convert_monomial_to_string(candidates[0])
-                else:
-                    monomial = ""
-                offset = block_offset[block_index]
-                if matrix[offset+i][offset+j] == "0":
-                    matrix[offset+i][offset+j] = ("%s%s" % (value, monomial))
-                else:
-                    if value.real > 0:
-                        matrix[offset+i][offset+j] += ("+%s%s" % (value,
-                                                                  monomial))
+        width = abs(bs)
+        for i in range(width):
+            matrix_line = ["0"] * matrix_size
+            # Diagonal blocks store the diagonal elements consecutively
+            if bs < 0:
+                entries = [(row_offset + i, i)]
+            else:
+                entries = [(row_offset + i*width + j, j)
+                           for j in range(width)]
+            for row, j in entries:
+                entry = "0"
+                for k, value in zip(*get_row(F_struct,
+                                             sdpRelaxation.F_chunks, row)):
+                    if entry == "0":
+                        entry = "%s%s" % (value, get_string(k))
+                    elif value.real > 0:
+                        entry += "+%s%s" % (value, get_string(k))
                     else:
-                        matrix[offset+i][offset+j] += ("%s%s" % (value,
-                                                                 monomial))
+                        entry += "%s%s" % (value, get_string(k))
+                matrix_line[offset + j] = entry
+            yield matrix_line
+        row_offset += bs ** 2
+        offset += width
+
+
+def convert_to_human_readable(sdpRelaxation):
+    """Convert the SDP relaxation to a human-readable format.
+
+    :param sdpRelaxation: The SDP relaxation to write.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :returns: tuple of the objective function in a string and a matrix of
+              strings as the symbolic representation of the moment matrix
+    """
+    get_string = _get_monomial_strings(sdpRelaxation.monomial_index)
+    objective = _convert_objective_to_human_readable(sdpRelaxation,
+                                                     get_string)
+    matrix = list(_generate_human_readable_lines(sdpRelaxation, get_string))
     return objective, matrix
 
 
 def write_to_human_readable(sdpRelaxation, filename):
-    """Write the SDP relaxation to a human-readable format.
+    """Write the SDP relaxation to a human-readable format. The lines of the
+    matrix are written as they are generated.
 
     :param sdpRelaxation: The SDP relaxation to write.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
     :param filename: The name of the file.
     :type filename: str.
     """
-    objective, matrix = convert_to_human_readable(sdpRelaxation)
+    get_string = _get_monomial_strings(sdpRelaxation.monomial_index)
     f = open(filename, 'w')
-    f.write("Objective:" + objective + "\n")
-    for matrix_line in matrix:
-        f.write(str(list(matrix_line)).replace('[', '').replace(']', '')
+    f.write("Objective:" +
+            _convert_objective_to_human_readable(sdpRelaxation, get_string) +
+            "\n")
+    for matrix_line in _generate_human_readable_lines(sdpRelaxation,
+                                                      get_string):
+        f.write(", ".join(matrix_line).replace('[', '').replace(']', '')
                 .replace('\'', ''))
         f.write('\n')
     f.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+The module contains the container of the solution matrices of an SDP that
+keeps the blocks in a memory-mapped NPY file.
+
+Created on Sun Oct 18 21:14:37 2026
+
+@author: Peter Wittek
+"""
+import os
+import tempfile
+import numpy as np
+
+
+class Solution(object):
+    """Sequence of the blocks of a primal or dual solution of the SDP stored
+    in a memory-mapped NPY file. The blocks are only read when they are
+    accessed, so the solution can be indexed and iterated over like a list
+    of arrays, but it does not have to fit in memory.
+
+    :param blocks: The solution matrices.
+    :type blocks: list of :class:`numpy.array`.
+    :param block_struct: Optional parameter providing the block structure of
+                         the SDP. The blocks with a negative size are
+                         diagonal, and only their diagonal is stored.
+    :type block_struct: list of int.
+    :param filename: Optional parameter for specifying the NPY file. If it is
+                     not provided, a temporary file is used, which is removed
+                     when it is no longer needed.
+    :type filename: str.
+    :param packed: Optional parameter to store only the upper triangle of the
+                   blocks, which are assumed to be symmetric or Hermitian.
+    :type packed: bool.
+    """
+
+    def __init__(self, blocks, block_struct=None, filename=None,
+                 packed=False):
+        if block_struct is None or len(block_struct) != len(blocks):
+            block_struct = [np.shape(block)[0] for block in blocks]
+        self.packed = packed
+        self.kinds = []
+        self.widths = []
+        self.offsets = [0]
+        for block, block_size in zip(blocks, block_struct):
+            width = np.shape(block)[0]
+            if block_size < 0:
+                kind, length = "diagonal", width
+            elif packed:
+                kind, length = "packed", width * (width + 1) // 2
+            else:
+                kind, length = "full", width ** 2
+            self.kinds.append(kind)
+            self.widths.append(width)
+            self.offsets.append(self.offsets[-1] + length)
+        dtype = np.result_type(np.float64, *blocks)
+        temporary = filename is None
+        if temporary:
+            handle, filename = tempfile.mkstemp(suffix=".npy")
+            os.close(handle)
+        self.filename = filename
+        self._data = np.lib.format.open_memmap(filename, mode="w+",
+                                               dtype=dtype,
+                                               shape=(self.offsets[-1],))
+        for k, block in enumerate(blocks):
+            self._data[self.offsets[k]:self.offsets[k + 1]] = \
+                self._pack_block(k, np.asarray(block))
+        self._data.flush()
+        self._remove_file = False
+        if temporary:
+            # The mapping remains valid after the file is unlinked on POSIX
+            # systems; elsewhere the file is removed with the object
+            try:
+                os.remove(filename)
+            except OSError:
+                self._remove_file = True
+
+    def __len__(self):
+        return len(self.widths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[k] for k in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Block index out of range.")
+        return self._unpack_block(index)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self._unpack_block(k)
+
+    def __del__(self):
+        data = getattr(self, "_data", None)
+        if data is not None:
+            del self._data
+            if self._remove_file:
+                try:
+                    os.remove(self.filename)
+                except OSError:
+                    pass
+
+    def _pack_block(self, k, block):
+        if self.kinds[k] == "diagonal":
+            return np.diag(block)
+        elif self.kinds[k] == "packed":
+            return block[np.triu_indices(self.widths[k])]
+        return block.ravel()
+
+    def _unpack_block(self, k):
+        segment = self._data[self.offsets[k]:self.offsets[k + 1]]
+        width = self.widths[k]
+        if self.kinds[k] == "diagonal":
+            return np.diag(segment)
+        elif self.kinds[k] == "packed":
+            block = np.zeros((width, width), dtype=segment.dtype)
+            block[np.triu_indices(width)] = segment
+            return block + np.triu(block, 1).conj().T
+        return segment.reshape((width, width))
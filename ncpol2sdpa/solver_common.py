@@ -6,17 +6,16 @@ Created on Fri May 22 18:05:24 2015
 """
 import time
 import numpy as np
-from sympy import expand
-try:
-    from scipy.sparse import lil_matrix
-except ImportError:
-    from .sparse_utils import lil_matrix
+from sympy import Add, expand
 from .nc_utils import pick_monomials_up_to_degree, simplify_polynomial, \
                       apply_substitutions, separate_scalar_factor, \
-                      is_number_type
-from .sdpa_utils import solve_with_sdpa, convert_row_to_sdpa_index, detect_sdpa
+                      is_number_type, flatten
+from .sdpa_utils import solve_with_sdpa, convert_to_block_coo_arrays, \
+    detect_sdpa, get_row_offsets
 from .mosek_utils import solve_with_mosek
-from .picos_utils import solve_with_cvxopt
+from .cvxopt_utils import solve_with_cvxopt
+from .admm_utils import solve_with_admm
+from .solution import Solution
 
 
 def autodetect_solvers(solverparameters):
@@ -30,15 +29,36 @@ def autodetect_solvers(solverparameters):
     else:
         solvers.append("mosek")
     try:
-        import picos
+        import cvxopt
     except ImportError:
         pass
     else:
         solvers.append("cvxopt")
+    # The built-in first-order solver is always available as a fallback
+    solvers.append("admm")
     return solvers
 
 
-def solve_sdp(sdpRelaxation, solver=None, solverparameters=None):
+def _is_warm_start_possible(sdpRelaxation):
+    """Check whether the current solution of the relaxation matches its block
+    structure, so that it can be the starting point of the next solve.
+    """
+    if sdpRelaxation.x_mat is None or sdpRelaxation.complex_matrix:
+        return False
+    block_struct = sdpRelaxation.block_struct
+    for blocks in (sdpRelaxation.x_mat, sdpRelaxation.y_mat):
+        if blocks is None:
+            continue
+        if len(blocks) != len(block_struct):
+            return False
+        for block, block_size in zip(blocks, block_struct):
+            if np.shape(block) != (abs(block_size), abs(block_size)):
+                return False
+    return True
+
+
+def solve_sdp(sdpRelaxation, solver=None, solverparameters=None,
+              warm_start=False, storage=None):
     """Call a solver on the SDP relaxation. Upon successful solution, it
     returns the primal and dual objective values along with the solution
     matrices. It also sets these values in the `sdpRelaxation` object, along
@@ -46,8 +66,9 @@ def solve_sdp(sdpRelaxation, solver=None, solverparameters=None):
 
     :param sdpRelaxation: The SDP relaxation to be solved.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
-    :param solver: The solver to be called, either `None`, "sdpa", "mosek", or
-                   "cvxopt". The default is `None`, which triggers autodetect.
+    :param solver: The solver to be called, either `None`, "sdpa", "mosek",
+                   "cvxopt", or "admm". The default is `None`, which triggers
+                   autodetect.
     :type solver: str.
     :param solverparameters: Parameters to be passed to the solver. Actual
                              options depend on the solver:
@@ -65,45 +86,130 @@ def solve_sdp(sdpRelaxation, solver=None, solverparameters=None):
                              are passed on.
 
                              Cvxopt:
-                             Refer to the PICOS documentation. All arguments
-                             are passed on.
+                             Refer to the CVXOPT documentation. All arguments
+                             are passed on as options of
+                             `cvxopt.solvers.sdp`.
+
+                             Admm:
+                             The built-in first-order solver. Refer to
+                             :func:`ncpol2sdpa.admm_utils.solve_with_admm`
+                             for the options.
+
+                             The parameter `"warm_start"` is a tuple of
+                             the primal and dual solution matrices of a
+                             previous solve, which is used as the starting
+                             point by SDPA, Cvxopt and Admm. It is ignored
+                             by Mosek.
+
+                             The parameters `"timeout"` and
+                             `"memory_limit"` limit the wall-clock time in
+                             seconds and the address space in bytes of the
+                             solver process, which includes the Python
+                             interpreter for the solvers that run in a forked
+                             process. A solve that is cut short has the
+                             status "timeout" or "memory limit". SDPA runs as
+                             a subprocess that is killed at the limits, Mosek
+                             gets its time limit, Cvxopt runs in a forked
+                             process, and Admm checks the time limit in its
+                             iterations.
     :type solverparameters: dict of str.
+    :param warm_start: Optional parameter to start from the current solution
+                       of the relaxation if it is solved. It is useful if only
+                       the objective function changed since the last solve.
+    :type warm_start: bool.
+    :param storage: Optional parameter to keep the solution matrices in a
+                    memory-mapped file: "memmap" stores the blocks in full,
+                    and "packed" stores the upper triangles. The blocks are
+                    read on access. The default is `None`, which keeps them
+                    as a list of arrays in memory.
+    :type storage: str.
     :returns: tuple of the primal and dual optimum, and the solutions for the
               primal and dual.
     :rtype: (float, float, list of `numpy.array`, list of `numpy.array`)
     """
+    check_storage(storage)
+    solver, solverparameters = select_solver(sdpRelaxation, solver,
+                                             solverparameters, warm_start)
+    tstart = time.time()
+    solution = get_solver_function(solver)(sdpRelaxation, solverparameters)
+    return store_solution(sdpRelaxation, solution, time.time() - tstart,
+                          storage)
+
+
+def select_solver(sdpRelaxation, solver=None, solverparameters=None,
+                  warm_start=False):
+    """Pick the solver for the SDP relaxation and add the current solution to
+    the parameters if a warm start is requested. The arguments are the same
+    as in :func:`solve_sdp`.
+
+    :returns: tuple of the name of the solver and the solver parameters.
+    """
     solvers = autodetect_solvers(solverparameters)
     solver = solver.lower() if solver is not None else solver
     if solvers == []:
         raise Exception("Could not find any SDP solver. Please install SDPA," +
-                        " Mosek, or Picos with Cvxopt")
+                        " Mosek, or Cvxopt")
     elif solver is not None and solver not in solvers:
         print("Available solvers: " + str(solvers))
-        if solver == "cvxopt":
-            try:
-                import cvxopt
-            except ImportError:
-                pass
-            else:
-                raise Exception("Cvxopt is detected, but Picos is not. "
-                                "Please install Picos to use Cvxopt")
         raise Exception("Could not detect requested " + solver)
     elif solver is None:
         solver = solvers[0]
-    primal, dual, x_mat, y_mat, status = None, None, None, None, None
-    tstart = time.time()
+    if warm_start and _is_warm_start_possible(sdpRelaxation):
+        solverparameters = dict(solverparameters or {})
+        solverparameters.setdefault("warm_start", (sdpRelaxation.x_mat,
+                                                   sdpRelaxation.y_mat))
+    return solver, solverparameters
+
+
+def check_storage(storage):
+    """Check the type of storage of the solution matrices before solving.
+    """
+    if storage not in (None, "memmap", "packed"):
+        raise Exception("Unknown storage of the solution: " + str(storage))
+
+
+def get_solver_function(solver):
+    """Return the helper function that solves the SDP relaxation with the
+    given solver.
+    """
     if solver == "sdpa":
-        primal, dual, x_mat, y_mat, status = \
-          solve_with_sdpa(sdpRelaxation, solverparameters)
+        return solve_with_sdpa
     elif solver == "mosek":
-        primal, dual, x_mat, y_mat, status = \
-          solve_with_mosek(sdpRelaxation, solverparameters)
+        return solve_with_mosek
     elif solver == "cvxopt":
-        primal, dual, x_mat, y_mat, status = \
-          solve_with_cvxopt(sdpRelaxation, solverparameters)
+        return solve_with_cvxopt
+    elif solver == "admm":
+        return solve_with_admm
     else:
         raise Exception("Unkown solver: " + solver)
-    sdpRelaxation.solution_time = time.time() - tstart
+
+
+def store_solution(sdpRelaxation, solution, solution_time, storage=None):
+    """Set the solution returned by a solver in the SDP relaxation.
+
+    :param sdpRelaxation: The SDP relaxation that was solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param solution: The primal and dual optimum, the solutions for the
+                     primal and dual, and the status.
+    :type solution: tuple.
+    :param solution_time: The time spent in the solver.
+    :type solution_time: float.
+    :param storage: Optional parameter to move the solution matrices to a
+                    memory-mapped file, either "memmap" or "packed".
+    :type storage: str.
+    :returns: tuple of the primal and dual optimum, and the solutions for the
+              primal and dual.
+    """
+    primal, dual, x_mat, y_mat, status = solution
+    if storage is not None:
+        check_storage(storage)
+        if x_mat is not None:
+            x_mat = Solution(x_mat, sdpRelaxation.block_struct,
+                             packed=storage == "packed")
+        if y_mat is not None:
+            y_mat = Solution(y_mat, sdpRelaxation.block_struct,
+                             packed=storage == "packed")
+    sdpRelaxation.solution_time = solution_time
     sdpRelaxation.primal = primal
     sdpRelaxation.dual = dual
     sdpRelaxation.x_mat = x_mat
@@ -112,7 +218,52 @@ def solve_sdp(sdpRelaxation, solver=None, solverparameters=None):
     return primal, dual, x_mat, y_mat
 
 
-def find_solution_ranks(sdpRelaxation, xmat=None, baselevel=0):
+def get_nested_ranks(matrix, tolerance=1e-6):
+    """Return the ranks of all leading principal submatrices of a positive
+    semidefinite matrix in a single Cholesky factorisation in the natural
+    order. A column that is numerically dependent on the previous ones is
+    skipped, so the ranks are read off incrementally.
+
+    :param matrix: The positive semidefinite matrix.
+    :type matrix: :class:`numpy.array`.
+    :param tolerance: Optional parameter for specifying the threshold of
+                      the squared residual of a column relative to the
+                      largest diagonal element, below which the column is
+                      dependent.
+    :type tolerance: float.
+    :returns: tuple of :class:`numpy.array` of the ranks of the leading
+              submatrices of size 1, 2, ..., n, and the list of the
+              independent columns.
+    """
+    matrix = np.asarray(matrix)
+    size = matrix.shape[0]
+    threshold = tolerance * max(np.max(np.abs(np.diag(matrix))), 1.0)
+    factor = np.zeros((size, size), dtype=matrix.dtype)
+    ranks = np.zeros(size, dtype=int)
+    pivots = []
+    for k in range(size):
+        rank = len(pivots)
+        residual = matrix[k, k].real - \
+            np.sum(np.abs(factor[k, :rank]) ** 2)
+        if residual > threshold:
+            factor[:, rank] = (matrix[:, k] - factor[:, :rank].dot(
+                factor[k, :rank].conj())) / np.sqrt(residual)
+            pivots.append(k)
+        ranks[k] = len(pivots)
+    return ranks, pivots
+
+
+def _get_moment_block(sdpRelaxation, xmat):
+    if xmat is None:
+        if sdpRelaxation.status == "unsolved":
+            raise Exception("The SDP relaxation is unsolved and no primal " +
+                            "solution is provided!")
+        xmat = sdpRelaxation.x_mat[0]
+    return np.asarray(xmat)
+
+
+def find_solution_ranks(sdpRelaxation, xmat=None, baselevel=0,
+                        tolerance=1e-6):
     """Helper function to detect rank loop in the solution matrix.
 
     :param sdpRelaxation: The SDP relaxation.
@@ -125,20 +276,16 @@ def find_solution_ranks(sdpRelaxation, xmat=None, baselevel=0):
                        relaxation for which the rank loop should be tested
                        against.
     :type base_level: int.
+    :param tolerance: Optional parameter for specifying the relative
+                      threshold of the rank, as in
+                      :func:`ncpol2sdpa.solver_common.get_nested_ranks`.
+    :type tolerance: float.
     :returns: list of int -- the ranks of the solution matrix with in the
               order of increasing degree.
     """
-    if sdpRelaxation.status == "unsolved" and xmat is None:
-        raise Exception("The SDP relaxation is unsolved and no primal " +
-                        "solution is provided!")
-    elif sdpRelaxation.status != "unsolved" and xmat is None:
-        xmat = sdpRelaxation.x_mat[0]
-    else:
-        xmat = sdpRelaxation.x_mat[0]
-    if sdpRelaxation.status == "unsolved":
-        raise Exception("The SDP relaxation is unsolved!")
+    xmat = _get_moment_block(sdpRelaxation, xmat)
+    nested_ranks, _ = get_nested_ranks(xmat, tolerance)
     ranks = []
-    from numpy.linalg import matrix_rank
     if baselevel == 0:
         levels = range(1, sdpRelaxation.level + 1)
     else:
@@ -146,16 +293,189 @@ def find_solution_ranks(sdpRelaxation, xmat=None, baselevel=0):
     for level in levels:
         base_monomials = \
           pick_monomials_up_to_degree(sdpRelaxation.monomial_sets[0], level)
-        ranks.append(matrix_rank(xmat[:len(base_monomials),
-                                      :len(base_monomials)]))
+        ranks.append(int(nested_ranks[len(base_monomials) - 1]))
     if xmat.shape != (len(base_monomials), len(base_monomials)):
-        ranks.append(matrix_rank(xmat))
+        ranks.append(int(nested_ranks[-1]))
     return ranks
 
 
-def get_sos_decomposition(sdpRelaxation, y_mat=None, threshold=0.0):
-    """Given a solution of the dual problem, it returns the SOS
-    decomposition.
+def extract_optimizers(sdpRelaxation, xmat=None, tolerance=1e-6):
+    """Extract the optimal operators by the GNS construction if the solution
+    of the moment matrix is a flat extension, that is, the rank does not
+    increase from the monomials of degree `level-1` to the monomials of
+    degree `level`. The operators act on a space of the dimension of the
+    rank, and the moments are reproduced in a state vector.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param x_mat: Optional parameter providing the primal solution of the
+                  moment matrix. If not provided, the solution is extracted
+                  from the sdpRelaxation object.
+    :type x_mat: :class:`numpy.array`.
+    :param tolerance: Optional parameter for specifying the relative
+                      threshold of the rank, as in
+                      :func:`ncpol2sdpa.solver_common.get_nested_ranks`.
+    :type tolerance: float.
+    :returns: tuple of a dict of the variables to their matrices, and the
+              state vector.
+    """
+    if len(sdpRelaxation.monomial_sets) != 1:
+        raise Exception("Cannot automatically match primal variables.")
+    if xmat is None:
+        x_mat = sdpRelaxation.x_mat
+    else:
+        x_mat = [xmat]
+    xmat = _get_moment_block(sdpRelaxation, xmat)
+    n_full = len(pick_monomials_up_to_degree(sdpRelaxation.monomial_sets[0],
+                                             sdpRelaxation.level))
+    n_base = len(pick_monomials_up_to_degree(sdpRelaxation.monomial_sets[0],
+                                             sdpRelaxation.level - 1))
+    nested_ranks, pivots = get_nested_ranks(xmat[:n_full, :n_full],
+                                            tolerance)
+    if nested_ranks[n_base - 1] != nested_ranks[-1]:
+        raise Exception("The solution is not a flat extension: the rank " +
+                        "increases from " + str(nested_ranks[n_base - 1]) +
+                        " to " + str(nested_ranks[-1]) + ".")
+    basis = [sdpRelaxation.monomial_sets[0][k] for k in pivots]
+    if not pivots or pivots[0] != 0:
+        raise Exception("The moment of the identity vanishes.")
+    gram = xmat[np.ix_(pivots, pivots)]
+    # The vectors of the basis monomials are the columns of R, G = R^* R
+    cholesky = np.linalg.cholesky(gram).conj().T
+    operators = {}
+    for variable in flatten(sdpRelaxation.variables):
+        products = np.array([[get_xmat_value(row.adjoint() * variable *
+                                             column, sdpRelaxation, x_mat)
+                              for column in basis] for row in basis])
+        # R^* X R = A, that is, X = R^-* A R^-1
+        right = np.linalg.solve(cholesky.conj().T, products.conj().T)
+        operators[variable] = np.linalg.solve(cholesky.conj().T,
+                                              right.conj().T)
+    return operators, cholesky[:, 0]
+
+
+def get_atoms(operators, state, random_state=0):
+    """Return the atoms of the measure of a commutative problem from the
+    operators of the GNS construction. The operators are diagonalised
+    together in the eigenbasis of a random linear combination.
+
+    :param operators: The matrices of the variables.
+    :type operators: dict.
+    :param state: The state vector.
+    :type state: :class:`numpy.array`.
+    :param random_state: Optional parameter of the seed or the random number
+                         generator of the coefficients of the linear
+                         combination. The default is a fixed seed, so that
+                         the atoms are reproducible.
+    :type random_state: int or :class:`numpy.random.RandomState`.
+    :returns: list of tuples of the weight and the dict of the values of
+              the variables.
+    """
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    combination = sum(random_state.rand() * matrix
+                      for matrix in operators.values())
+    _, vecs = np.linalg.eigh((combination + combination.conj().T) / 2)
+    atoms = []
+    for vec in vecs.T:
+        point = dict((variable, np.vdot(vec, matrix.dot(vec)).real)
+                     for variable, matrix in operators.items())
+        atoms.append((abs(np.vdot(vec, state)) ** 2, point))
+    return atoms
+
+
+class SosCertificate(object):
+    """Numeric SOS certificate extracted from the dual solution. The dual
+    matrix of each block is factorised as :math:`Y = F^T F`, and the SOS
+    polynomial of the block is :math:`b^T Y b`, where :math:`b` is the
+    vector of the first monomials of the relaxation. The polynomials are
+    only expanded symbolically on request.
+
+    :param bases: The monomials of each block.
+    :type bases: list of list of :class:`sympy.core.exp.Expr`.
+    :param eigenvalues: The positive eigenvalues of each block of the dual
+                        solution.
+    :type eigenvalues: list of :class:`numpy.array`.
+    :param eigenvectors: The corresponding eigenvectors of each block as
+                         columns.
+    :type eigenvectors: list of :class:`numpy.array`.
+    """
+
+    def __init__(self, bases, eigenvalues, eigenvectors):
+        self.bases = bases
+        self.eigenvalues = eigenvalues
+        self.eigenvectors = eigenvectors
+        self._polynomials = {}
+
+    def __len__(self):
+        return len(self.bases)
+
+    def __getitem__(self, block):
+        return self.factors[block]
+
+    @property
+    def factors(self):
+        """The factor matrices of the blocks. Row :math:`j` of the factor
+        of a block holds the coefficients of the :math:`j`-th squared
+        polynomial over the basis of the block.
+        """
+        return [(vecs * np.sqrt(vals)).T
+                for vals, vecs in zip(self.eigenvalues, self.eigenvectors)]
+
+    def gram_matrix(self, block):
+        """Return the Gram matrix of a block reconstructed from the positive
+        eigenvalues.
+
+        :param block: The index of the block.
+        :type block: int.
+        :rtype: :class:`numpy.array`.
+        """
+        vecs = self.eigenvectors[block]
+        return np.dot(vecs * self.eigenvalues[block], vecs.T)
+
+    def polynomial(self, block, threshold=0.0):
+        """Return the SOS polynomial of a block as a SymPy expression. The
+        expression is built from the Gram matrix, and it is cached.
+
+        :param block: The index of the block.
+        :type block: int.
+        :param threshold: Optional parameter for specifying the threshold
+                          value below which the coefficients are
+                          disregarded.
+        :type threshold: float.
+        :rtype: :class:`sympy.core.exp.Expr`.
+        """
+        if block not in self._polynomials:
+            gram = self.gram_matrix(block)
+            basis = self.bases[block]
+            term = 0
+            for i, j in zip(*np.nonzero(gram)):
+                term += float(gram[i, j]) * basis[i] * basis[j]
+            self._polynomials[block] = expand(term)
+        term = self._polynomials[block]
+        new_term = 0
+        for element in Add.make_args(term):
+            _, coeff = separate_scalar_factor(element)
+            if abs(coeff) > threshold:
+                new_term += element
+        return new_term
+
+    def polynomials(self, threshold=0.0):
+        """Return the SOS polynomials of all blocks.
+
+        :param threshold: Optional parameter for specifying the threshold
+                          value below which the coefficients are
+                          disregarded.
+        :type threshold: float.
+        :rtype: list of :class:`sympy.core.exp.Expr`.
+        """
+        return [self.polynomial(block, threshold)
+                for block in range(len(self))]
+
+
+def get_sos_certificate(sdpRelaxation, y_mat=None):
+    """Given a solution of the dual problem, it returns the numeric SOS
+    certificate, which only needs the eigendecomposition of the blocks.
 
     :param sdpRelaxation: The SDP relaxation to be solved.
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
@@ -163,12 +483,8 @@ def get_sos_decomposition(sdpRelaxation, y_mat=None, threshold=0.0):
                   moment matrix. If not provided, the solution is extracted
                   from the sdpRelaxation object.
     :type y_mat: :class:`numpy.array`.
-    :param threshold: Optional parameter for specifying the threshold value
-                      below which the eigenvalues and entries of the
-                      eigenvectors are disregarded.
-    :type threshold: float.
-    :returns: The SOS decomposition of [sigma_0, sigma_1, ..., sigma_m]
-    :rtype: list of :class:`sympy.core.exp.Expr`.
+    :returns: The SOS certificate of [sigma_0, sigma_1, ..., sigma_m]
+    :rtype: :class:`ncpol2sdpa.solver_common.SosCertificate`.
     """
     if len(sdpRelaxation.monomial_sets) != 1:
         raise Exception("Cannot automatically match primal and dual " +
@@ -181,58 +497,101 @@ def get_sos_decomposition(sdpRelaxation, y_mat=None, threshold=0.0):
                         "is not provided!")
     elif sdpRelaxation.status != "unsolved" and y_mat is None:
         y_mat = sdpRelaxation.y_mat
-    sos = []
+    bases, eigenvalues, eigenvectors = [], [], []
     for y_mat_block in y_mat:
-        term = 0
         vals, vecs = np.linalg.eigh(y_mat_block)
-        for j, val in enumerate(vals):
-            if val < -0.001:
-                raise Exception("Large negative eigenvalue: " + val +
-                                ". Matrix cannot be positive.")
-            elif val > 0:
-                sub_term = 0
-                for i, entry in enumerate(vecs[:, j]):
-                    sub_term += entry * sdpRelaxation.monomial_sets[0][i]
-                term += val * sub_term**2
-        term = expand(term)
-        new_term = 0
-        if term.is_Mul:
-            elements = [term]
-        else:
-            elements = term.as_coeff_mul()[1][0].as_coeff_add()[1]
-        for element in elements:
-            _, coeff = separate_scalar_factor(element)
-            if abs(coeff) > threshold:
-                new_term += element
-        sos.append(new_term)
-    return sos
-
-
-def get_index_of_monomial(monomial, row_offsets, sdpRelaxation):
-    k = sdpRelaxation._get_index_of_monomial(monomial)[0][0]
-    Fk = sdpRelaxation.F_struct.getcol(k)
-    if not isinstance(Fk, lil_matrix):
-        Fk = Fk.tolil()
-    for row in range(len(Fk.rows)):
-        if Fk.rows[row] != []:
-            block, i, j = convert_row_to_sdpa_index(sdpRelaxation.block_struct,
-                                                    row_offsets, row)
-            return row, k, block, i, j
-
-
-def get_recursive_xmat_value(k, row_offsets, sdpRelaxation, x_mat):
-    Fk = sdpRelaxation.F_struct[:, k]
-    for row in range(len(Fk.rows)):
-        if Fk.rows[row] != []:
-            block, i, j = convert_row_to_sdpa_index(sdpRelaxation.block_struct,
-                                                    row_offsets, row)
-            value = x_mat[block][i, j]
-            for index in sdpRelaxation.F_struct.rows[row]:
-                if k != index:
-                    value -= sdpRelaxation.F_struct[row, index] * \
-                               get_recursive_xmat_value(index, row_offsets,
-                                                        sdpRelaxation, x_mat)
-            return value / sdpRelaxation.F_struct[row, k]
+        if vals[0] < -0.001:
+            raise Exception("Large negative eigenvalue: " + str(vals[0]) +
+                            ". Matrix cannot be positive.")
+        positive = vals > 0
+        bases.append(sdpRelaxation.monomial_sets[0][:len(vals)])
+        eigenvalues.append(vals[positive])
+        eigenvectors.append(vecs[:, positive])
+    return SosCertificate(bases, eigenvalues, eigenvectors)
+
+
+def get_sos_decomposition(sdpRelaxation, y_mat=None, threshold=0.0):
+    """Given a solution of the dual problem, it returns the SOS
+    decomposition.
+
+    :param sdpRelaxation: The SDP relaxation to be solved.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param y_mat: Optional parameter providing the dual solution of the
+                  moment matrix. If not provided, the solution is extracted
+                  from the sdpRelaxation object.
+    :type y_mat: :class:`numpy.array`.
+    :param threshold: Optional parameter for specifying the threshold value
+                      below which the coefficients of the polynomials are
+                      disregarded.
+    :type threshold: float.
+    :returns: The SOS decomposition of [sigma_0, sigma_1, ..., sigma_m]
+    :rtype: list of :class:`sympy.core.exp.Expr`.
+    """
+    return get_sos_certificate(sdpRelaxation, y_mat).polynomials(threshold)
+
+
+def get_moment_vector(sdpRelaxation, x_mat=None):
+    """Given a solution of the primal problem, it returns the values of all
+    SDP variables in one sparse pass over the coefficient matrices. Each
+    variable is read off the first entry of the solution where it appears
+    alone; the variables that only appear together with others are
+    eliminated in further passes. The result is cached in the relaxation for
+    the last solution matrices.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param x_mat: Optional parameter providing the primal solution. If not
+                  provided, the solution is extracted from the sdpRelaxation
+                  object.
+    :type x_mat: list of :class:`numpy.array`.
+    :returns: :class:`numpy.array` of the values of the SDP variables, with
+              1 at the index 0 of the constant term.
+    """
+    if x_mat is None:
+        x_mat = sdpRelaxation.x_mat
+    cached = getattr(sdpRelaxation, "_moment_vector", None)
+    if cached is not None and cached[0] is x_mat:
+        return cached[1]
+    n_vars = sdpRelaxation.n_vars
+    block_struct = sdpRelaxation.block_struct
+    rows, columns, values, block_index, i, j = \
+        convert_to_block_coo_arrays(sdpRelaxation)
+    # The elements of diagonal blocks are on the diagonal of the solution
+    diagonal = np.asarray(block_struct)[block_index] < 0
+    i[diagonal] = j[diagonal]
+    # The value of the solution in each entry, less the constant term
+    unique_rows, first, inverse = np.unique(rows, return_index=True,
+                                            return_inverse=True)
+    dtype = np.result_type(values, np.float64)
+    residuals = np.zeros(len(unique_rows), dtype=dtype)
+    for block in np.unique(block_index[first]):
+        start, end = np.searchsorted(block_index[first], [block, block + 1])
+        residuals[start:end] = np.asarray(x_mat[block])[
+            i[first][start:end], j[first][start:end]]
+    constant = columns == 0
+    np.subtract.at(residuals, inverse[constant], values[constant])
+    inverse, columns, values = \
+        inverse[~constant], columns[~constant], values[~constant]
+    moments = np.full(n_vars + 1, np.nan, dtype=dtype)
+    moments[0] = 1
+    known = np.zeros(n_vars + 1, dtype=bool)
+    known[0] = True
+    while True:
+        unknown = ~known[columns]
+        n_unknown = np.bincount(inverse[unknown], minlength=len(unique_rows))
+        alone = unknown & (n_unknown[inverse] == 1)
+        if not np.any(alone):
+            break
+        known_sums = np.zeros(len(unique_rows), dtype=dtype)
+        np.add.at(known_sums, inverse[~unknown],
+                  values[~unknown] * moments[columns[~unknown]])
+        new_columns, index = np.unique(columns[alone], return_index=True)
+        entries = np.flatnonzero(alone)[index]
+        moments[new_columns] = (residuals[inverse[entries]] -
+                                known_sums[inverse[entries]]) / values[entries]
+        known[new_columns] = True
+    sdpRelaxation._moment_vector = (x_mat, moments)
+    return moments
 
 
 def get_xmat_value(monomial, sdpRelaxation, x_mat=None):
@@ -261,11 +620,7 @@ def get_xmat_value(monomial, sdpRelaxation, x_mat=None):
         elements = [polynomial]
     else:
         elements = polynomial.as_coeff_mul()[1][0].as_coeff_add()[1]
-    row_offsets = [0]
-    cumulative_sum = 0
-    for block_size in sdpRelaxation.block_struct:
-        cumulative_sum += block_size ** 2
-        row_offsets.append(cumulative_sum)
+    moments = get_moment_vector(sdpRelaxation, x_mat)
     result = 0
     for element in elements:
         element, coeff = separate_scalar_factor(element)
@@ -273,18 +628,58 @@ def get_xmat_value(monomial, sdpRelaxation, x_mat=None):
         if is_number_type(element):
             result += coeff*element
         else:
-            row, k, block, i, j = get_index_of_monomial(element, row_offsets,
-                                                        sdpRelaxation)
-            value = x_mat[block][i, j]
-            for index in sdpRelaxation.F_struct.rows[row]:
-                if k != index:
-                    value -= sdpRelaxation.F_struct[row, index] * \
-                               get_recursive_xmat_value(index, row_offsets,
-                                                        sdpRelaxation, x_mat)
-            result += coeff * value / sdpRelaxation.F_struct[row, k]
+            k = sdpRelaxation._get_index_of_monomial(element)[0][0]
+            result += coeff * moments[k]
     return result
 
 
+def get_dual_products(sdpRelaxation, y_mat=None, blocks=None):
+    """Given a solution of the dual problem, it returns the negative inner
+    products of the coefficient matrices of all SDP variables and the dual
+    solution, computed as one sparse product of `F_struct` and the flattened
+    dual solution. The element 0 belongs to the constant term. The result is
+    cached in the relaxation for the last dual solution and blocks.
+
+    :param sdpRelaxation: The SDP relaxation.
+    :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
+    :param y_mat: Optional parameter providing the dual solution. If not
+                  provided, the solution is extracted from the sdpRelaxation
+                  object.
+    :type y_mat: list of :class:`numpy.array`.
+    :param blocks: Optional parameter to specify the blocks to be included.
+    :type blocks: list of `int`.
+    :returns: :class:`numpy.array` of the inner products.
+    """
+    if y_mat is None:
+        y_mat = sdpRelaxation.y_mat
+    block_struct = sdpRelaxation.block_struct
+    if blocks is None:
+        blocks = range(len(block_struct))
+    blocks = tuple(sorted(set(blocks)))
+    cached = getattr(sdpRelaxation, "_dual_products", None)
+    if cached is not None and cached[0] is y_mat and cached[1] == blocks:
+        return cached[2]
+    row_offsets = get_row_offsets(block_struct)
+    # The off-diagonal elements are stored once in F_struct, so they count
+    # twice in the inner product
+    y_vec = np.zeros(row_offsets[-1])
+    for block in blocks:
+        width = abs(block_struct[block])
+        y_block = np.asarray(y_mat[block])[:width, :width]
+        start = row_offsets[block]
+        if block_struct[block] < 0:
+            y_vec[start:start + width] = np.diag(y_block)
+        else:
+            y_vec[start:start + width ** 2] = \
+                (np.diag(np.diag(y_block)) + 2 * np.triu(y_block, 1)).ravel()
+    rows, columns, values, _, _, _ = convert_to_block_coo_arrays(sdpRelaxation)
+    products = np.zeros(sdpRelaxation.n_vars + 1,
+                        dtype=np.result_type(values, np.float64))
+    np.subtract.at(products, columns, values * y_vec[rows])
+    sdpRelaxation._dual_products = (y_mat, blocks, products)
+    return products
+
+
 def extract_dual_value(sdpRelaxation, monomial, blocks=None):
     """Given a solution of the dual problem and a monomial, it returns the
     inner product of the corresponding coefficient matrix and the dual
@@ -294,8 +689,6 @@ def extract_dual_value(sdpRelaxation, monomial, blocks=None):
     :type sdpRelaxation: :class:`ncpol2sdpa.SdpRelaxation`.
     :param monomial: The monomial for which the value is requested.
     :type monomial: :class:`sympy.core.exp.Expr`.
-    :param monomial: The monomial for which the value is requested.
-    :type monomial: :class:`sympy.core.exp.Expr`.
     :param blocks: Optional parameter to specify the blocks to be included.
     :type blocks: list of `int`.
     :returns: The value of the monomial in the solved relaxation.
@@ -303,28 +696,8 @@ def extract_dual_value(sdpRelaxation, monomial, blocks=None):
     """
     if sdpRelaxation.status == "unsolved":
         raise Exception("The SDP relaxation is unsolved!")
-    if blocks is None:
-        blocks = [i for i, _ in enumerate(sdpRelaxation.block_struct)]
     if is_number_type(monomial):
         index = 0
     else:
         index = sdpRelaxation.monomial_index[monomial]
-    row_offsets = [0]
-    cumulative_sum = 0
-    for block_size in sdpRelaxation.block_struct:
-        cumulative_sum += block_size ** 2
-        row_offsets.append(cumulative_sum)
-    result = 0
-    for row in range(len(sdpRelaxation.F_struct.rows)):
-        if len(sdpRelaxation.F_struct.rows[row]) > 0:
-            col_index = 0
-            for k in sdpRelaxation.F_struct.rows[row]:
-                if k != index:
-                    continue
-                value = sdpRelaxation.F_struct.data[row][col_index]
-                col_index += 1
-                block_index, i, j = convert_row_to_sdpa_index(
-                    sdpRelaxation.block_struct, row_offsets, row)
-                if block_index in blocks:
-                    result += -value*sdpRelaxation.y_mat[block_index][i][j]
-    return result
+    return get_dual_products(sdpRelaxation, blocks=blocks)[index]